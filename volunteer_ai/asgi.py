@@ -2,6 +2,8 @@
 ASGI config for volunteer_ai project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are resolved against ``settings.ASGI_URLCONF``, which serves the
+async versions of the read-only views; WSGI keeps using ``ROOT_URLCONF``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -9,8 +11,22 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'volunteer_ai.settings')
 
-application = get_asgi_application()
+
+class AsyncViewsASGIHandler(ASGIHandler):
+    """ASGI handler that routes requests through ``settings.ASGI_URLCONF``."""
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = settings.ASGI_URLCONF
+        return request, error_response
+
+
+django.setup(set_prefix=False)
+application = AsyncViewsASGIHandler()
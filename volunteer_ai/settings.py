@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'volunteers.metrics.MetricsMiddleware',
+    'volunteers.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +72,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'volunteer_ai.wsgi.application'
+ASGI_APPLICATION = 'volunteer_ai.asgi.application'
+
+# Under ASGI the read-only views are served by their async versions.
+ASGI_URLCONF = 'volunteer_ai.urls_async'
 
 
 # Database
@@ -78,9 +85,102 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Reuse a connection for up to ten minutes instead of opening one
+        # per request (and re-running the PRAGMAs below), checking that it
+        # still works before a request reuses it.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # Tests run against a file too: an in-memory database locks whole
+        # tables between connections instead of waiting out busy_timeout,
+        # so concurrent tests would fail where production waits.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        'OPTIONS': {
+            # Take the write lock when a transaction starts. A deferred
+            # transaction that reads and then writes cannot wait for the lock
+            # and fails with "database is locked" instead.
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Read replica for the read-only views, see volunteers/routers.py, used
+    # once REPLICA_DATABASE below names it. Locally a second SQLite file
+    # stands in for it; fill it from the primary with
+    # `REPLICA_DATABASE=replica manage.py sync_replica` before enabling it.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['volunteers.routers.PrimaryReplicaRouter']
+
+# Alias the read-only views read from; None sends all reads to the primary.
+# Off unless the REPLICA_DATABASE environment variable names an alias, as
+# the replica is empty until something copies the primary into it.
+REPLICA_DATABASE = os.environ.get('REPLICA_DATABASE') or None
+
+# Seconds a client's reads stay on the primary after it sends a POST, to
+# cover replication lag.
+REPLICA_PIN_SECONDS = 10
+
+# PRAGMAs run on every new SQLite connection, see volunteers/sqlite.py.
+# None leaves a PRAGMA at SQLite's default.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64000,  # Negative sizes are in KiB: 64 MB per connection.
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # Milliseconds.
+    'temp_store': 'memory',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# The dashboard stats snapshot is patched in the cache on every write, so
+# deployments with several worker processes need a shared backend (Redis or
+# Memcached) for all workers to see the updates.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Rendered opportunity cards and tables ({% cache %} uses this alias).
+    # Keys embed the data they depend on, so entries never go stale and only
+    # need room for the cards actually being viewed.
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Seconds a dashboard stats snapshot may live before it is recomputed even
+# if no write invalidated it.
+DASHBOARD_STATS_TIMEOUT = 60 * 60
+
+
+# Number of slowest SQL queries the metrics middleware keeps, with the view
+# that ran them. 0 disables slow query tracking.
+METRICS_SLOW_QUERIES = 10
+
+# Queries taking longer than this many milliseconds count as slow and are
+# logged as warnings.
+METRICS_SLOW_QUERY_MS = 100
+
+# Background tasks (volunteers/tasks.py), run by `manage.py run_tasks`.
+# A task whose worker has not finished it after this many seconds is
+# handed to another worker.
+TASKS_VISIBILITY_TIMEOUT = 5 * 60
+
+# Signup confirmations are printed by the worker; use the file or SMTP
+# backend to keep or deliver them.
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'volunteers@localhost'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -0,0 +1,10 @@
+"""
+URL configuration used under ASGI, with the volunteers app's async views.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('volunteers.urls_async')),
+]
@@ -1,25 +1,215 @@
-from django.contrib import admin
-from .models import Category, VolunteerOpportunity, Volunteer
+import time
+
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .duplicates import find_duplicates, merge_duplicates
+from .models import (
+    Category, Signup, Task, VolunteerOpportunity, Volunteer, WaitlistEntry, recount_volunteer_counts,
+)
+from .pagination import EstimatedCountPaginator
+from .purge import orphaned_volunteers, purge, purge_volunteers
+from .search import match_opportunities, search_volunteers
+
+# Objects listed by name on a delete confirmation page; the rest are counted.
+DELETE_PREVIEW = 100
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists and deletes whose cost does not grow with the table.
+
+    Pages are counted by ``EstimatedCountPaginator`` and the unfiltered
+    total shown next to search results is skipped. Deletes are confirmed
+    with counts from ``related_counts()`` instead of Django listing every
+    object a delete cascades to.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def related_counts(self, queryset):
+        """``{verbose_name_plural: count}`` of the rows deleting ``queryset`` also removes."""
+        return {}
+
+    def get_deleted_objects(self, objs, request):
+        if not isinstance(objs, QuerySet):
+            objs = self.model._default_manager.filter(pk__in=[obj.pk for obj in objs])
+        if isinstance(self.list_select_related, (list, tuple)):
+            objs = objs.select_related(*self.list_select_related)
+        total = objs.count()
+        preview = [str(obj) for obj in objs[:DELETE_PREVIEW]]
+        if total > len(preview):
+            preview.append(f'… and {total - len(preview)} more')
+        model_count = {self.model._meta.verbose_name_plural: total, **self.related_counts(objs)}
+        perms_needed = set() if self.has_delete_permission(request) else {self.model._meta.verbose_name}
+        return preview, model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, self.model._default_manager.filter(pk=obj.pk))
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'opportunity_count', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(opportunity_count=Count('opportunities'))
+
+    @admin.display(description='Opportunities', ordering='opportunity_count')
+    def opportunity_count(self, obj):
+        return obj.opportunity_count
+
 
 @admin.register(VolunteerOpportunity)
-class VolunteerOpportunityAdmin(admin.ModelAdmin):
-    list_display = ['title', 'category', 'date', 'volunteer_count', 'created_at']
+class VolunteerOpportunityAdmin(LargeTableAdmin):
+    list_display = ['title', 'category', 'date', 'volunteer_count', 'capacity', 'created_at']
     list_filter = ['category', 'date']
+    list_select_related = ['category']
     search_fields = ['title', 'description']
-    date_hierarchy = 'date'
+    search_help_text = 'Words or word prefixes in the title or description.'
+    readonly_fields = ['volunteer_count']
+    actions = ['recount_volunteers']
+
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index rather than icontains on the description.
+        if not search_term.strip():
+            return queryset, False
+        return match_opportunities(queryset, search_term), False
+
+    def related_counts(self, queryset):
+        return {
+            Signup._meta.verbose_name_plural: Signup.objects.filter(opportunity__in=queryset.values('pk')).count(),
+            WaitlistEntry._meta.verbose_name_plural: WaitlistEntry.objects.filter(
+                opportunity__in=queryset.values('pk')
+            ).count(),
+            # Volunteers left without any signup or waitlist entry go too.
+            Volunteer._meta.verbose_name_plural: orphaned_volunteers(queryset).count(),
+        }
+
+    # Deletes go through purge(), which removes signups with set-based
+    # statements instead of loading them into the cascade collector.
+    def delete_queryset(self, request, queryset):
+        started = time.monotonic()
+        totals = [0, 0, 0]
+        for deleted in purge(VolunteerOpportunity.objects.filter(pk__in=queryset.values('pk'))):
+            totals = [total + n for total, n in zip(totals, deleted)]
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.message_user(
+            request,
+            f'Deleted {totals[0]} opportunities, {totals[1]} signups and {totals[2]} volunteers '
+            f'({sum(totals) / elapsed:,.0f} rows/sec).',
+        )
+
+    @admin.action(description='Recount volunteers of the selected opportunities')
+    def recount_volunteers(self, request, queryset):
+        with transaction.atomic():
+            recount_volunteer_counts(queryset.values('pk'))
+        self.message_user(request, 'Recounted the selected opportunities.', messages.SUCCESS)
+
+
+class SignupInline(admin.TabularInline):
+    model = Signup
+    extra = 0
+    raw_id_fields = ['opportunity']
+    readonly_fields = ['created_at']
 
 
 @admin.register(Volunteer)
-class VolunteerAdmin(admin.ModelAdmin):
-    list_display = ['name', 'age', 'opportunity', 'created_at']
+class VolunteerAdmin(LargeTableAdmin):
+    list_display = ['name', 'age', 'email', 'signup_count', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['name', 'email']
+    search_help_text = 'The start of a name, or a whole email address.'
+    inlines = [SignupInline]
+    actions = ['merge_duplicates']
+
+    def get_queryset(self, request):
+        # A correlated subquery is only evaluated for the rows on the page,
+        # where Count() would group the whole table.
+        signups = Signup.objects.filter(volunteer=OuterRef('pk')).order_by().values('volunteer').annotate(
+            n=Count('pk')
+        ).values('n')
+        return super().get_queryset(request).annotate(
+            signup_count=Coalesce(Subquery(signups, output_field=IntegerField()), 0)
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        return search_volunteers(queryset, search_term), False
+
+    @admin.display(description='Signups')
+    def signup_count(self, obj):
+        return obj.signup_count
+
+    def related_counts(self, queryset):
+        return {
+            Signup._meta.verbose_name_plural: Signup.objects.filter(volunteer__in=queryset.values('pk')).count(),
+            WaitlistEntry._meta.verbose_name_plural: WaitlistEntry.objects.filter(
+                volunteer__in=queryset.values('pk')
+            ).count(),
+        }
+
+    def delete_queryset(self, request, queryset):
+        started = time.monotonic()
+        totals = [0, 0]
+        for deleted in purge_volunteers(Volunteer.objects.filter(pk__in=queryset.values('pk'))):
+            totals = [total + n for total, n in zip(totals, deleted)]
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.message_user(
+            request,
+            f'Deleted {totals[0]} volunteers and {totals[1]} signups ({sum(totals) / elapsed:,.0f} rows/sec).',
+        )
+
+    @admin.action(description='Merge likely duplicates among the selected volunteers')
+    def merge_duplicates(self, request, queryset):
+        clusters, _ = find_duplicates(queryset)
+        merged = sum(result[0] for result in merge_duplicates(clusters))
+        if merged:
+            self.message_user(request, f'Merged {merged} volunteers into {len(clusters)}.', messages.SUCCESS)
+        else:
+            self.message_user(request, 'No likely duplicates among the selected volunteers.', messages.WARNING)
+
+
+class RegistrationAdmin(LargeTableAdmin):
+    """Signups and waitlist entries, searched by volunteer name prefix or opportunity words."""
+    list_display = ['volunteer', 'opportunity', 'created_at']
     list_filter = ['opportunity__category', 'created_at']
-    search_fields = ['name', 'expertise']
-    raw_id_fields = ['opportunity']
\ No newline at end of file
+    search_fields = ['volunteer__name', 'opportunity__title']
+    search_help_text = 'The start of a volunteer name, or words in the opportunity.'
+    list_select_related = ['volunteer', 'opportunity']
+    raw_id_fields = ['volunteer', 'opportunity']
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        volunteers = search_volunteers(Volunteer.objects.all(), search_term).values('pk')
+        opportunities = match_opportunities(VolunteerOpportunity.objects.all(), search_term).values('pk')
+        return queryset.filter(volunteer__in=volunteers) | queryset.filter(opportunity__in=opportunities), False
+
+
+@admin.register(Signup)
+class SignupAdmin(RegistrationAdmin):
+    pass
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(RegistrationAdmin):
+    pass
+
+
+@admin.register(Task)
+class TaskAdmin(LargeTableAdmin):
+    list_display = ['name', 'status', 'attempts', 'max_attempts', 'available_at', 'created_at']
+    list_filter = ['status']
+    readonly_fields = ['lease', 'last_error', 'created_at']
+    actions = ['retry_now']
+
+    @admin.action(description='Run the selected tasks again now')
+    def retry_now(self, request, queryset):
+        retried = queryset.filter(lease__isnull=True).update(
+            status=Task.PENDING, attempts=0, available_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f'Queued {retried} tasks to run again.', messages.SUCCESS)
@@ -1,5 +1,25 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from .search import install_fts, install_nocase_indexes
+    install_fts(connections[using])
+    install_nocase_indexes(connections[using])
 
 
 class VolunteersConfig(AppConfig):
     name = 'volunteers'
+
+    def ready(self):
+        from . import stats  # noqa: F401 -- connects the dashboard stats receivers
+        from . import fragments  # noqa: F401 -- connects the fragment cache receivers
+        from . import matching  # noqa: F401 -- connects the matching index receivers
+        from . import autocomplete  # noqa: F401 -- connects the autocomplete index receivers
+        from . import rollups  # noqa: F401 -- connects the activity rollup receivers and task
+        from . import emails  # noqa: F401 -- registers the email tasks
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection)
+        post_migrate.connect(ensure_search_index, sender=self)
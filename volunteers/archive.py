@@ -0,0 +1,77 @@
+"""Moving past opportunities out of the hot tables.
+
+``archive_batch`` copies a batch of past opportunities into
+``ArchivedOpportunity`` and their signups, with the volunteer's details,
+into ``ArchivedSignup``, then deletes the originals along with waitlist
+entries and volunteers left with no signups or waitlist entries. Each batch
+is one transaction of set-based statements, so an interrupted run loses
+nothing and simply continues with the remaining opportunities next time.
+Copies skip rows already in the archive, which makes a batch safe to
+repeat.
+
+The deletes deliberately bypass the models' delete hooks: the volunteers'
+signups are not withdrawn, they are history, and the activity rollups keep
+counting them from the archive. Caches are told through the
+``opportunities_archived`` signal instead.
+"""
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import ArchivedOpportunity, ArchivedSignup, Signup, Volunteer, VolunteerOpportunity
+from .purge import delete_opportunity_rows
+from .signals import opportunities_archived
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def archive_cutoff(days):
+    """Opportunities dated before this are archived when keeping ``days`` days of the past."""
+    return timezone.now().date() - timedelta(days=days)
+
+
+def archivable(cutoff, using='default'):
+    return VolunteerOpportunity.objects.using(using).filter(date__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size=DEFAULT_BATCH_SIZE, using='default'):
+    """Archive up to ``batch_size`` opportunities dated before ``cutoff``.
+
+    Returns ``(opportunities, signups, volunteers)`` moved; all zero once
+    nothing is left to archive.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    opportunities, signups = quote(VolunteerOpportunity._meta.db_table), quote(Signup._meta.db_table)
+    volunteers = quote(Volunteer._meta.db_table)
+
+    with transaction.atomic(using=using):
+        ids = list(archivable(cutoff, using).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return 0, 0, 0
+        in_ids = f'IN ({", ".join(["%s"] * len(ids))})'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(ArchivedOpportunity._meta.db_table)} '
+                f'(id, title, description, date, category_id, volunteer_count, capacity, '
+                f'created_at, updated_at, archived_at) '
+                f'SELECT id, title, description, date, category_id, volunteer_count, capacity, '
+                f'created_at, updated_at, %s FROM {opportunities} WHERE id {in_ids} '
+                f'ON CONFLICT (id) DO NOTHING',
+                [connection.ops.adapt_datetimefield_value(timezone.now()), *ids],
+            )
+            cursor.execute(
+                f'INSERT INTO {quote(ArchivedSignup._meta.db_table)} '
+                f'(id, opportunity_id, volunteer_id, volunteer_name, volunteer_age, volunteer_expertise, '
+                f'volunteer_email, created_at) '
+                f'SELECT s.id, s.opportunity_id, s.volunteer_id, v.name, v.age, v.expertise, v.email, s.created_at '
+                f'FROM {signups} s INNER JOIN {volunteers} v ON v.id = s.volunteer_id '
+                f'WHERE s.opportunity_id {in_ids} '
+                f'ON CONFLICT (id) DO NOTHING',
+                ids,
+            )
+        moved_signups, moved_volunteers = delete_opportunity_rows(ids, using)
+        opportunities_archived.send(sender=VolunteerOpportunity, opportunity_ids=ids, using=using)
+    return len(ids), moved_signups, moved_volunteers
+
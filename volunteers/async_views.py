@@ -0,0 +1,213 @@
+"""Async versions of the read-only views, served under ASGI.
+
+Each function here has the same name, URL and response as its synchronous
+counterpart in ``views.py``; ``urls_async`` swaps them in and the ASGI entry
+point routes requests through it. Database access uses the async ORM and
+independent queries are awaited together. Templates are still rendered in
+a worker thread, since rendering forms and reading session-backed messages
+may touch the database.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views.decorators.cache import cache_control
+
+from .exports import ASYNC_EXPORT_FORMATS
+from .forms import OpportunityFilterForm
+from .fragments import aadd_category_versions, acategories_version
+from .models import Category, Signup, VolunteerOpportunity
+from .pagination import InvalidCursor, KeysetPaginator, parse_limit
+from .routers import replica_reads
+from .stats import aget_archive_stats, aget_dashboard_stats, with_archived
+from .views import (
+    API_DEFAULT_LIMIT, API_MAX_LIMIT, OPPORTUNITIES_PER_PAGE, VOLUNTEERS_PER_PAGE,
+    add_month_links, facets_json, filter_opportunities, include_archived, list_query, make_etag,
+    opportunities_page_json, opportunity_detail_querysets, opportunity_facets,
+)
+
+aopportunity_facets = sync_to_async(opportunity_facets)
+
+arender = sync_to_async(render)
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def apaginate(request, queryset, per_page):
+    """Async version of ``views.paginate()``."""
+    try:
+        return await KeysetPaginator(queryset, per_page).apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid page.')
+
+
+@sync_to_async
+def afilter_opportunities(form, opportunities):
+    """Validate ``form`` and apply its filters, or return None if it is invalid.
+
+    Both steps may query the database: category choices and the search
+    index check.
+    """
+    if not form.is_valid():
+        return None
+    return filter_opportunities(opportunities, form.cleaned_data)
+
+
+def acondition(etag_func):
+    """``condition(etag_func=...)`` for async views with an async ETag function.
+
+    Django's decorator calls the ETag function synchronously, which cannot
+    query the database from an event loop.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = quote_etag(await etag_func(request, *args, **kwargs))
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+@replica_reads
+async def dashboard(request):
+    """Dashboard view with summary statistics."""
+    today = timezone.now().date()
+    stats, recent_opportunities, recent_signups = await asyncio.gather(
+        aget_dashboard_stats(),
+        alist(VolunteerOpportunity.objects.filter(date__gte=today).select_related('category')[:5]),
+        alist(Signup.objects.select_related('volunteer', 'opportunity', 'opportunity__category')[:5]),
+    )
+    await aadd_category_versions(recent_opportunities)
+    if include_archived(request):
+        stats = with_archived(stats, await aget_archive_stats())
+
+    context = {
+        'total_opportunities': stats['total_opportunities'],
+        'upcoming_opportunities': stats['upcoming_opportunities'],
+        'total_volunteers': stats['total_volunteers'],
+        'categories': stats['categories'],
+        'recent_opportunities': recent_opportunities,
+        'recent_signups': recent_signups,
+        'include_archived': include_archived(request),
+    }
+    return await arender(request, 'volunteers/dashboard.html', context)
+
+
+@replica_reads
+async def opportunity_list(request):
+    """List all volunteer opportunities with filtering."""
+    form = OpportunityFilterForm(request.GET)
+    opportunities = VolunteerOpportunity.objects.select_related('category')
+    filtered = await afilter_opportunities(form, opportunities)
+    facets = None
+    if filtered is not None:
+        opportunities = filtered
+        if form.cleaned_data['facets']:
+            facets = await aopportunity_facets(form.cleaned_data)
+            form.show_category_counts(facets['categories'])
+            add_month_links(request, facets)
+
+    page = await apaginate(request, opportunities, OPPORTUNITIES_PER_PAGE)
+    await aadd_category_versions(page)
+
+    context = {
+        'opportunities': page,
+        'page': page,
+        'form': form,
+        'categories': Category.objects.all(),
+        'facets': facets,
+        'facets_toggle_query': list_query(request, facets=None if facets else '1'),
+    }
+    return await arender(request, 'volunteers/opportunity_list.html', context)
+
+
+@replica_reads
+async def opportunity_detail(request, pk):
+    """View details of a specific opportunity, archived or not."""
+    opportunities, archived_opportunities = opportunity_detail_querysets()
+    opportunity = await opportunities.filter(pk=pk).afirst()
+    archived = opportunity is None
+    if archived:
+        opportunity = await aget_object_or_404(archived_opportunities, pk=pk)
+    return await arender(
+        request, 'volunteers/opportunity_detail.html', {'opportunity': opportunity, 'archived': archived}
+    )
+
+
+@replica_reads
+async def volunteer_list(request):
+    """List all volunteer signups."""
+    signups = Signup.objects.select_related('volunteer', 'opportunity', 'opportunity__category')
+    page = await apaginate(request, signups, VOLUNTEERS_PER_PAGE)
+
+    context = {
+        'signups': page,
+        'page': page,
+    }
+    return await arender(request, 'volunteers/volunteer_list.html', context)
+
+
+async def opportunities_etag(request):
+    """Async version of ``views.opportunities_etag()``."""
+    opportunities, signups, categories = await asyncio.gather(
+        VolunteerOpportunity.objects.aaggregate(last=Max('updated_at'), rows=Count('pk')),
+        Signup.objects.aaggregate(last=Max('updated_at'), rows=Count('pk')),
+        acategories_version(),
+    )
+    return make_etag(opportunities, signups, categories, sorted(request.GET.lists()))
+
+
+async def dashboard_stats_etag(request):
+    return make_etag(await aget_dashboard_stats())
+
+
+@replica_reads
+@cache_control(no_cache=True)
+@acondition(opportunities_etag)
+async def api_opportunities(request):
+    """API endpoint for opportunities list with filtering; see ``views.api_opportunities``."""
+    form = OpportunityFilterForm(request.GET)
+    opportunities = await afilter_opportunities(form, VolunteerOpportunity.objects.select_related('category'))
+    if opportunities is None:
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    export_format = request.GET.get('format')
+    if export_format:
+        if export_format not in ASYNC_EXPORT_FORMATS:
+            return JsonResponse(
+                {'error': f'format must be one of: {", ".join(ASYNC_EXPORT_FORMATS)}.'}, status=400
+            )
+        rows, content_type = ASYNC_EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(rows(opportunities), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="opportunities.{export_format}"'
+        return response
+
+    try:
+        limit = parse_limit(request.GET.get('limit'), API_DEFAULT_LIMIT, API_MAX_LIMIT)
+        page = await KeysetPaginator(opportunities, limit).apage(request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    data = opportunities_page_json(page)
+    if form.cleaned_data['facets']:
+        data['facets'] = facets_json(await aopportunity_facets(form.cleaned_data))
+    return JsonResponse(data)
+
+
+@replica_reads
+@cache_control(no_cache=True)
+@acondition(dashboard_stats_etag)
+async def api_dashboard_stats(request):
+    """API endpoint for dashboard statistics."""
+    return JsonResponse(await aget_dashboard_stats())
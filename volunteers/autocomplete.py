@@ -0,0 +1,324 @@
+"""Typeahead suggestions for opportunity titles, categories and expertise.
+
+Suggestions come from an in-process prefix index rather than the database,
+so a keystroke costs a bisection and a short scan instead of a query. Each
+label (a title, a category name or an expertise word) is filed under every
+word it contains in one sorted list of ``(word, label)`` pairs; the labels
+with a word starting with the typed prefix sit next to each other in it.
+Every label carries a count: upcoming opportunities with that title or in
+that category, or volunteers using that word. Suggestions are the labels
+with the highest counts.
+
+The index is kept up to date like the matching index: writes bump a version
+in the cache after commit, and each process re-reads the opportunities and
+volunteers saved since its last sync, at most once every
+``MIN_SYNC_INTERVAL`` seconds so that a burst of signups does not turn
+every keystroke into a sync. Deleted rows never show up as saved, so
+deletes also bump a second version; only when it changed does a sync
+compare the tables with the index to find the rows that are gone.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .matching import STOP_WORDS
+from .models import Category, Volunteer, VolunteerOpportunity
+from .routers import primary_reads
+from .signals import (
+    opportunities_archived, opportunities_bulk_changed, opportunities_purged, volunteers_bulk_changed,
+    volunteers_merged,
+)
+
+VERSION_KEY = 'volunteers:autocomplete-version'
+DELETIONS_KEY = 'volunteers:autocomplete-deletions'
+
+SYNC_INTERVAL = getattr(settings, 'AUTOCOMPLETE_SYNC_INTERVAL', 60)
+MIN_SYNC_INTERVAL = getattr(settings, 'AUTOCOMPLETE_MIN_SYNC_INTERVAL', 1)
+SYNC_OVERLAP = timedelta(seconds=5)
+
+KINDS = ('titles', 'categories', 'expertise')
+# Expertise words used by fewer volunteers are not suggested.
+MIN_EXPERTISE_VOLUNTEERS = 2
+
+
+def words(text):
+    return re.findall(r'\w+', text.casefold())
+
+
+def expertise_terms(expertise):
+    """The distinct words of ``expertise`` worth suggesting."""
+    return {word for word in words(expertise) if len(word) >= 3 and word not in STOP_WORDS and not word.isdigit()}
+
+
+class PrefixIndex:
+    """Counted labels found by a prefix of any of their words."""
+
+    def __init__(self):
+        self.keys = []
+        self.labels = {}
+        self.loading = False
+
+    def __len__(self):
+        return len(self.labels)
+
+    @contextmanager
+    def bulk_load(self):
+        """Add many labels at once, sorting the keys once at the end instead of on every add."""
+        self.loading = True
+        try:
+            yield self
+        finally:
+            self.loading = False
+            self.keys.sort()
+
+    def add(self, label, count=1):
+        key = label.casefold()
+        entry = self.labels.get(key)
+        if entry is None:
+            label_words = tuple(sorted(set(words(label))))
+            if not label_words:
+                return
+            entry = self.labels[key] = [label, 0, label_words]
+            for word in label_words:
+                if self.loading:
+                    self.keys.append((word, key))
+                else:
+                    bisect.insort(self.keys, (word, key))
+        entry[1] += count
+
+    def remove(self, label, count=1):
+        key = label.casefold()
+        entry = self.labels.get(key)
+        if entry is None:
+            return
+        entry[1] -= count
+        if entry[1] > 0:
+            return
+        del self.labels[key]
+        for word in entry[2]:
+            if self.loading:
+                self.keys.remove((word, key))
+            else:
+                del self.keys[bisect.bisect_left(self.keys, (word, key))]
+
+    def search(self, prefixes, limit, min_count=0):
+        """``(label, count)`` for the ``limit`` labels with the highest counts
+        that have a word starting with each of ``prefixes``."""
+        if not prefixes:
+            return []
+        lead = max(prefixes, key=len)
+        rest = [prefix for prefix in prefixes if prefix != lead]
+        keys, matched = self.keys, set()
+        i = bisect.bisect_left(keys, (lead,))
+        while i < len(keys) and keys[i][0].startswith(lead):
+            matched.add(keys[i][1])
+            i += 1
+        candidates = (
+            entry for entry in map(self.labels.__getitem__, matched)
+            if entry[1] >= min_count
+            and all(any(word.startswith(prefix) for word in entry[2]) for prefix in rest)
+        )
+        best = heapq.nsmallest(limit, candidates, key=lambda entry: (-entry[1], entry[0].casefold()))
+        return [(label, count) for label, count, _ in best]
+
+
+class AutocompleteIndex:
+    """Prefix indexes over upcoming opportunities' titles, categories and volunteers' expertise."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.deletions = None
+        self.synced_at = 0.0
+        self.day = None
+        self.clear()
+
+    def clear(self):
+        self.titles = PrefixIndex()
+        self.categories = PrefixIndex()
+        self.expertise = PrefixIndex()
+        self.category_ids = {}
+        self.category_counts = Counter()
+        self.opportunities = {}
+        self.volunteers = {}
+        self.opportunities_synced_through = None
+        self.volunteers_synced_through = None
+        self.built = False
+
+    def add_opportunity(self, pk, title, category_id, date):
+        """Index (or re-index) one opportunity; past ones are only removed."""
+        self.discard_opportunity(pk)
+        if date < self.day:
+            return
+        self.opportunities[pk] = (title, category_id, date)
+        self.titles.add(title)
+        self.category_counts[category_id] += 1
+
+    def discard_opportunity(self, pk):
+        previous = self.opportunities.pop(pk, None)
+        if previous is not None:
+            self.titles.remove(previous[0])
+            self.category_counts[previous[1]] -= 1
+
+    def add_volunteer(self, pk, expertise):
+        self.discard_volunteer(pk)
+        terms = tuple(expertise_terms(expertise))
+        self.volunteers[pk] = terms
+        for term in terms:
+            self.expertise.add(term)
+
+    def discard_volunteer(self, pk):
+        for term in self.volunteers.pop(pk, ()):
+            self.expertise.remove(term)
+
+    def suggest(self, text, kinds=KINDS, limit=5):
+        """``{kind: [...]}`` of suggestions for what has been typed so far."""
+        self.refresh()
+        prefixes = words(text)
+        with self._lock:
+            suggestions = {}
+            if 'titles' in kinds:
+                suggestions['titles'] = [
+                    {'text': title, 'count': count} for title, count in self.titles.search(prefixes, limit)
+                ]
+            if 'categories' in kinds:
+                suggestions['categories'] = [
+                    {**self.category_ids[name.casefold()], 'name': name, 'count': count}
+                    for name, count in self.categories.search(prefixes, limit)
+                ]
+            if 'expertise' in kinds:
+                suggestions['expertise'] = [
+                    {'text': term, 'count': count}
+                    for term, count in self.expertise.search(prefixes, limit, MIN_EXPERTISE_VOLUNTEERS)
+                ]
+            return suggestions
+
+    def refresh(self):
+        """Bring the index up to date with the database if it may be stale."""
+        if not self._stale():
+            return
+        with self._lock:
+            versions = cache.get_many([VERSION_KEY, DELETIONS_KEY])
+            version, deletions = versions.get(VERSION_KEY), versions.get(DELETIONS_KEY)
+            if not self._stale(version):
+                return
+            with primary_reads():
+                self._sync(find_deleted=self.built and deletions != self.deletions)
+            self.version, self.deletions = version, deletions
+            self.synced_at = time.monotonic()
+
+    def _stale(self, version=None):
+        if not self.built:
+            return True
+        elapsed = time.monotonic() - self.synced_at
+        if elapsed >= SYNC_INTERVAL:
+            return True
+        if elapsed < MIN_SYNC_INTERVAL:
+            return False
+        return (cache.get(VERSION_KEY) if version is None else version) != self.version
+
+    def _sync(self, find_deleted=False):
+        today = timezone.now().date()
+        full = not self.built
+        if full:
+            self.clear()
+        if self.day != today:
+            self.day = today
+            for pk, (_, _, date) in list(self.opportunities.items()):
+                if date < today:
+                    self.discard_opportunity(pk)
+
+        upcoming = VolunteerOpportunity.objects.order_by().filter(date__gte=today)
+        with ExitStack() as stack:
+            if full:
+                # Sort each index's keys once, not once per label.
+                stack.enter_context(self.titles.bulk_load())
+                stack.enter_context(self.expertise.bulk_load())
+            changed = upcoming if self.opportunities_synced_through is None else (
+                VolunteerOpportunity.objects.order_by().filter(
+                    updated_at__gte=self.opportunities_synced_through - SYNC_OVERLAP
+                )
+            )
+            for pk, title, category_id, date, updated_at in changed.values_list(
+                'pk', 'title', 'category_id', 'date', 'updated_at'
+            ).iterator(chunk_size=2000):
+                self.add_opportunity(pk, title, category_id, date)
+                self.opportunities_synced_through = max(updated_at, self.opportunities_synced_through or updated_at)
+
+            volunteers = Volunteer.objects.order_by()
+            if self.volunteers_synced_through is not None:
+                volunteers = volunteers.filter(updated_at__gte=self.volunteers_synced_through - SYNC_OVERLAP)
+            for pk, expertise, updated_at in volunteers.values_list('pk', 'expertise', 'updated_at').iterator(
+                chunk_size=2000
+            ):
+                self.add_volunteer(pk, expertise)
+                self.volunteers_synced_through = max(updated_at, self.volunteers_synced_through or updated_at)
+
+        # Deleted rows never show up as changed; drop them once the counts disagree.
+        if find_deleted and upcoming.count() != len(self.opportunities):
+            for pk in self.opportunities.keys() - set(upcoming.values_list('pk', flat=True)):
+                self.discard_opportunity(pk)
+        if find_deleted and Volunteer.objects.count() != len(self.volunteers):
+            for pk in self.volunteers.keys() - set(Volunteer.objects.values_list('pk', flat=True)):
+                self.discard_volunteer(pk)
+
+        self.opportunities_synced_through = self.opportunities_synced_through or timezone.now()
+        self.volunteers_synced_through = self.volunteers_synced_through or timezone.now()
+        # A handful of rows, re-read every time.
+        self.categories, self.category_ids = PrefixIndex(), {}
+        for pk, name, slug in Category.objects.values_list('pk', 'name', 'slug'):
+            self.categories.add(name, self.category_counts[pk])
+            self.category_ids[name.casefold()] = {'id': pk, 'slug': slug}
+        self.built = True
+
+
+index = AutocompleteIndex()
+
+
+def suggest(text, kinds=KINDS, limit=5):
+    return index.suggest(text, kinds, limit)
+
+
+def bump_autocomplete_version():
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_autocomplete_deletions():
+    version = time.time_ns()
+    cache.set_many({VERSION_KEY: version, DELETIONS_KEY: version}, timeout=None)
+
+
+@receiver(post_save, sender=VolunteerOpportunity)
+@receiver(post_save, sender=Volunteer)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def autocomplete_source_changed(sender, using, **kwargs):
+    transaction.on_commit(bump_autocomplete_version, using=using)
+
+
+@receiver(opportunities_bulk_changed, sender=VolunteerOpportunity)
+def autocomplete_sources_bulk_changed(sender, using, **kwargs):
+    transaction.on_commit(bump_autocomplete_version, using=using)
+
+
+@receiver(post_delete, sender=VolunteerOpportunity)
+@receiver(post_delete, sender=Volunteer)
+@receiver(opportunities_archived, sender=VolunteerOpportunity)
+@receiver(opportunities_purged, sender=VolunteerOpportunity)
+@receiver(volunteers_bulk_changed, sender=Volunteer)
+@receiver(volunteers_merged, sender=Volunteer)
+def autocomplete_sources_deleted(sender, using, **kwargs):
+    # volunteers_bulk_changed also covers bulk_create; an extra check is harmless.
+    transaction.on_commit(bump_autocomplete_deletions, using=using)
@@ -0,0 +1,521 @@
+"""Benchmark harness for the volunteers views.
+
+Each benchmarked endpoint declares a SQL query budget. ``measure`` drives
+an endpoint through the test client and records latency percentiles, the
+number of SQL queries and peak Python memory of a single request. Results
+can be compared against a stored baseline so that a change that adds
+queries or makes a view markedly slower fails the benchmark tests.
+
+``wsgi_throughput`` and ``asgi_throughput`` instead measure requests per
+second through the real WSGI and ASGI handlers, driven in process by a
+thread pool and by concurrent tasks respectively, so the two deployment
+modes can be compared without a server in the way.
+
+``read_write_load`` keeps readers busy on one endpoint while writer threads
+sign volunteers up in bursts, to show how well reads hold up during writes
+under the SQLite connection profile. ``signup_rush`` submits many concurrent
+sign-up forms for one capacity-limited opportunity and checks that it is
+never overfilled.
+"""
+import asyncio
+import gc
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .forms import VolunteerForm
+from .models import Category, Signup, Volunteer, VolunteerOpportunity, WaitlistEntry
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+
+
+@dataclass
+class Endpoint:
+    """A view request to benchmark and the most SQL queries it may run."""
+    name: str
+    max_queries: int
+    method: str = 'get'
+    expected_status: int = 200
+    # Called with the test case to build (url, data) or (url, data, headers)
+    # once the dataset exists.
+    request: object = None
+
+    def build(self, case):
+        url, data, *headers = self.request(case)
+        return url, data, headers[0] if headers else {}
+
+
+@dataclass
+class Measurement:
+    endpoint: str
+    size: int
+    queries: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_kb: float
+    status: int
+
+
+def _signup_data(case):
+    return reverse('volunteers:volunteer_signup'), {
+        'name': 'Benchmark Volunteer',
+        'age': 30,
+        'expertise': 'Load testing and general help.',
+        'opportunities': [case.upcoming.pk],
+    }
+
+
+def _revalidate(case, url):
+    """A conditional GET carrying the ETag of the current response."""
+    etag = case.client.get(url)['ETag']
+    return url, {}, {'If-None-Match': etag}
+
+
+ENDPOINTS = [
+    # Stats come from the warm cache, plus recent opportunities and signups.
+    Endpoint('dashboard', 2, request=lambda case: (reverse('volunteers:dashboard'), {})),
+    # One page of opportunities plus the category filter choices.
+    Endpoint('opportunity_list', 2, request=lambda case: (reverse('volunteers:opportunity_list'), {})),
+    Endpoint('opportunity_list_search', 2, request=lambda case: (
+        reverse('volunteers:opportunity_list'), {'search': 'tutor'}
+    )),
+    # The opportunity with its category, then its signups with their volunteers.
+    Endpoint('opportunity_detail', 2, request=lambda case: (
+        reverse('volunteers:opportunity_detail', args=[case.upcoming.pk]), {}
+    )),
+    # Upcoming opportunities for the page and for the form's choices.
+    Endpoint('volunteer_signup', 2, request=lambda case: (reverse('volunteers:volunteer_signup'), {})),
+    # Choice validation, then the volunteer lookup, existing signups and
+    # waitlist entries, the place claim and the signup insert inside one
+    # transaction.
+    Endpoint('volunteer_signup_post', 7, method='post', expected_status=302, request=_signup_data),
+    Endpoint('volunteer_list', 1, request=lambda case: (reverse('volunteers:volunteer_list'), {})),
+    # The two ETag aggregates, then one page of opportunities.
+    Endpoint('api_opportunities', 3, request=lambda case: (reverse('volunteers:api_opportunities'), {})),
+    Endpoint('api_opportunities_filtered', 4, request=lambda case: (
+        reverse('volunteers:api_opportunities'),
+        {'category': case.upcoming.category_id, 'date_from': timezone.now().date().isoformat()},
+    )),
+    Endpoint('api_opportunities_not_modified', 2, expected_status=304, request=lambda case: _revalidate(
+        case, reverse('volunteers:api_opportunities')
+    )),
+    Endpoint('api_dashboard_stats', 0, request=lambda case: (reverse('volunteers:api_dashboard_stats'), {})),
+    Endpoint('api_dashboard_stats_not_modified', 0, expected_status=304, request=lambda case: _revalidate(
+        case, reverse('volunteers:api_dashboard_stats')
+    )),
+]
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def measure(client, endpoint, url, data, size, repeats=20, headers=None):
+    """Benchmark one endpoint: a warm-up request, one traced request, then timed ones."""
+    method = getattr(client, endpoint.method)
+
+    def send(url, data):
+        return method(url, data, headers=headers)
+
+    send(url, data)
+
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        try:
+            response = send(url, data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    # Read now: the next request resets the connection's query log.
+    query_count = len(queries)
+
+    # Full garbage collections of the test process take tens of
+    # milliseconds and would land on whichever request triggers them.
+    gc.collect()
+    gc.disable()
+    try:
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            send(url, data)
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+
+    return Measurement(
+        endpoint=endpoint.name,
+        size=size,
+        queries=query_count,
+        p50_ms=round(statistics.median(timings), 3),
+        p95_ms=round(percentile(timings, 95), 3),
+        p99_ms=round(percentile(timings, 99), 3),
+        peak_kb=round(peak / 1024, 1),
+        status=response.status_code,
+    )
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not Path(path).exists():
+        return {}
+    return json.loads(Path(path).read_text())
+
+
+def write_baseline(measurements, path=BASELINE_PATH):
+    baseline = {}
+    for m in measurements:
+        baseline.setdefault(m.endpoint, {})[str(m.size)] = {'queries': m.queries, 'p95_ms': m.p95_ms}
+    Path(path).write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+
+
+def regressions(measurement, baseline, tolerance, slack_ms=5.0):
+    """Describe how ``measurement`` regressed against its baseline entry, if at all.
+
+    Query counts must not grow. Latency may grow by ``tolerance`` (0.5 means
+    50%) plus ``slack_ms``, which absorbs timer noise on very fast views.
+    """
+    entry = baseline.get(measurement.endpoint, {}).get(str(measurement.size))
+    if not entry:
+        return []
+    problems = []
+    if measurement.queries > entry['queries']:
+        problems.append(f'{measurement.queries} queries, baseline {entry["queries"]}')
+    limit = entry['p95_ms'] * (1 + tolerance) + slack_ms
+    if measurement.p95_ms > limit:
+        problems.append(f'p95 {measurement.p95_ms:.1f}ms, baseline {entry["p95_ms"]:.1f}ms')
+    return problems
+
+
+def format_table(measurements):
+    header = f'{"endpoint":<36}{"rows":>8}{"queries":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"peak KB":>10}'
+    lines = [header, '-' * len(header)]
+    for m in measurements:
+        lines.append(
+            f'{m.endpoint:<36}{m.size:>8}{m.queries:>9}{m.p50_ms:>9.2f}{m.p95_ms:>9.2f}'
+            f'{m.p99_ms:>9.2f}{m.peak_kb:>10.1f}'
+        )
+    return '\n'.join(lines)
+
+
+@dataclass
+class Throughput:
+    endpoint: str
+    server: str
+    requests: int
+    concurrency: int
+    seconds: float
+    errors: int
+
+    @property
+    def requests_per_second(self):
+        return self.requests / self.seconds if self.seconds else 0.0
+
+
+def handler_endpoints(opportunity):
+    """Read-only (name, url) pairs served by both the sync and async views."""
+    return [
+        ('dashboard', reverse('volunteers:dashboard')),
+        ('opportunity_list', reverse('volunteers:opportunity_list')),
+        ('opportunity_detail', reverse('volunteers:opportunity_detail', args=[opportunity.pk])),
+        ('volunteer_list', reverse('volunteers:volunteer_list')),
+        ('api_opportunities', reverse('volunteers:api_opportunities')),
+        ('api_opportunities_search', reverse('volunteers:api_opportunities') + '?search=tutor'),
+        ('api_dashboard_stats', reverse('volunteers:api_dashboard_stats')),
+    ]
+
+
+def _wsgi_get(application, url, host):
+    path, _, query = url.partition('?')
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': host}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = application(environ, lambda status, headers, exc_info=None: statuses.append(int(status[:3])))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return statuses[0]
+
+
+def wsgi_throughput(application, name, url, requests, concurrency, host='localhost'):
+    """Send ``requests`` GETs through a WSGI application from ``concurrency`` threads."""
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        statuses = list(pool.map(lambda _: _wsgi_get(application, url, host), range(requests)))
+        seconds = time.perf_counter() - started
+    return Throughput(name, 'wsgi', requests, concurrency, seconds, sum(status != 200 for status in statuses))
+
+
+async def _asgi_get(application, url, host):
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': parts.path,
+        'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(),
+        'headers': [(b'host', host.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (host, 80),
+    }
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; the handler cancels this wait.
+        await asyncio.Future()
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+def asgi_throughput(application, name, url, requests, concurrency, host='localhost'):
+    """Send ``requests`` GETs through an ASGI application, at most ``concurrency`` at a time."""
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call():
+            async with semaphore:
+                return await _asgi_get(application, url, host)
+
+        return await asyncio.gather(*(call() for _ in range(requests)))
+
+    started = time.perf_counter()
+    statuses = asyncio.run(run())
+    seconds = time.perf_counter() - started
+    return Throughput(name, 'asgi', requests, concurrency, seconds, sum(status != 200 for status in statuses))
+
+
+def format_throughput(results):
+    """Side-by-side requests/sec per endpoint, one column per server."""
+    by_endpoint = {}
+    for result in results:
+        by_endpoint.setdefault(result.endpoint, {})[result.server] = result
+    header = f'{"endpoint":<36}{"wsgi req/s":>12}{"asgi req/s":>12}{"asgi/wsgi":>11}{"errors":>8}'
+    lines = [header, '-' * len(header)]
+    for endpoint, servers in by_endpoint.items():
+        wsgi, asgi = servers.get('wsgi'), servers.get('asgi')
+        wsgi_rps = wsgi.requests_per_second if wsgi else 0.0
+        asgi_rps = asgi.requests_per_second if asgi else 0.0
+        ratio = f'{asgi_rps / wsgi_rps:.2f}' if wsgi_rps else '-'
+        errors = sum(result.errors for result in servers.values())
+        lines.append(f'{endpoint:<36}{wsgi_rps:>12.1f}{asgi_rps:>12.1f}{ratio:>11}{errors:>8}')
+    return '\n'.join(lines)
+
+
+@dataclass
+class ReadWriteLoad:
+    phase: str
+    seconds: float
+    reads: int
+    read_errors: int
+    writes: int
+    write_errors: int
+
+    @property
+    def reads_per_second(self):
+        return self.reads / self.seconds if self.seconds else 0.0
+
+    @property
+    def writes_per_second(self):
+        return self.writes / self.seconds if self.seconds else 0.0
+
+
+def read_write_load(application, url, seconds, readers, writers, burst=10, host='localhost', phase=''):
+    """Run WSGI GETs of ``url`` from ``readers`` threads for ``seconds``.
+
+    Meanwhile each of ``writers`` threads repeatedly signs a volunteer up for
+    ``burst`` opportunities, one transaction per signup, then withdraws
+    them again. A write that fails, typically with "database is locked",
+    counts as a write error; a response other than 200 as a read error.
+    Writers clean up after themselves, so the database ends as it started.
+    """
+    opportunity_ids = list(VolunteerOpportunity.objects.values_list('pk', flat=True))
+    burst = min(burst, len(opportunity_ids))
+    stop = threading.Event()
+    totals = {'reads': 0, 'read_errors': 0, 'writes': 0, 'write_errors': 0}
+    lock = threading.Lock()
+
+    def add(**counts):
+        with lock:
+            for key, value in counts.items():
+                totals[key] += value
+
+    def read():
+        reads = errors = 0
+        try:
+            while not stop.is_set():
+                reads += 1
+                errors += _wsgi_get(application, url, host) != 200
+        finally:
+            connections.close_all()
+            add(reads=reads, read_errors=errors)
+
+    def write(number):
+        rng = random.Random(number)
+        writes = errors = 0
+        volunteer = Volunteer.objects.create(name=f'Load test writer {number}', age=30, expertise='')
+        signed_up = set()
+        try:
+            while not stop.is_set():
+                for opportunity_id in set(rng.sample(opportunity_ids, burst)) - signed_up:
+                    try:
+                        with transaction.atomic():
+                            Signup.objects.create(volunteer=volunteer, opportunity_id=opportunity_id)
+                        signed_up.add(opportunity_id)
+                        writes += 1
+                    except OperationalError:
+                        errors += 1
+                try:
+                    with transaction.atomic():
+                        volunteer.signups.all().delete()
+                    signed_up.clear()
+                    writes += 1
+                except OperationalError:
+                    errors += 1
+        finally:
+            # Other writers may still hold the lock; keep trying.
+            while True:
+                try:
+                    volunteer.delete()
+                    break
+                except OperationalError:
+                    pass
+            connections.close_all()
+            add(writes=writes, write_errors=errors)
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    threads += [threading.Thread(target=write, args=(number,)) for number in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return ReadWriteLoad(phase, time.perf_counter() - started, **totals)
+
+
+def format_read_write_load(results):
+    header = f'{"phase":<24}{"reads/s":>10}{"read errors":>13}{"writes/s":>10}{"write errors":>14}'
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(
+            f'{r.phase:<24}{r.reads_per_second:>10.1f}{r.read_errors:>13}'
+            f'{r.writes_per_second:>10.1f}{r.write_errors:>14}'
+        )
+    return '\n'.join(lines)
+
+
+@dataclass
+class SignupRush:
+    attempts: int
+    concurrency: int
+    capacity: int
+    seconds: float
+    signed_up: int
+    waitlisted: int
+    errors: int
+    latencies_ms: list
+    # Completed signups per tenth of the run, to show throughput stays level.
+    per_interval: list
+
+    @property
+    def overfilled(self):
+        return max(0, self.signed_up - self.capacity)
+
+
+def signup_rush(attempts, concurrency, capacity):
+    """Submit ``attempts`` sign-up forms for one new opportunity from ``concurrency`` threads.
+
+    The opportunity holds ``capacity`` volunteers. Everything created is
+    deleted again afterwards.
+    """
+    opportunity = VolunteerOpportunity.objects.create(
+        title='Signup rush benchmark', description='Temporary opportunity for benchmark_signups.',
+        date=timezone.now().date(), category=Category.objects.first(), capacity=capacity,
+    )
+    completed = []
+
+    def submit(number):
+        form = VolunteerForm({
+            'name': f'Rush volunteer {number}', 'age': 30, 'expertise': 'Benchmarking.',
+            'opportunities': [opportunity.pk],
+        })
+        started = time.perf_counter()
+        try:
+            if not form.is_valid():
+                raise ValueError(form.errors.as_text())
+            form.save()
+            ok = True
+        except OperationalError:
+            ok = False
+        finally:
+            connections.close_all()
+        completed.append((time.perf_counter(), (time.perf_counter() - started) * 1000, ok))
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(submit, range(attempts)))
+        seconds = time.perf_counter() - started
+        opportunity.refresh_from_db()
+        signed_up = Signup.objects.filter(opportunity=opportunity).count()
+        if signed_up != opportunity.volunteer_count:
+            raise AssertionError(f'{signed_up} signups but volunteer_count is {opportunity.volunteer_count}')
+        intervals = [0] * 10
+        for finished, _, ok in completed:
+            if ok:
+                intervals[min(9, int((finished - started) / seconds * 10))] += 1
+        return SignupRush(
+            attempts, concurrency, capacity, seconds, signed_up,
+            WaitlistEntry.objects.filter(opportunity=opportunity).count(),
+            sum(not ok for _, _, ok in completed),
+            [latency for _, latency, _ in completed],
+            intervals,
+        )
+    finally:
+        Volunteer.objects.filter(name__startswith='Rush volunteer ').delete()
+        opportunity.delete()
+
+
+def format_signup_rush(result):
+    latencies = result.latencies_ms
+    return '\n'.join([
+        f'{result.attempts} signups, {result.concurrency} concurrent, capacity {result.capacity}',
+        f'signed up {result.signed_up}, waitlisted {result.waitlisted}, errors {result.errors}, '
+        f'overfilled by {result.overfilled}',
+        f'{result.attempts / result.seconds:.1f} signups/s, latency p50 {statistics.median(latencies):.1f} ms, '
+        f'p95 {percentile(latencies, 95):.1f} ms, p99 {percentile(latencies, 99):.1f} ms',
+        'completed per tenth of the run: ' + ' '.join(str(n) for n in result.per_interval),
+    ])
@@ -0,0 +1,277 @@
+"""Finding and merging volunteers who signed up more than once.
+
+People who come back to the signup form type their name and expertise a
+little differently each time, so the exact name, age and expertise lookup
+in ``VolunteerForm`` misses them. ``find_duplicates`` looks for them across
+a whole table without comparing every pair:
+
+1. One pass over the names files each volunteer under a few blocking keys:
+   the normalised name (case, accents, punctuation and word order removed)
+   and the bands of a MinHash signature of its character trigrams, so names
+   a typo apart usually share at least one band.
+2. Only volunteers sharing a key are compared, within an age window, on
+   how closely each word of their names matches and on the words of their
+   expertise. Matching pairs are joined into clusters.
+
+``merge_batch`` then folds each cluster into its oldest volunteer with a
+few set-based statements in one transaction: signups and waitlist entries
+move to the survivor, ones the survivor already has are dropped, and the
+other volunteers are deleted. Counts, rollups and caches are updated as for
+any other signup delete, and ``volunteers_merged`` is sent.
+"""
+import difflib
+import functools
+import random
+import re
+import unicodedata
+import zlib
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .matching import tokenize
+from .models import ArchivedSignup, Signup, Volunteer, WaitlistEntry, record_signup_changes
+from .signals import volunteers_merged
+
+# "Jonhson" scores 0.86 against "Johnson", "Sara" 0.89 against "Sarah" and
+# "Maria" 0.6 against "Priya".
+NAME_THRESHOLD = 0.8
+EXPERTISE_THRESHOLD = 0.3
+MAX_AGE_DIFFERENCE = 1
+# 5 bands of 2 hashes: names with a trigram Jaccard similarity of 0.5 share
+# a band about 75% of the time, at 0.7 about 97%.
+BANDS, ROWS = 5, 2
+# Blocks bigger than this are too common a name to tell people apart by.
+MAX_BLOCK_SIZE = 1000
+DEFAULT_BATCH_SIZE = 500
+
+_MASKS = [random.Random(index).getrandbits(32) for index in range(BANDS * ROWS)]
+_KEY_BITS = 31
+
+
+def normalize_name(name):
+    """``name`` lowercased, without accents or punctuation, words sorted."""
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return ' '.join(sorted(re.findall(r'[^\W\d_]+', name.casefold())))
+
+
+def trigrams(text):
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@functools.lru_cache(maxsize=65536)
+def name_similarity(a, b):
+    """How well two normalised names match, from 0 to 1.
+
+    Each word of the shorter name (of both, if equally long) is matched
+    with its closest word in the other, and the worst match counts, so a
+    shared surname cannot make up for a different first name. A lone word
+    only matches a lone word.
+    """
+    if a == b:
+        return 1.0
+    short, long = sorted((a.split(), b.split()), key=len)
+    if not short or len(short) < min(2, len(long)):
+        return 0.0
+    directions = [(short, long), (long, short)] if len(short) == len(long) else [(short, long)]
+    return min(
+        max(difflib.SequenceMatcher(None, word, other).ratio() for other in others)
+        for words, others in directions
+        for word in words
+    )
+
+
+def similarity(a, b):
+    """Jaccard similarity of two sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def blocking_keys(name):
+    """Hashes ``name`` is filed under; similar names share at least one, usually."""
+    normalized = normalize_name(name)
+    if not normalized:
+        return set()
+    # crc32 rather than hash(), which is salted per process, so the same
+    # names share bands on every run.
+    hashes = [zlib.crc32(gram.encode()) for gram in trigrams(normalized)]
+    signature = [min(h ^ mask for h in hashes) for mask in _MASKS]
+    keys = {hash(('name', normalized))}
+    for band in range(BANDS):
+        keys.add(hash((band, *signature[band * ROWS:(band + 1) * ROWS])))
+    return keys
+
+
+def _blocks(queryset):
+    """Lists of volunteer ids sharing a blocking key, and the number of oversized blocks skipped."""
+    # Each (key, id) pair packed into one int (ids below 2**32), so a million
+    # volunteers sort as a plain list of ints rather than of tuples.
+    mask = (1 << _KEY_BITS) - 1
+    packed = []
+    for pk, name in queryset.order_by().values_list('pk', 'name').iterator(chunk_size=5000):
+        packed.extend((key & mask) << 32 | pk for key in blocking_keys(name))
+    packed.sort()
+
+    blocks, skipped, start = [], 0, 0
+    for end in range(1, len(packed) + 1):
+        if end < len(packed) and packed[end] >> 32 == packed[start] >> 32:
+            continue
+        if end - start > MAX_BLOCK_SIZE:
+            skipped += 1
+        elif end - start > 1:
+            blocks.append([value & 0xFFFFFFFF for value in packed[start:end]])
+        start = end
+    return blocks, skipped
+
+
+def _details(queryset, ids):
+    """``{id: (age, normalised name, expertise words)}`` for the given volunteers."""
+    ids, details = sorted(ids), {}
+    for start in range(0, len(ids), 900):
+        rows = queryset.model.objects.using(queryset.db).filter(pk__in=ids[start:start + 900]).values_list(
+            'pk', 'name', 'age', 'expertise'
+        )
+        for pk, name, age, expertise in rows:
+            details[pk] = (age, normalize_name(name), set(tokenize(expertise)))
+    return details
+
+
+def is_duplicate(a, b):
+    """Whether two ``_details`` entries look like the same person."""
+    return (
+        abs(a[0] - b[0]) <= MAX_AGE_DIFFERENCE
+        and name_similarity(a[1], b[1]) >= NAME_THRESHOLD
+        and similarity(a[2], b[2]) >= EXPERTISE_THRESHOLD
+    )
+
+
+def find_duplicates(queryset=None):
+    """Clusters of volunteers in ``queryset`` that look like the same person.
+
+    Returns ``(clusters, skipped)``: lists of volunteer ids, oldest first,
+    and the number of blocks skipped for being larger than
+    ``MAX_BLOCK_SIZE``.
+    """
+    queryset = Volunteer.objects.all() if queryset is None else queryset
+    blocks, skipped = _blocks(queryset)
+    details = _details(queryset, {pk for block in blocks for pk in block})
+
+    parent = {}
+
+    def root(pk):
+        while parent.get(pk, pk) != pk:
+            parent[pk] = parent.get(parent[pk], parent[pk])
+            pk = parent[pk]
+        return pk
+
+    for block in blocks:
+        # Sorted by age, each volunteer is only compared with those close in age.
+        block = sorted((pk for pk in set(block) if pk in details), key=lambda pk: details[pk][0])
+        for i, a in enumerate(block):
+            for b in block[i + 1:]:
+                if details[b][0] - details[a][0] > MAX_AGE_DIFFERENCE:
+                    break
+                first, second = root(a), root(b)
+                if first != second and is_duplicate(details[a], details[b]):
+                    parent[max(first, second)] = min(first, second)
+
+    clusters = {}
+    for pk in parent:
+        clusters.setdefault(root(pk), set()).add(pk)
+    return sorted(sorted(cluster | {survivor}) for survivor, cluster in clusters.items()), skipped
+
+
+def merge_batch(clusters, using='default'):
+    """Fold each cluster of volunteer ids into its first (oldest) volunteer.
+
+    Returns ``(volunteers, signups, waitlist_entries)`` removed: volunteers
+    merged away, and signups and waitlist entries dropped because the
+    survivor already had one for the same opportunity.
+    """
+    survivor_of = {pk: cluster[0] for cluster in clusters for pk in cluster}
+    duplicates = [pk for pk, survivor in survivor_of.items() if pk != survivor]
+    if not duplicates:
+        return 0, 0, 0
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    signups, waitlist = quote(Signup._meta.db_table), quote(WaitlistEntry._meta.db_table)
+    volunteers, archived = quote(Volunteer._meta.db_table), quote(ArchivedSignup._meta.db_table)
+    merge = (
+        f'WITH merge (volunteer_id, survivor_id) AS '
+        f'(VALUES {", ".join(["(%s, %s)"] * len(survivor_of))}) '
+    )
+    merge_params = [value for pair in survivor_of.items() for value in pair]
+    in_duplicates = f'IN ({", ".join(["%s"] * len(duplicates))})'
+    survivor = '(SELECT survivor_id FROM merge WHERE merge.volunteer_id = {table}.volunteer_id)'
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        # Within a cluster, keep the first signup for each opportunity.
+        cursor.execute(
+            merge + f'SELECT s.id FROM {signups} s INNER JOIN merge m ON m.volunteer_id = s.volunteer_id '
+            f'WHERE EXISTS (SELECT 1 FROM {signups} o INNER JOIN merge n ON n.volunteer_id = o.volunteer_id '
+            f'WHERE n.survivor_id = m.survivor_id AND o.opportunity_id = s.opportunity_id AND o.id < s.id)',
+            merge_params,
+        )
+        dropped = [pk for pk, in cursor.fetchall()]
+        counts = Signup.objects.using(using).filter(pk__in=dropped)._counts_by_opportunity_day()
+        if dropped:
+            cursor.execute(f'DELETE FROM {signups} WHERE id IN ({", ".join(["%s"] * len(dropped))})', dropped)
+        cursor.execute(
+            merge + f'UPDATE {signups} SET volunteer_id = {survivor.format(table=signups)}, updated_at = %s '
+            f'WHERE volunteer_id {in_duplicates}',
+            [*merge_params, connection.ops.adapt_datetimefield_value(timezone.now()), *duplicates],
+        )
+        # Keep the earliest waitlist entry for each opportunity, unless the
+        # survivor now has a signup for it.
+        cursor.execute(
+            merge + f'SELECT w.id FROM {waitlist} w INNER JOIN merge m ON m.volunteer_id = w.volunteer_id '
+            f'WHERE EXISTS (SELECT 1 FROM {signups} s '
+            f'WHERE s.volunteer_id = m.survivor_id AND s.opportunity_id = w.opportunity_id) '
+            f'OR EXISTS (SELECT 1 FROM {waitlist} o INNER JOIN merge n ON n.volunteer_id = o.volunteer_id '
+            f'WHERE n.survivor_id = m.survivor_id AND o.opportunity_id = w.opportunity_id '
+            f'AND (o.created_at < w.created_at OR (o.created_at = w.created_at AND o.id < w.id)))',
+            merge_params,
+        )
+        dropped_entries = [pk for pk, in cursor.fetchall()]
+        if dropped_entries:
+            cursor.execute(
+                f'DELETE FROM {waitlist} WHERE id IN ({", ".join(["%s"] * len(dropped_entries))})', dropped_entries
+            )
+        cursor.execute(
+            merge + f'UPDATE {waitlist} SET volunteer_id = {survivor.format(table=waitlist)} '
+            f'WHERE volunteer_id {in_duplicates}',
+            [*merge_params, *duplicates],
+        )
+        cursor.execute(
+            merge + f'UPDATE {archived} SET volunteer_id = {survivor.format(table=archived)} '
+            f'WHERE volunteer_id {in_duplicates}',
+            [*merge_params, *duplicates],
+        )
+        cursor.execute(f'DELETE FROM {volunteers} WHERE id {in_duplicates}', duplicates)
+        record_signup_changes({key: -n for key, n in counts.items()}, using=using)
+        volunteers_merged.send(
+            sender=Volunteer,
+            survivors={pk: survivor_of[pk] for pk in duplicates},
+            using=using,
+        )
+    return len(duplicates), len(dropped), len(dropped_entries)
+
+
+def merge_duplicates(clusters, batch_size=DEFAULT_BATCH_SIZE, using='default'):
+    """Merge ``clusters`` in batches of about ``batch_size`` volunteers, yielding each ``merge_batch`` result.
+
+    Batches are bounded by volunteers rather than clusters because the
+    statements look each volunteer up in the batch's mapping.
+    """
+    batch, size = [], 0
+    for cluster in clusters:
+        batch.append(cluster)
+        size += len(cluster)
+        if size >= batch_size:
+            yield merge_batch(batch, using)
+            batch, size = [], 0
+    if batch:
+        yield merge_batch(batch, using)
@@ -0,0 +1,44 @@
+"""Emails to volunteers, sent from the task queue rather than the request.
+
+Emails go through Django's email backend: the console or file backend
+locally, SMTP in production.
+"""
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from .matching import recommend
+from .models import Volunteer, VolunteerOpportunity
+from .tasks import task
+
+# Other opportunities suggested in a signup confirmation.
+SUGGESTIONS = 3
+
+
+@task()
+def send_signup_confirmation(volunteer_id, opportunity_ids):
+    """Confirm a volunteer's signups and waitlist places among ``opportunity_ids``.
+
+    Reads the volunteer's places when it runs, so a retry or a late run
+    reports them as they are then; sends nothing if none are left.
+    """
+    volunteer = Volunteer.objects.filter(pk=volunteer_id).first()
+    if volunteer is None or not volunteer.email:
+        return
+    chosen = VolunteerOpportunity.objects.filter(pk__in=opportunity_ids).select_related('category').order_by(
+        'date', 'title'
+    )
+    signed_up = list(chosen.filter(signups__volunteer=volunteer))
+    waitlisted = list(chosen.filter(waitlist__volunteer=volunteer))
+    if not signed_up and not waitlisted:
+        return
+    suggested = [
+        opportunity for opportunity in recommend(volunteer.expertise, SUGGESTIONS + len(opportunity_ids))
+        if opportunity.pk not in opportunity_ids
+    ][:SUGGESTIONS]
+    context = {'volunteer': volunteer, 'signed_up': signed_up, 'waitlisted': waitlisted, 'suggested': suggested}
+    send_mail(
+        render_to_string('volunteers/emails/signup_confirmation_subject.txt', context).strip(),
+        render_to_string('volunteers/emails/signup_confirmation.txt', context),
+        None,
+        [volunteer.email],
+    )
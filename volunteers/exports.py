@@ -0,0 +1,93 @@
+"""Streaming exports of opportunity querysets.
+
+Rows are read with ``values()`` in chunks through ``.iterator()`` and
+written out one at a time, so memory use does not depend on the number of
+rows exported. Volunteer counts come from the stored column, not from a
+per-row query.
+
+The ``aiter_*`` variants read through ``aiterator()`` for async views; an
+ASGI server would otherwise buffer a synchronous iterator in full before
+sending the first byte.
+"""
+import csv
+import json
+
+EXPORT_FIELDS = [
+    'id', 'title', 'description', 'date', 'volunteer_count',
+    'category_id', 'category__name', 'category__slug',
+]
+CSV_HEADER = [
+    'id', 'title', 'description', 'date', 'volunteer_count',
+    'category_id', 'category_name', 'category_slug',
+]
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose ``write`` returns the value, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def _rows(opportunities):
+    return opportunities.values_list(*EXPORT_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+
+
+async def _arows(opportunities):
+    # values(), since values_list() runs its query as soon as aiterator()
+    # starts, outside the worker thread.
+    async for row in opportunities.values(*EXPORT_FIELDS).aiterator(chunk_size=CHUNK_SIZE):
+        yield tuple(row[field] for field in EXPORT_FIELDS)
+
+
+def _ndjson_line(row):
+    id, title, description, date, volunteer_count, category_id, category_name, category_slug = row
+    return json.dumps({
+        'id': id,
+        'title': title,
+        'description': description,
+        'date': date.isoformat(),
+        'category': {
+            'id': category_id,
+            'name': category_name,
+            'slug': category_slug,
+        },
+        'volunteer_count': volunteer_count,
+    }) + '\n'
+
+
+def iter_ndjson(opportunities):
+    """One JSON object per line, shaped like ``api_opportunities`` entries."""
+    for row in _rows(opportunities):
+        yield _ndjson_line(row)
+
+
+async def aiter_ndjson(opportunities):
+    async for row in _arows(opportunities):
+        yield _ndjson_line(row)
+
+
+def iter_csv(opportunities):
+    """A header row followed by one flattened row per opportunity."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in _rows(opportunities):
+        yield writer.writerow(row)
+
+
+async def aiter_csv(opportunities):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    async for row in _arows(opportunities):
+        yield writer.writerow(row)
+
+
+EXPORT_FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv'),
+}
+ASYNC_EXPORT_FORMATS = {
+    'ndjson': (aiter_ndjson, 'application/x-ndjson'),
+    'csv': (aiter_csv, 'text/csv'),
+}
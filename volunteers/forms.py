@@ -1,6 +1,12 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import Volunteer, VolunteerOpportunity, Category
+from django.db import transaction
+from django.db.models import Value
+from django.utils import timezone
+from datetime import timedelta
+from .emails import send_signup_confirmation
+from .models import ActivityRollup, Category, Signup, Volunteer, VolunteerOpportunity
+from .tasks import enqueue
 
 
 class VolunteerOpportunityForm(forms.ModelForm):
@@ -8,7 +14,7 @@ class VolunteerOpportunityForm(forms.ModelForm):
 
     class Meta:
         model = VolunteerOpportunity
-        fields = ['title', 'description', 'date', 'category']
+        fields = ['title', 'description', 'date', 'category', 'capacity']
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -30,6 +36,11 @@ class VolunteerOpportunityForm(forms.ModelForm):
                 'class': 'form-select',
                 'required': True
             }),
+            'capacity': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'No limit',
+                'min': 1
+            }),
         }
 
     def clean_title(self):
@@ -52,11 +63,25 @@ class VolunteerOpportunityForm(forms.ModelForm):
 
 
 class VolunteerForm(forms.ModelForm):
-    """Form for volunteer sign-up."""
+    """Form for volunteer sign-up to one or more opportunities.
+
+    Saving reuses the volunteer record with the same name, age and expertise
+    if there is one, and signs it up for the chosen opportunities that have
+    room, waitlisting it for the full ones, in one transaction. Volunteers
+    who give an email address are sent a confirmation from the task queue.
+    """
+
+    opportunities = forms.ModelMultipleChoiceField(
+        queryset=VolunteerOpportunity.objects.all(),
+        widget=forms.SelectMultiple(attrs={
+            'class': 'form-select',
+            'required': True
+        })
+    )
 
     class Meta:
         model = Volunteer
-        fields = ['name', 'age', 'expertise', 'opportunity']
+        fields = ['name', 'age', 'email', 'expertise']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -69,16 +94,16 @@ class VolunteerForm(forms.ModelForm):
                 'min': 18,
                 'required': True
             }),
+            'email': forms.EmailInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'you@example.com',
+            }),
             'expertise': forms.Textarea(attrs={
                 'class': 'form-control',
                 'placeholder': 'Describe your skills and expertise',
                 'rows': 3,
                 'required': True
             }),
-            'opportunity': forms.Select(attrs={
-                'class': 'form-select',
-                'required': True
-            }),
         }
 
     def clean_name(self):
@@ -101,6 +126,48 @@ class VolunteerForm(forms.ModelForm):
             raise ValidationError('Expertise description is required.')
         return expertise.strip()
 
+    def save(self, commit=True):
+        """Save the volunteer and their signups; returns the volunteer.
+
+        The new ``Signup`` rows are available as ``self.signups``, and the
+        ids of the chosen opportunities the volunteer is waitlisted for as
+        ``self.waitlisted``.
+        """
+        if not commit:
+            raise ValueError('VolunteerForm cannot save without committing.')
+        with transaction.atomic():
+            person = {field: self.cleaned_data[field] for field in ('name', 'age', 'expertise')}
+            email = self.cleaned_data['email']
+            # Anyone can submit the form, so it never changes the email of an
+            # existing volunteer: a different address makes a new one.
+            volunteer = Volunteer.objects.filter(**person, email__iexact=email).order_by('pk').first()
+            if volunteer is None:
+                volunteer = Volunteer.objects.create(**person, email=email)
+            opportunities = self.cleaned_data['opportunities']
+            # {opportunity_id: whether waitlisted} for places already held.
+            existing = dict(
+                volunteer.signups.filter(opportunity__in=opportunities).order_by().values_list(
+                    'opportunity_id', Value(False)
+                ).union(
+                    volunteer.waitlist_entries.filter(opportunity__in=opportunities).order_by().values_list(
+                        'opportunity_id', Value(True)
+                    )
+                )
+            )
+            self.signups, entries = Signup.objects.claim(
+                volunteer, [opportunity for opportunity in opportunities if opportunity.pk not in existing]
+            )
+            self.waitlisted = {pk for pk, waitlisted in existing.items() if waitlisted}
+            self.waitlisted.update(entry.opportunity_id for entry in entries)
+            if volunteer.email and (self.signups or entries):
+                enqueue(
+                    send_signup_confirmation,
+                    volunteer_id=volunteer.pk,
+                    opportunity_ids=[opportunity.pk for opportunity in opportunities],
+                )
+        self.instance = volunteer
+        return volunteer
+
 
 class OpportunityFilterForm(forms.Form):
     """Form for filtering volunteer opportunities."""
@@ -131,6 +198,49 @@ class OpportunityFilterForm(forms.Form):
         required=False,
         widget=forms.TextInput(attrs={
             'class': 'form-control',
-            'placeholder': 'Search opportunities...'
+            'placeholder': 'Search opportunities...',
+            'list': 'searchSuggestions',
+            'autocomplete': 'off'
         })
-    )
\ No newline at end of file
+    )
+    facets = forms.BooleanField(required=False, widget=forms.HiddenInput)
+
+    def show_category_counts(self, categories):
+        """Label each category choice with its count from ``opportunity_facets``."""
+        counts = {category['id']: category['count'] for category in categories}
+        self.fields['category'].label_from_instance = (
+            lambda category: f'{category.name} ({counts.get(category.pk, 0)})'
+        )
+
+
+class ActivityForm(forms.Form):
+    """Query parameters of the activity calendar API.
+
+    Without dates it covers the last 30 days, 12 weeks or 12 months up to
+    today; ``cleaned_data`` always has ``granularity``, ``start`` and ``end``.
+    """
+    MAX_PERIODS = 1000
+    DEFAULT_SPAN = {
+        ActivityRollup.DAY: timedelta(days=29),
+        ActivityRollup.WEEK: timedelta(weeks=11),
+        ActivityRollup.MONTH: timedelta(days=334),
+    }
+    PERIOD_DAYS = {ActivityRollup.DAY: 1, ActivityRollup.WEEK: 7, ActivityRollup.MONTH: 28}
+
+    granularity = forms.ChoiceField(choices=ActivityRollup.GRANULARITY_CHOICES, required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    category = forms.ModelChoiceField(queryset=Category.objects.all(), required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+        granularity = cleaned_data['granularity'] = cleaned_data.get('granularity') or ActivityRollup.DAY
+        end = cleaned_data['end'] = cleaned_data.get('end') or timezone.now().date()
+        start = cleaned_data['start'] = cleaned_data.get('start') or end - self.DEFAULT_SPAN[granularity]
+        if start > end:
+            raise ValidationError('start must not be after end.')
+        if (end - start).days // self.PERIOD_DAYS[granularity] >= self.MAX_PERIODS:
+            raise ValidationError(f'At most {self.MAX_PERIODS} periods can be requested at once.')
+        return cleaned_data
@@ -0,0 +1,89 @@
+"""Version keys for cached template fragments.
+
+Opportunity cards are cached with ``{% cache %}`` under a key built from the
+opportunity's ``updated_at`` and ``volunteer_count`` (signups do not touch
+``updated_at``) and from a version number for its category, since cards
+show the category's name and slug. Saving or deleting a category bumps its
+version, so every card in it misses once and is re-rendered. No fragment is
+ever deleted; outdated ones are simply never asked for again and expire.
+
+One more version covers all categories together, for validators of
+responses that show any of them, like the ETag of the opportunities API.
+
+Versions live in the default cache. A version that was evicted is
+re-created from the clock rather than from zero, so it can never collide
+with a version that was in use before.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category
+
+VERSION_KEY = 'volunteers:category-version:{}'
+CATEGORIES_VERSION_KEY = 'volunteers:categories-version'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def _keys(opportunities):
+    return {VERSION_KEY.format(opportunity.category_id) for opportunity in opportunities}
+
+
+def _annotate(opportunities, versions):
+    missing = {key: _new_version() for key in _keys(opportunities) if key not in versions}
+    for opportunity in opportunities:
+        key = VERSION_KEY.format(opportunity.category_id)
+        opportunity.category_version = versions.get(key) or missing[key]
+    return missing
+
+
+def add_category_versions(opportunities):
+    """Set ``category_version`` on each opportunity for its card's cache key (one cache read)."""
+    opportunities = list(opportunities)
+    missing = _annotate(opportunities, cache.get_many(_keys(opportunities)))
+    if missing:
+        cache.set_many(missing, timeout=None)
+
+
+async def aadd_category_versions(opportunities):
+    """Async version of ``add_category_versions()``."""
+    opportunities = list(opportunities)
+    missing = _annotate(opportunities, await cache.aget_many(_keys(opportunities)))
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+
+
+def categories_version():
+    """The version of all categories together."""
+    version = cache.get(CATEGORIES_VERSION_KEY)
+    if version is None:
+        version = _new_version()
+        cache.add(CATEGORIES_VERSION_KEY, version, timeout=None)
+    return version
+
+
+async def acategories_version():
+    """Async version of ``categories_version()``."""
+    version = await cache.aget(CATEGORIES_VERSION_KEY)
+    if version is None:
+        version = _new_version()
+        await cache.aadd(CATEGORIES_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def bump_category_version(category_id):
+    version = _new_version()
+    cache.set_many({VERSION_KEY.format(category_id): version, CATEGORIES_VERSION_KEY: version}, timeout=None)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, using, **kwargs):
+    category_id = instance.pk
+    transaction.on_commit(lambda: bump_category_version(category_id), using=using)
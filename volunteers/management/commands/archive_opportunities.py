@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from volunteers.archive import DEFAULT_BATCH_SIZE, archivable, archive_batch, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves past opportunities, their signups and volunteers left without any into the '
+        'archive tables, in batches. Safe to interrupt and re-run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=30,
+            help='Keep opportunities dated up to this many days ago (default: 30)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Opportunities archived per transaction (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many opportunities would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['keep_days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--keep-days must be >= 0 and --batch-size >= 1.')
+        cutoff = archive_cutoff(options['keep_days'])
+        if options['dry_run']:
+            self.stdout.write(f'{archivable(cutoff).count()} opportunities dated before {cutoff} would be archived.')
+            return
+
+        self.stdout.write(f'Archiving opportunities dated before {cutoff}...')
+        started = time.monotonic()
+        totals = [0, 0, 0]
+        while True:
+            moved = archive_batch(cutoff, options['batch_size'])
+            if not moved[0]:
+                break
+            totals = [total + n for total, n in zip(totals, moved)]
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'  {totals[0]} opportunities, {totals[1]} signups, {totals[2]} volunteers '
+                f'({sum(totals) / elapsed:,.0f} rows/sec)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {totals[0]} opportunities, {totals[1]} signups and {totals[2]} volunteers '
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
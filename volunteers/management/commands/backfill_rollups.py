@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from volunteers import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the activity rollup table from the signups and opportunities tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report days whose stored counts are wrong, do not rebuild',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            counted, stored = rollups.counted(), rollups.stored()
+            wrong = sorted(key for key in counted.keys() | stored.keys() if counted.get(key) != stored.get(key))
+            for category_id, day in wrong:
+                self.stdout.write(
+                    f'  category #{category_id} on {day}: stored {stored.get((category_id, day), (0, 0))}, '
+                    f'actual {counted.get((category_id, day), (0, 0))} (signups, opportunities)'
+                )
+            if wrong:
+                self.stdout.write(self.style.WARNING(f'{len(wrong)} days have stale rollups.'))
+            else:
+                self.stdout.write(self.style.SUCCESS('All rollups are up to date.'))
+            return
+
+        self.stdout.write('Rebuilding activity rollups...')
+        started = time.monotonic()
+        days = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {days} category-days in {time.monotonic() - started:.1f}s.'
+        ))
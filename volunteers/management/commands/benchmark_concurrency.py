@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.db import connection
+
+from volunteers import benchmarks
+from volunteers.models import VolunteerOpportunity
+from volunteers.sqlite import current_pragmas
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures read throughput through the WSGI handler on its own and during bursts of '
+        'signup writes, using the current database and its connection profile. Seed it first, '
+        'e.g. seed_data --opportunities 1000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seconds',
+            type=float,
+            default=5.0,
+            help='Duration of each phase (default: 5)',
+        )
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=4,
+            help='Reader threads (default: 4)',
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=2,
+            help='Writer threads in the second phase (default: 2)',
+        )
+        parser.add_argument(
+            '--burst',
+            type=int,
+            default=10,
+            help='Signups each writer makes before withdrawing them again (default: 10)',
+        )
+        parser.add_argument(
+            '--endpoint',
+            default='opportunity_list',
+            help='Endpoint the readers request (default: opportunity_list)',
+        )
+        parser.add_argument(
+            '--host',
+            default='localhost',
+            help='Host header to send; must be allowed by ALLOWED_HOSTS (default: localhost)',
+        )
+
+    def handle(self, *args, **options):
+        if options['seconds'] <= 0 or options['readers'] < 1 or options['writers'] < 1 or options['burst'] < 1:
+            raise CommandError('--seconds, --readers, --writers and --burst must be positive.')
+        opportunity = VolunteerOpportunity.objects.order_by('date').first()
+        if opportunity is None:
+            raise CommandError('No opportunities found, run seed_data first.')
+        endpoints = dict(benchmarks.handler_endpoints(opportunity))
+        if options['endpoint'] not in endpoints:
+            raise CommandError(f'Unknown endpoint {options["endpoint"]!r}, choose from: {", ".join(endpoints)}.')
+
+        if connection.vendor == 'sqlite':
+            pragmas = ', '.join(f'{name}={value}' for name, value in current_pragmas(connection).items())
+            self.stdout.write(f'SQLite PRAGMAs: {pragmas or "defaults"}')
+        wsgi = get_internal_wsgi_application()
+        url = endpoints[options['endpoint']]
+        run = {
+            'seconds': options['seconds'], 'readers': options['readers'],
+            'burst': options['burst'], 'host': options['host'],
+        }
+        # Warm caches and imports.
+        benchmarks.wsgi_throughput(wsgi, options['endpoint'], url, requests=1, concurrency=1, host=options['host'])
+        results = [
+            benchmarks.read_write_load(wsgi, url, writers=0, phase='reads only', **run),
+            benchmarks.read_write_load(
+                wsgi, url, writers=options['writers'], phase=f'reads + {options["writers"]} writers', **run
+            ),
+        ]
+        self.stdout.write(benchmarks.format_read_write_load(results))
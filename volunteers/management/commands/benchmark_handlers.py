@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.utils.module_loading import import_string
+
+from volunteers import benchmarks
+from volunteers.models import VolunteerOpportunity
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares throughput of the sync views under WSGI with the async views under ASGI, '
+        'using the current database. Seed it first, e.g. seed_data --opportunities 1000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests per endpoint and server (default: 200)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Requests in flight at once (default: 8)',
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            help='Only benchmark this endpoint; may be repeated',
+        )
+        parser.add_argument(
+            '--host',
+            default='localhost',
+            help='Host header to send; must be allowed by ALLOWED_HOSTS (default: localhost)',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be >= 1.')
+        opportunity = VolunteerOpportunity.objects.order_by('date').first()
+        if opportunity is None:
+            raise CommandError('No opportunities found, run seed_data first.')
+
+        endpoints = benchmarks.handler_endpoints(opportunity)
+        if options['endpoint']:
+            unknown = set(options['endpoint']) - {name for name, _ in endpoints}
+            if unknown:
+                raise CommandError(f'Unknown endpoint(s): {", ".join(sorted(unknown))}.')
+            endpoints = [(name, url) for name, url in endpoints if name in options['endpoint']]
+
+        wsgi = get_internal_wsgi_application()
+        asgi = import_string(settings.ASGI_APPLICATION)
+        run = {'requests': options['requests'], 'concurrency': options['concurrency'], 'host': options['host']}
+        self.stdout.write(
+            f'{options["requests"]} requests per endpoint, {options["concurrency"]} concurrent...'
+        )
+        results = []
+        for name, url in endpoints:
+            # One untimed request each to warm caches and imports.
+            benchmarks.wsgi_throughput(wsgi, name, url, **{**run, 'requests': 1})
+            benchmarks.asgi_throughput(asgi, name, url, **{**run, 'requests': 1})
+            results.append(benchmarks.wsgi_throughput(wsgi, name, url, **run))
+            results.append(benchmarks.asgi_throughput(asgi, name, url, **run))
+        self.stdout.write(benchmarks.format_throughput(results))
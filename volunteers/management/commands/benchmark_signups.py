@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from volunteers import benchmarks
+from volunteers.models import Category
+
+
+class Command(BaseCommand):
+    help = (
+        'Submits many concurrent sign-ups for one capacity-limited opportunity and reports '
+        'throughput, latency and whether it was overfilled. Uses the current database and '
+        'removes everything it creates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--signups',
+            type=int,
+            default=500,
+            help='Sign-up forms to submit (default: 500)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=16,
+            help='Sign-ups in flight at once (default: 16)',
+        )
+        parser.add_argument(
+            '--capacity',
+            type=int,
+            default=100,
+            help='Capacity of the opportunity (default: 100)',
+        )
+
+    def handle(self, *args, **options):
+        if options['signups'] < 1 or options['concurrency'] < 1 or options['capacity'] < 1:
+            raise CommandError('--signups, --concurrency and --capacity must be >= 1.')
+        if not Category.objects.exists():
+            raise CommandError('No categories found, run migrate first.')
+        result = benchmarks.signup_rush(options['signups'], options['concurrency'], options['capacity'])
+        self.stdout.write(benchmarks.format_signup_rush(result))
+        if result.overfilled:
+            raise CommandError(f'Opportunity was overfilled by {result.overfilled}.')
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from volunteers.duplicates import DEFAULT_BATCH_SIZE, find_duplicates, merge_duplicates
+from volunteers.models import Volunteer
+
+
+class Command(BaseCommand):
+    help = (
+        'Finds volunteers who look like the same person signed up more than once and merges '
+        'each group into its oldest volunteer, in batches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Volunteers merged per transaction, roughly (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the groups that would be merged',
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=10,
+            help='Print this many of the groups found (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['show'] < 0:
+            raise CommandError('--batch-size must be >= 1 and --show >= 0.')
+
+        started = time.monotonic()
+        clusters, skipped = find_duplicates()
+        duplicates = sum(len(cluster) - 1 for cluster in clusters)
+        self.stdout.write(
+            f'Found {len(clusters)} groups of duplicates, {duplicates} volunteers to merge, '
+            f'in {time.monotonic() - started:.1f}s.'
+        )
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped} blocks of too common names.'))
+        names = dict(
+            Volunteer.objects.filter(
+                pk__in=[pk for cluster in clusters[:options['show']] for pk in cluster]
+            ).values_list('pk', 'name')
+        )
+        for cluster in clusters[:options['show']]:
+            self.stdout.write('  ' + ' | '.join(f'{names.get(pk, "?")} (#{pk})' for pk in cluster))
+        if options['dry_run'] or not clusters:
+            return
+
+        started = time.monotonic()
+        totals = [0, 0, 0]
+        for merged in merge_duplicates(clusters, options['batch_size']):
+            totals = [total + n for total, n in zip(totals, merged)]
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {totals[0]} volunteers merged ({totals[0] / elapsed:,.0f}/sec)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {totals[0]} volunteers into {len(clusters)}, dropping {totals[1]} repeated signups '
+            f'and {totals[2]} waitlist entries, in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,81 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from volunteers.models import Category, Signup, VolunteerOpportunity
+from volunteers.purge import DEFAULT_BATCH_SIZE, orphaned_volunteers, purge
+
+
+def iso_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'{value!r} is not a YYYY-MM-DD date.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes the matching opportunities with their signups, waitlist entries and volunteers '
+        'left without any, in batches of set-based statements. Safe to interrupt and re-run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=iso_date, help='Only opportunities dated before this day')
+        parser.add_argument('--since', type=iso_date, help='Only opportunities dated on or after this day')
+        parser.add_argument(
+            '--category',
+            action='append',
+            default=[],
+            help='Only opportunities in the category with this slug; repeat for several',
+        )
+        parser.add_argument('--all', action='store_true', help='Delete every opportunity if no filter is given')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Opportunities deleted per transaction (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many opportunities would be deleted',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be >= 1.')
+        opportunities = VolunteerOpportunity.objects.all()
+        if options['before']:
+            opportunities = opportunities.filter(date__lt=options['before'])
+        if options['since']:
+            opportunities = opportunities.filter(date__gte=options['since'])
+        if options['category']:
+            categories = list(Category.objects.filter(slug__in=options['category']))
+            unknown = set(options['category']) - {category.slug for category in categories}
+            if unknown:
+                raise CommandError(f'Unknown category: {", ".join(sorted(unknown))}.')
+            opportunities = opportunities.filter(category__in=categories)
+        if not (options['before'] or options['since'] or options['category'] or options['all']):
+            raise CommandError('Give --before, --since or --category, or --all to delete every opportunity.')
+        if options['dry_run']:
+            self.stdout.write(
+                f'{opportunities.count()} opportunities would be deleted, with '
+                f'{Signup.objects.filter(opportunity__in=opportunities.values("pk")).count()} signups and '
+                f'{orphaned_volunteers(opportunities).count()} volunteers left without any.'
+            )
+            return
+
+        started = time.monotonic()
+        totals = [0, 0, 0]
+        for deleted in purge(opportunities, options['batch_size']):
+            totals = [total + n for total, n in zip(totals, deleted)]
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'  {totals[0]} opportunities, {totals[1]} signups, {totals[2]} volunteers '
+                f'({sum(totals) / elapsed:,.0f} rows/sec)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {totals[0]} opportunities, {totals[1]} signups and {totals[2]} volunteers '
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from volunteers.models import VolunteerOpportunity
+
+
+class Command(BaseCommand):
+    help = 'Repairs the stored volunteer_count on volunteer opportunities'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report opportunities with a stale count, do not repair them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of opportunities recounted per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        stale = VolunteerOpportunity.objects.with_stale_volunteer_count()
+
+        if options['check']:
+            count = 0
+            for opp in stale.only('id', 'title', 'volunteer_count').iterator():
+                count += 1
+                self.stdout.write(
+                    f'  {opp.title} (#{opp.pk}): stored {opp.volunteer_count}, '
+                    f'actual {opp.actual_volunteer_count}'
+                )
+            if count:
+                self.stdout.write(self.style.WARNING(f'{count} opportunities have a stale volunteer count.'))
+            else:
+                self.stdout.write(self.style.SUCCESS('All volunteer counts are up to date.'))
+            return
+
+        self.stdout.write('Recounting volunteers...')
+        batch_size = options['batch_size']
+        ids = list(VolunteerOpportunity.objects.order_by('pk').values_list('pk', flat=True))
+        repaired = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            with transaction.atomic():
+                repaired += stale.filter(pk__in=batch).count()
+                VolunteerOpportunity.objects.filter(pk__in=batch).recount_volunteers()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted {len(ids)} opportunities, repaired {repaired}.'
+        ))
@@ -0,0 +1,75 @@
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from volunteers.tasks import VISIBILITY_TIMEOUT, Worker, render_queue_depth, task_metrics
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            body = (task_metrics.render() + render_queue_depth()).encode()
+        finally:
+            close_old_connections()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued background tasks on a pool of threads until interrupted, retrying failed '
+        'ones with backoff and re-running those whose worker stopped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Tasks run at once (default: 4)')
+        parser.add_argument(
+            '--visibility-timeout',
+            type=int,
+            default=VISIBILITY_TIMEOUT,
+            help=f'Seconds before an unfinished task is run again (default: {VISIBILITY_TIMEOUT})',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds between looks for new tasks when idle (default: 1)',
+        )
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due')
+        parser.add_argument('--metrics-port', type=int, help='Serve task metrics on this port')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['visibility_timeout'] < 1 or options['poll_interval'] <= 0:
+            raise CommandError('--threads and --visibility-timeout must be >= 1 and --poll-interval positive.')
+        worker = Worker(options['threads'], options['visibility_timeout'], options['poll_interval'])
+        if options['metrics_port'] is not None:
+            server = ThreadingHTTPServer(('', options['metrics_port']), MetricsHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.stdout.write(f'Serving task metrics on port {options["metrics_port"]}.')
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            # Finish the running tasks, but claim no more.
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous[signum] = signal.signal(signum, lambda signum, frame: worker.stop())
+
+        self.stdout.write(f'Running tasks on {options["threads"]} threads.')
+        started = time.monotonic()
+        try:
+            outcomes = worker.run(once=options['once'])
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {outcomes.total()} tasks ({outcomes["succeeded"]} succeeded, {outcomes["retried"]} to retry, '
+            f'{outcomes["failed"]} failed) in {time.monotonic() - started:.1f}s.'
+        ))
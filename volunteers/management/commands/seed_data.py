@@ -1,13 +1,182 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
-from volunteers.models import Category, VolunteerOpportunity, Volunteer
+from volunteers.models import Category, Signup, VolunteerOpportunity, Volunteer
+
+
+# Vocabulary for synthetic data, keyed by category slug
+SYNTHETIC_TOPICS = {
+    'tutoring': ['Math', 'Reading', 'Science', 'ESL', 'Coding', 'History', 'SAT Prep', 'Writing'],
+    'food-prep': ['Food Bank', 'Soup Kitchen', 'Meal Delivery', 'Community Garden', 'Bakery', 'Pantry'],
+    'senior-support': ['Companion Visit', 'Technology Workshop', 'Grocery Run', 'Memory Care', 'Wellness Walk'],
+    'sports': ['Soccer', 'Basketball', 'Swim Meet', 'Track Day', 'Little League', 'Fun Run'],
+    'other': ['Beach Cleanup', 'Park Restoration', 'Animal Shelter', 'Library', 'Blood Drive', 'Clothing Drive'],
+}
+SYNTHETIC_ROLES = ['Volunteer', 'Assistant', 'Coordinator', 'Helper', 'Mentor', 'Shift', 'Team Lead']
+SYNTHETIC_PLACES = [
+    'at the downtown library', 'at Sunset Beach', 'at the community center', 'at Riverside Park',
+    'at the Sunshine Senior Center', 'at Lincoln High School', 'at the regional food bank',
+]
+SYNTHETIC_SENTENCES = [
+    'No prior experience is required and training is provided on site.',
+    'Volunteers should be comfortable working with small groups.',
+    'Shifts last about three hours and refreshments are provided.',
+    'Bring comfortable shoes and a reusable water bottle.',
+    'Patience and a friendly attitude are the most important skills.',
+    'This is a great way to meet neighbours and give back to the community.',
+    'Please arrive fifteen minutes early for a short orientation.',
+]
+# Synthetic opportunity dates fall this many days around today
+SYNTHETIC_DAYS = (-180, 365)
+FIRST_NAMES = [
+    'Sarah', 'Michael', 'Emily', 'James', 'Lisa', 'David', 'Maria', 'Ahmed', 'Priya', 'Chen',
+    'Olivia', 'Noah', 'Fatima', 'Lucas', 'Aiko', 'Mateo', 'Grace', 'Omar', 'Sofia', 'Daniel',
+]
+LAST_NAMES = [
+    'Johnson', 'Chen', 'Rodriguez', 'Wilson', 'Thompson', 'Kim', 'Garcia', 'Patel', 'Nguyen', 'Smith',
+    'Okafor', 'Müller', 'Tanaka', 'Silva', 'Cohen', 'Haddad', 'Brown', 'Lopez', 'Ivanova', 'Singh',
+]
+EXPERTISE = [
+    'teaching', 'cooking', 'first aid', 'event planning', 'coaching youth sports', 'elder care',
+    'software development', 'gardening', 'public speaking', 'photography', 'logistics',
+    'Spanish', 'Mandarin', 'accounting', 'carpentry', 'social work', 'nursing', 'graphic design',
+]
+
+
+def volunteer_range(value):
+    """Parse ``N`` or ``MIN..MAX`` into an inclusive ``(min, max)`` pair."""
+    low, _, high = value.partition('..')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError(f'Invalid volunteer range "{value}", expected N or MIN..MAX.')
+    if low < 0 or high < low:
+        raise CommandError(f'Invalid volunteer range "{value}".')
+    return low, high
 
 
 class Command(BaseCommand):
-    help = 'Seeds the database with sample volunteer opportunities and volunteers'
+    help = (
+        'Seeds the database with sample volunteer opportunities and volunteers, '
+        'or with a large synthetic dataset when --opportunities is given'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--opportunities',
+            type=int,
+            help='Generate this many synthetic opportunities instead of the sample data',
+        )
+        parser.add_argument(
+            '--volunteers-per-opportunity',
+            type=volunteer_range,
+            default=(0, 10),
+            help='Volunteers per synthetic opportunity, as N or MIN..MAX (default: 0..10)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed; the same seed generates the same data (default: 42)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert and per transaction (default: 5000)',
+        )
 
     def handle(self, *args, **options):
+        if options['opportunities'] is not None:
+            self.generate(options)
+        else:
+            self.seed_samples()
+
+    def generate(self, options):
+        """Bulk insert a deterministic synthetic dataset in batched transactions."""
+        total = options['opportunities']
+        batch_size = options['batch_size']
+        if total < 0 or batch_size < 1:
+            raise CommandError('--opportunities must be >= 0 and --batch-size >= 1.')
+        min_volunteers, max_volunteers = options['volunteers_per_opportunity']
+        min_day, max_day = SYNTHETIC_DAYS
+
+        rng = random.Random(options['seed'])
+        categories = list(Category.objects.order_by('slug'))
+        if not categories:
+            raise CommandError('No categories found, run migrations first.')
+        today = timezone.now().date()
+
+        self.stdout.write(
+            f'Generating {total} opportunities with {min_volunteers}..{max_volunteers} '
+            f'volunteers each (seed {options["seed"]}, batch size {batch_size})...'
+        )
+        started = time.monotonic()
+        created_opportunities = created_volunteers = 0
+
+        for start in range(0, total, batch_size):
+            with transaction.atomic():
+                opportunities = VolunteerOpportunity.objects.bulk_create([
+                    self.synthetic_opportunity(rng, categories, today, min_day, max_day)
+                    for _ in range(min(batch_size, total - start))
+                ])
+                signups = []
+                for opportunity in opportunities:
+                    for _ in range(rng.randint(min_volunteers, max_volunteers)):
+                        signups.append((self.synthetic_volunteer(rng), opportunity))
+                    if len(signups) >= batch_size:
+                        created_volunteers += self.create_signups(signups)
+                        signups = []
+                created_volunteers += self.create_signups(signups)
+            created_opportunities += len(opportunities)
+
+            elapsed = time.monotonic() - started
+            rows = created_opportunities + created_volunteers
+            self.stdout.write(
+                f'  {created_opportunities}/{total} opportunities, {created_volunteers} volunteers '
+                f'({rows / elapsed:,.0f} rows/sec)'
+            )
+
+        elapsed = time.monotonic() - started
+        rows = created_opportunities + created_volunteers
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created_opportunities} opportunities and {created_volunteers} volunteers '
+            f'in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/sec).'
+        ))
+
+    def synthetic_opportunity(self, rng, categories, today, min_day, max_day):
+        category = rng.choice(categories)
+        topic = rng.choice(SYNTHETIC_TOPICS.get(category.slug, SYNTHETIC_TOPICS['other']))
+        place = rng.choice(SYNTHETIC_PLACES)
+        return VolunteerOpportunity(
+            title=f'{topic} {rng.choice(SYNTHETIC_ROLES)}',
+            description=f'Help with {topic.lower()} {place}. ' + ' '.join(rng.sample(SYNTHETIC_SENTENCES, 2)),
+            date=today + timedelta(days=rng.randint(min_day, max_day)),
+            category=category,
+        )
+
+    def synthetic_volunteer(self, rng):
+        skills = rng.sample(EXPERTISE, 2)
+        return Volunteer(
+            name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            age=rng.randint(18, 80),
+            expertise=f'Experienced in {skills[0]} and {skills[1]}, with {rng.randint(1, 20)} years of volunteering.',
+        )
+
+    def create_signups(self, signups):
+        """Insert (volunteer, opportunity) pairs as new volunteers plus their signups."""
+        volunteers = Volunteer.objects.bulk_create([volunteer for volunteer, _ in signups])
+        return len(Signup.objects.bulk_create([
+            Signup(volunteer=volunteer, opportunity=opportunity)
+            for volunteer, (_, opportunity) in zip(volunteers, signups)
+        ]))
+
+    def seed_samples(self):
+        """Create the small hand-written sample dataset, skipping existing rows."""
         self.stdout.write('Seeding database...')
 
         # Get categories
@@ -124,11 +293,9 @@ class Command(BaseCommand):
         ]
 
         for vol_data in volunteers_data:
-            vol, created = Volunteer.objects.get_or_create(
-                name=vol_data['name'],
-                opportunity=vol_data['opportunity'],
-                defaults=vol_data
-            )
+            opportunity = vol_data.pop('opportunity')
+            vol, _ = Volunteer.objects.get_or_create(name=vol_data['name'], defaults=vol_data)
+            _, created = Signup.objects.get_or_create(volunteer=vol, opportunity=opportunity)
             if created:
                 self.stdout.write(f'  Created volunteer: {vol.name}')
             else:
@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies the primary SQLite database into the replica stand-in named by '
+        'settings.REPLICA_DATABASE, once or repeatedly to simulate replication lag'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Keep copying every this many seconds until interrupted',
+        )
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'REPLICA_DATABASE', None)
+        if alias is None or alias not in connections:
+            raise CommandError('settings.REPLICA_DATABASE does not name a configured database.')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite databases; use real replication elsewhere.')
+        if options['interval'] is not None and options['interval'] <= 0:
+            raise CommandError('--interval must be positive.')
+
+        while True:
+            started = time.perf_counter()
+            self.copy(primary.settings_dict['NAME'], replica.settings_dict['NAME'])
+            self.stdout.write(
+                f'Copied {primary.settings_dict["NAME"]} to {replica.settings_dict["NAME"]} '
+                f'in {time.perf_counter() - started:.2f}s.'
+            )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, source, target):
+        # The backup API takes a consistent snapshot while the primary stays
+        # writable, and replaces the replica's pages in place so its open
+        # connections see the new contents on their next read.
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
@@ -0,0 +1,303 @@
+"""Expertise-to-opportunity matching.
+
+Upcoming opportunities are indexed as TF-IDF vectors over the words of their
+title (counted twice) and description. A volunteer's expertise is scored
+against all of them at once as one sparse matrix-vector product: only the
+posting lists of the words in the expertise are visited, so the cost grows
+with how common those words are rather than with the number of
+opportunities. With NumPy installed the products are computed on the
+posting arrays directly; without it a plain Python loop gives the same
+scores.
+
+Document vectors are length-normalised term frequencies and the IDF weight
+is applied at query time (squared, once for each side), so adding or
+removing an opportunity never requires re-weighting the others.
+
+The index lives in process memory and is built on first use. Saving or
+deleting an opportunity bumps a version in the cache after commit; every
+process sees the new version on its next query and re-reads only the
+opportunities saved since its last sync. Deleted and past opportunities
+are dropped as they are noticed.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import VolunteerOpportunity
+from .signals import opportunities_archived, opportunities_bulk_changed, opportunities_purged
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+VERSION_KEY = 'volunteers:matching-version'
+
+# Seconds between syncs with the database even if no change was announced,
+# which covers queryset updates that send no signal.
+SYNC_INTERVAL = getattr(settings, 'MATCHING_SYNC_INTERVAL', 60)
+# Re-read opportunities saved this long before the newest one seen, in case
+# a transaction that stamped an earlier time committed later.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+TITLE_WEIGHT = 2
+# In a large index, expertise words found in more than this share of
+# opportunities say little about fit and are skipped, which also saves
+# walking their long posting lists.
+MAX_DOCUMENT_FREQUENCY = 0.5
+PRUNE_MIN_DOCUMENTS = 1000
+
+STOP_WORDS = frozenset('''
+    a about an and are as at be been but by can do for from has have i if in into is it its me my no not
+    of on or our so than that the their them then there these they this to up us was we were what when
+    where which who will with you your
+'''.split())
+SUFFIXES = ('ing', 'ed', 'es', 's')
+
+
+def tokenize(text):
+    """Lowercase words of ``text`` without stop words, lightly stemmed."""
+    words = []
+    for word in re.findall(r'\w+', text.lower()):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+                word = word[:-len(suffix)]
+                break
+        words.append(word)
+    return words
+
+
+class MatchingIndex:
+    """Inverted TF-IDF index over upcoming opportunities.
+
+    Each indexed opportunity occupies a slot. Posting lists are parallel
+    arrays of slots and weights; removing an opportunity only marks its
+    slot dead, and the arrays are compacted once most slots are dead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.synced_at = 0.0
+        self.synced_through = None
+        self.day = None
+        self.clear()
+
+    def clear(self):
+        self.postings = {}
+        self.document_frequency = {}
+        self.slot_opportunity = array('q')
+        self.slot_day = array('q')
+        self.alive = bytearray()
+        self.slots = {}
+        self.terms = {}
+        self.built = False
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, opportunity_id, title, description, date):
+        """Index (or re-index) one opportunity; past ones are only removed."""
+        self.discard(opportunity_id)
+        if date < timezone.now().date():
+            return
+        counts = Counter(tokenize(title) * TITLE_WEIGHT + tokenize(description))
+        if not counts:
+            return
+        weights = {term: 1 + math.log(tf) for term, tf in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        slot = len(self.slot_opportunity)
+        for term, weight in weights.items():
+            slots, term_weights = self.postings.setdefault(term, (array('q'), array('f')))
+            slots.append(slot)
+            term_weights.append(weight / norm)
+            self.document_frequency[term] = self.document_frequency.get(term, 0) + 1
+        self.slot_opportunity.append(opportunity_id)
+        self.slot_day.append(date.toordinal())
+        self.alive.append(1)
+        self.slots[opportunity_id] = slot
+        self.terms[opportunity_id] = tuple(weights)
+
+    def discard(self, opportunity_id):
+        slot = self.slots.pop(opportunity_id, None)
+        if slot is None:
+            return
+        self.alive[slot] = 0
+        for term in self.terms.pop(opportunity_id):
+            self.document_frequency[term] -= 1
+            if not self.document_frequency[term]:
+                del self.document_frequency[term]
+                del self.postings[term]
+        if len(self.alive) > 1000 and len(self.slots) < len(self.alive) // 2:
+            self.compact()
+
+    def compact(self):
+        """Drop dead slots from the posting lists and renumber the rest."""
+        renumbered = array('q', [-1]) * len(self.alive)
+        for new, slot in enumerate(slot for slot, alive in enumerate(self.alive) if alive):
+            renumbered[slot] = new
+        for term, (slots, weights) in self.postings.items():
+            kept = [(renumbered[slot], weight) for slot, weight in zip(slots, weights) if self.alive[slot]]
+            self.postings[term] = (array('q', [slot for slot, _ in kept]), array('f', [w for _, w in kept]))
+        keep = [slot for slot, alive in enumerate(self.alive) if alive]
+        self.slot_opportunity = array('q', [self.slot_opportunity[slot] for slot in keep])
+        self.slot_day = array('q', [self.slot_day[slot] for slot in keep])
+        self.alive = bytearray([1]) * len(keep)
+        self.slots = {opportunity_id: slot for slot, opportunity_id in enumerate(self.slot_opportunity)}
+
+    def query_weights(self, text):
+        """``{term: weight}`` for the indexed words of ``text``, IDF applied for both sides."""
+        documents = len(self.slots)
+        weights = {}
+        for term, tf in Counter(tokenize(text)).items():
+            df = self.document_frequency.get(term)
+            if not df:
+                continue
+            if documents >= PRUNE_MIN_DOCUMENTS and df > MAX_DOCUMENT_FREQUENCY * documents:
+                continue
+            idf = math.log((1 + documents) / (1 + df)) + 1
+            weights[term] = (1 + math.log(tf)) * idf * idf
+        return weights
+
+    def search(self, text, limit=5, today=None):
+        """The ``limit`` best (opportunity_id, score) pairs for ``text``, best first."""
+        today = (today or timezone.now().date()).toordinal()
+        with self._lock:
+            weights = self.query_weights(text)
+            if not weights:
+                return []
+            score = self._score_numpy if numpy is not None else self._score_python
+            return [(self.slot_opportunity[slot], value) for slot, value in score(weights, limit, today)]
+
+    def _score_python(self, weights, limit, today):
+        scores = {}
+        for term, query_weight in weights.items():
+            slots, term_weights = self.postings[term]
+            for slot, weight in zip(slots, term_weights):
+                scores[slot] = scores.get(slot, 0.0) + query_weight * weight
+        alive, days = self.alive, self.slot_day
+        best = heapq.nlargest(
+            limit,
+            ((value, -slot) for slot, value in scores.items() if alive[slot] and days[slot] >= today),
+        )
+        return [(-slot, value) for value, slot in best]
+
+    def _score_numpy(self, weights, limit, today):
+        # Summed in double precision, term by term like the Python scorer,
+        # so that near-equal scores are ordered the same way.
+        scores = numpy.zeros(len(self.alive), dtype=numpy.float64)
+        for term, query_weight in weights.items():
+            slots, term_weights = self.postings[term]
+            # A term occurs once per document, so the slots are distinct.
+            scores[numpy.frombuffer(slots, dtype=numpy.int64)] += (
+                query_weight * numpy.frombuffer(term_weights, dtype=numpy.float32).astype(numpy.float64)
+            )
+        live = numpy.frombuffer(self.alive, dtype=numpy.uint8).astype(bool)
+        live &= numpy.frombuffer(self.slot_day, dtype=numpy.int64) >= today
+        scores[~live] = 0
+        candidates = numpy.flatnonzero(scores)
+        if len(candidates) > limit:
+            # Keep every candidate tied with the limit-th best score, so that
+            # the sort below, not the partition, decides which of them make it.
+            cutoff = numpy.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+            candidates = candidates[scores[candidates] >= cutoff]
+        # Best first, earlier slots first among equals, as in the Python scorer.
+        candidates = candidates[numpy.lexsort((candidates, -scores[candidates]))][:limit]
+        return [(int(slot), float(scores[slot])) for slot in candidates]
+
+    def refresh(self):
+        """Bring the index up to date with the database if it may be stale."""
+        version = cache.get(VERSION_KEY)
+        if self.built and version == self.version and time.monotonic() - self.synced_at < SYNC_INTERVAL:
+            return
+        with self._lock:
+            if self.built and version == self.version and time.monotonic() - self.synced_at < SYNC_INTERVAL:
+                return
+            self._sync()
+            self.version = version
+            self.synced_at = time.monotonic()
+
+    def _sync(self):
+        today = timezone.now().date()
+        opportunities = VolunteerOpportunity.objects.order_by()
+        if not self.built:
+            self.clear()
+            opportunities = opportunities.filter(date__gte=today)
+        else:
+            opportunities = opportunities.filter(updated_at__gte=self.synced_through - SYNC_OVERLAP)
+        for pk, title, description, date, updated_at in opportunities.values_list(
+            'pk', 'title', 'description', 'date', 'updated_at'
+        ).iterator(chunk_size=2000):
+            self.add(pk, title, description, date)
+            if self.synced_through is None or updated_at > self.synced_through:
+                self.synced_through = updated_at
+        if self.synced_through is None:
+            self.synced_through = timezone.now()
+        if self.day != today:
+            past = today.toordinal()
+            for opportunity_id, slot in list(self.slots.items()):
+                if self.slot_day[slot] < past:
+                    self.discard(opportunity_id)
+            self.day = today
+        self.built = True
+
+    def forget(self, opportunity_ids):
+        """Remove opportunities found to no longer exist."""
+        with self._lock:
+            for opportunity_id in opportunity_ids:
+                self.discard(opportunity_id)
+
+
+index = MatchingIndex()
+
+
+def recommend(expertise, limit=5):
+    """Upcoming opportunities best matching ``expertise``, best first.
+
+    Each has its ``match_score`` set. Costs one query for the opportunities,
+    plus a sync query when opportunities changed since the last call.
+    """
+    index.refresh()
+    # A few spares in case some of the best were deleted since the last sync.
+    ranked = index.search(expertise, limit + 5)
+    found = VolunteerOpportunity.objects.select_related('category').in_bulk([pk for pk, _ in ranked])
+    index.forget(pk for pk, _ in ranked if pk not in found)
+    today = timezone.now().date()
+    recommended = []
+    for pk, score in ranked:
+        opportunity = found.get(pk)
+        if opportunity is not None and opportunity.date >= today:
+            opportunity.match_score = score
+            recommended.append(opportunity)
+    return recommended[:limit]
+
+
+def bump_matching_version():
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+@receiver(post_save, sender=VolunteerOpportunity)
+@receiver(post_delete, sender=VolunteerOpportunity)
+def opportunity_changed(sender, using, **kwargs):
+    transaction.on_commit(bump_matching_version, using=using)
+
+
+@receiver(opportunities_bulk_changed, sender=VolunteerOpportunity)
+@receiver(opportunities_archived, sender=VolunteerOpportunity)
+@receiver(opportunities_purged, sender=VolunteerOpportunity)
+def opportunities_bulk_changed_receiver(sender, using, **kwargs):
+    transaction.on_commit(bump_matching_version, using=using)
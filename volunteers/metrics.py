@@ -0,0 +1,231 @@
+"""Per-view request metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request, counts its SQL queries and SQL
+time through ``connection.execute_wrapper`` and records the response size,
+all labelled with the URL name of the view that served it. Measurements are
+collected per request without locking and merged into the process-wide
+``registry`` once, so the per-query overhead is a clock read and an append.
+
+The registry lives in process memory: with several worker processes each
+exposes its own numbers, which Prometheus aggregates across scrape targets.
+"""
+import heapq
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.sql_seconds = 0.0
+        self.statuses = {}
+
+
+class MetricsRegistry:
+    """Thread-safe store of per-view metrics and the slowest queries seen.
+
+    Only queries taking longer than ``slow_query_ms`` count as slow; each is
+    logged and the slowest ``slow_query_limit`` of them are kept.
+    """
+
+    def __init__(self, slow_query_limit=0, slow_query_ms=0):
+        self._lock = threading.Lock()
+        self._views = {}
+        self.slow_query_limit = slow_query_limit
+        self.slow_query_seconds = slow_query_ms / 1000
+        # Min-heap of (duration, view, sql) holding the slowest queries.
+        self._slow_queries = []
+
+    def record(self, view, duration, status, response_size, queries):
+        """Merge one request's measurements; ``queries`` is a list of (duration, sql)."""
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            metrics.latency.observe(duration)
+            metrics.queries.observe(len(queries))
+            metrics.sql_seconds += sum(query_duration for query_duration, _ in queries)
+            if response_size is not None:
+                metrics.response_size.observe(response_size)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            slow = self._track_slow_queries(view, queries)
+        for query_duration, sql in slow:
+            logger.warning('Slow query in %s (%.1f ms): %s', view, query_duration * 1000, sql)
+
+    def _track_slow_queries(self, view, queries):
+        if not self.slow_query_limit:
+            return []
+        slow = []
+        for query_duration, sql in queries:
+            if query_duration <= self.slow_query_seconds:
+                continue
+            slow.append((query_duration, sql))
+            entry = (query_duration, view, sql)
+            if len(self._slow_queries) < self.slow_query_limit:
+                heapq.heappush(self._slow_queries, entry)
+            elif query_duration > self._slow_queries[0][0]:
+                heapq.heapreplace(self._slow_queries, entry)
+        return slow
+
+    def slow_queries(self):
+        """The slowest queries seen, slowest first, as (duration, view, sql)."""
+        with self._lock:
+            return sorted(self._slow_queries, reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self._slow_queries.clear()
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+            self._render_counter(
+                lines, 'volunteers_requests_total', 'Requests served, by view and status.',
+                ((f'view="{_escape(view)}",status="{status}"', count)
+                 for view, metrics in views for status, count in sorted(metrics.statuses.items())),
+            )
+            self._render_histogram(
+                lines, 'volunteers_request_duration_seconds', 'Request latency by view.',
+                ((view, metrics.latency) for view, metrics in views),
+            )
+            self._render_histogram(
+                lines, 'volunteers_sql_queries', 'SQL queries per request by view.',
+                ((view, metrics.queries) for view, metrics in views),
+            )
+            self._render_counter(
+                lines, 'volunteers_sql_duration_seconds_total', 'Time spent in SQL by view.',
+                ((f'view="{_escape(view)}"', round(metrics.sql_seconds, 6)) for view, metrics in views),
+            )
+            self._render_histogram(
+                lines, 'volunteers_response_size_bytes', 'Response body size by view.',
+                ((view, metrics.response_size) for view, metrics in views),
+            )
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_counter(lines, name, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for labels, value in samples:
+            lines.append(f'{name}{{{labels}}} {value}')
+
+    @staticmethod
+    def _render_histogram(lines, name, help_text, histograms, label_name='view'):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for value, histogram in histograms:
+            label = f'{label_name}="{_escape(value)}"'
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.total}')
+            lines.append(f'{name}_sum{{{label}}} {round(histogram.sum, 6)}')
+            lines.append(f'{name}_count{{{label}}} {histogram.total}')
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry(
+    slow_query_limit=getattr(settings, 'METRICS_SLOW_QUERIES', 0),
+    slow_query_ms=getattr(settings, 'METRICS_SLOW_QUERY_MS', 100),
+)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook timing each query of the current request."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - started, sql))
+
+
+class MetricsMiddleware:
+    """Record latency, SQL and response size for every request, by URL name.
+
+    Under ASGI the query wrappers are installed from the request's
+    thread-sensitive worker thread, which is where the async ORM runs
+    queries, since database connections are per thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            self._record_queries(stack, recorder)
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            await sync_to_async(self._record_queries)(stack, recorder)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        self._record(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    @staticmethod
+    def _record_queries(stack, recorder):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+
+    @staticmethod
+    def _record(request, response, duration, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        size = None if response.streaming else len(response.content)
+        registry.record(view, duration, response.status_code, size, recorder.queries)
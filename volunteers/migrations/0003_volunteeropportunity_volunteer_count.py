@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-16 22:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_volunteer_counts(apps, schema_editor):
+    VolunteerOpportunity = apps.get_model('volunteers', 'VolunteerOpportunity')
+    Volunteer = apps.get_model('volunteers', 'Volunteer')
+    counts = Volunteer.objects.filter(
+        opportunity=OuterRef('pk')
+    ).order_by().values('opportunity').annotate(n=Count('pk')).values('n')
+    VolunteerOpportunity.objects.update(
+        volunteer_count=Coalesce(Subquery(counts), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0002_add_default_categories'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='volunteeropportunity',
+            name='volunteer_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of volunteers signed up, maintained by Volunteer writes'),
+        ),
+        migrations.RunPython(backfill_volunteer_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 6.0.1 on 2026-10-16 22:40
+
+from django.db import OperationalError, migrations, transaction
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """RunSQL on SQLite only; other backends search with icontains."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                super().database_forwards(app_label, schema_editor, from_state, to_state)
+        except OperationalError:
+            # SQLite compiled without FTS5.
+            pass
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0003_volunteeropportunity_volunteer_count'),
+    ]
+
+    operations = [
+        SQLiteRunSQL(
+            sql=[
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS volunteers_opportunity_fts USING fts5(
+                    title, description,
+                    content='volunteers_volunteeropportunity', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS volunteers_opportunity_fts_ai
+                AFTER INSERT ON volunteers_volunteeropportunity BEGIN
+                    INSERT INTO volunteers_opportunity_fts(rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS volunteers_opportunity_fts_ad
+                AFTER DELETE ON volunteers_volunteeropportunity BEGIN
+                    INSERT INTO volunteers_opportunity_fts(volunteers_opportunity_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS volunteers_opportunity_fts_au
+                AFTER UPDATE OF title, description ON volunteers_volunteeropportunity BEGIN
+                    INSERT INTO volunteers_opportunity_fts(volunteers_opportunity_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO volunteers_opportunity_fts(rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END
+                """,
+                "INSERT INTO volunteers_opportunity_fts(volunteers_opportunity_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER IF EXISTS volunteers_opportunity_fts_ai',
+                'DROP TRIGGER IF EXISTS volunteers_opportunity_fts_ad',
+                'DROP TRIGGER IF EXISTS volunteers_opportunity_fts_au',
+                'DROP TABLE IF EXISTS volunteers_opportunity_fts',
+            ],
+        ),
+    ]
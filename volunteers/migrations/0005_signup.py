@@ -0,0 +1,83 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def split_signups(apps, schema_editor):
+    """Turn each volunteer row into a person plus one signup.
+
+    Rows with identical name, age and expertise are the same person signed
+    up more than once; they collapse into the lowest id.
+    """
+    quote = schema_editor.quote_name
+    volunteer = quote(apps.get_model('volunteers', 'Volunteer')._meta.db_table)
+    signup = quote(apps.get_model('volunteers', 'Signup')._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        # One sorted pass finds each person's lowest id; none of the three
+        # columns is indexed, so a self-join would compare every pair.
+        cursor.execute(
+            f'INSERT INTO {signup} (volunteer_id, opportunity_id, created_at, updated_at) '
+            f'SELECT MIN(id) OVER (PARTITION BY name, age, expertise), opportunity_id, created_at, updated_at '
+            f'FROM {volunteer}'
+        )
+        cursor.execute(
+            f'DELETE FROM {signup} WHERE id NOT IN ('
+            f'SELECT MIN(id) FROM {signup} GROUP BY volunteer_id, opportunity_id)'
+        )
+        cursor.execute(f'DELETE FROM {volunteer} WHERE id NOT IN (SELECT volunteer_id FROM {signup})')
+
+
+def recount_volunteers(apps, schema_editor):
+    VolunteerOpportunity = apps.get_model('volunteers', 'VolunteerOpportunity')
+    Signup = apps.get_model('volunteers', 'Signup')
+    counts = Signup.objects.filter(
+        opportunity=OuterRef('pk')
+    ).order_by().values('opportunity').annotate(n=Count('pk')).values('n')
+    VolunteerOpportunity.objects.update(
+        volunteer_count=Coalesce(Subquery(counts), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0004_opportunity_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Signup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('opportunity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signups', to='volunteers.volunteeropportunity')),
+                ('volunteer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signups', to='volunteers.volunteer')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(split_signups),
+        migrations.RemoveField(
+            model_name='volunteer',
+            name='opportunity',
+        ),
+        migrations.AddConstraint(
+            model_name='signup',
+            constraint=models.UniqueConstraint(fields=('volunteer', 'opportunity'), name='unique_signup'),
+        ),
+        migrations.AddField(
+            model_name='volunteer',
+            name='opportunities',
+            field=models.ManyToManyField(blank=True, related_name='volunteers', through='volunteers.Signup', to='volunteers.volunteeropportunity'),
+        ),
+        migrations.AlterField(
+            model_name='volunteeropportunity',
+            name='volunteer_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of volunteers signed up, maintained by Signup writes'),
+        ),
+        migrations.RunPython(recount_volunteers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-16 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0005_signup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='signup',
+            index=models.Index(fields=['created_at'], name='signup_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='signup',
+            index=models.Index(fields=['opportunity', 'created_at'], name='signup_opportunity_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='volunteer',
+            index=models.Index(fields=['name'], name='volunteer_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='volunteeropportunity',
+            index=models.Index(fields=['date', 'title'], name='opportunity_date_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='volunteeropportunity',
+            index=models.Index(fields=['category', 'date', 'title'], name='opportunity_category_date_idx'),
+        ),
+    ]
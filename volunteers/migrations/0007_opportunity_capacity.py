@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='volunteeropportunity',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Most volunteers the sign-up form accepts before waitlisting; empty for no limit', null=True),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('opportunity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='volunteers.volunteeropportunity')),
+                ('volunteer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='volunteers.volunteer')),
+            ],
+            options={
+                'verbose_name_plural': 'Waitlist entries',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['opportunity', 'created_at'], name='waitlist_opportunity_idx')],
+                'constraints': [models.UniqueConstraint(fields=('volunteer', 'opportunity'), name='unique_waitlist_entry')],
+            },
+        ),
+    ]
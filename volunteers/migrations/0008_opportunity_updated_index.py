@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0007_opportunity_capacity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='volunteeropportunity',
+            index=models.Index(fields=['updated_at'], name='opportunity_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:15
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """Roll up the signups and opportunities that exist already, at every granularity."""
+    ActivityRollup = apps.get_model('volunteers', 'ActivityRollup')
+    Signup = apps.get_model('volunteers', 'Signup')
+    VolunteerOpportunity = apps.get_model('volunteers', 'VolunteerOpportunity')
+    db = schema_editor.connection.alias
+    totals = {}
+
+    def add(category_id, day, signups=0, opportunities=0):
+        for granularity, period in (
+            ('day', day), ('week', day - timedelta(days=day.weekday())), ('month', day.replace(day=1)),
+        ):
+            total = totals.setdefault((granularity, period, category_id), [0, 0])
+            total[0] += signups
+            total[1] += opportunities
+
+    signups = Signup.objects.using(db).order_by().annotate(day=TruncDate('created_at')).values(
+        'opportunity__category_id', 'day'
+    ).annotate(n=Count('pk')).values_list('opportunity__category_id', 'day', 'n')
+    for category_id, day, n in signups.iterator():
+        add(category_id, day, signups=n)
+    opportunities = VolunteerOpportunity.objects.using(db).order_by().values('category_id', 'date').annotate(
+        n=Count('pk')
+    ).values_list('category_id', 'date', 'n')
+    for category_id, day, n in opportunities.iterator():
+        add(category_id, day, opportunities=n)
+    ActivityRollup.objects.using(db).bulk_create(
+        [
+            ActivityRollup(
+                granularity=granularity, period=period, category_id=category_id,
+                signups=signups, opportunities=opportunities,
+            )
+            for (granularity, period, category_id), (signups, opportunities) in sorted(totals.items())
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0008_opportunity_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period', models.DateField(help_text='First day of the period; weeks start on Monday')),
+                ('signups', models.IntegerField(default=0)),
+                ('opportunities', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_rollups', to='volunteers.category')),
+            ],
+            options={
+                'ordering': ['granularity', 'period', 'category'],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'period', 'category'), name='unique_activity_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0009_activity_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOpportunity',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('date', models.DateField()),
+                ('volunteer_count', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_opportunities', to='volunteers.category')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived opportunities',
+                'ordering': ['date', 'title'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSignup',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('volunteer_id', models.BigIntegerField(db_index=True)),
+                ('volunteer_name', models.CharField(max_length=200)),
+                ('volunteer_age', models.PositiveIntegerField()),
+                ('volunteer_expertise', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('opportunity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signups', to='volunteers.archivedopportunity')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0010_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='volunteer',
+            index=models.Index(fields=['updated_at'], name='volunteer_updated_idx'),
+        ),
+    ]
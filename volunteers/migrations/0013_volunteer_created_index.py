@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0012_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='volunteer',
+            index=models.Index(fields=['created_at'], name='volunteer_created_idx'),
+        ),
+    ]
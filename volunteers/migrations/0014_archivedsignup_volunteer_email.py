@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0013_volunteer_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedsignup',
+            name='volunteer_email',
+            field=models.EmailField(blank=True, default='', max_length=254),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-17 00:21
+
+from django.db import migrations
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """RunSQL on SQLite only; other backends need no NOCASE indexes."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('volunteers', '0014_archivedsignup_volunteer_email'),
+    ]
+
+    operations = [
+        SQLiteRunSQL(
+            sql=[
+                'CREATE INDEX IF NOT EXISTS volunteer_name_nocase_idx ON volunteers_volunteer (name COLLATE NOCASE)',
+                'CREATE INDEX IF NOT EXISTS volunteer_email_nocase_idx ON volunteers_volunteer (email COLLATE NOCASE)',
+            ],
+            reverse_sql=[
+                'DROP INDEX IF EXISTS volunteer_name_nocase_idx',
+                'DROP INDEX IF EXISTS volunteer_email_nocase_idx',
+            ],
+        ),
+    ]
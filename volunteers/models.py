@@ -1,6 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .signals import (
+    opportunities_bulk_changed, signups_changed, volunteer_counts_changed, volunteers_bulk_changed,
+)
 
 
 class Category(models.Model):
@@ -17,6 +24,65 @@ class Category(models.Model):
         return self.name
 
 
+class VolunteerOpportunityQuerySet(models.QuerySet):
+    """QuerySet for opportunities with helpers for the stored volunteer count."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        opportunities_bulk_changed.send(sender=self.model, using=self.db, opportunities=created)
+        return created
+
+    def update(self, **kwargs):
+        # Bulk updates bypass auto_now; stamp them unless only the stored
+        # count changes, so max(updated_at) can be used as a validator.
+        if kwargs.keys() != {'volunteer_count'}:
+            kwargs.setdefault('updated_at', timezone.now())
+        moved = kwargs.keys() & {'date', 'category', 'category_id'}
+        if moved:
+            categories = self._categories_touched(kwargs)
+        rows = super().update(**kwargs)
+        if rows and moved:
+            opportunities_bulk_changed.send(
+                sender=self.model, using=self.db, opportunities=None, categories=categories
+            )
+        return rows
+
+    update.queryset_only = True
+
+    def _categories_touched(self, kwargs):
+        """Ids of the categories ``update(**kwargs)`` moves opportunities from or to, or None if unknown."""
+        categories = set(self.order_by().values_list('category_id', flat=True).distinct())
+        category = kwargs.get('category_id', kwargs.get('category'))
+        if hasattr(category, 'resolve_expression'):
+            return None
+        if category is not None:
+            categories.add(getattr(category, 'pk', category))
+        return categories
+
+    def recount_volunteers(self):
+        """Recompute ``volunteer_count`` from the signups table in one UPDATE."""
+        counts = Signup.objects.filter(
+            opportunity=OuterRef('pk')
+        ).order_by().values('opportunity').annotate(n=Count('pk')).values('n')
+        return self.update(volunteer_count=Coalesce(Subquery(counts), Value(0)))
+
+    def claim_place(self, pk):
+        """Count one more volunteer for opportunity ``pk`` if it has room.
+
+        The capacity check and the increment are a single conditional
+        UPDATE, so two concurrent signups cannot both take the last place.
+        Returns whether a place was claimed.
+        """
+        has_room = Q(capacity__isnull=True) | Q(volunteer_count__lt=F('capacity'))
+        return bool(self.filter(has_room, pk=pk).update(volunteer_count=F('volunteer_count') + 1))
+
+    def with_stale_volunteer_count(self):
+        """Opportunities whose stored count disagrees with the signups table."""
+        return self.annotate(
+            actual_volunteer_count=Count('signups')
+        ).exclude(volunteer_count=F('actual_volunteer_count'))
+
+
 class VolunteerOpportunity(models.Model):
     """Volunteer opportunities that volunteers can sign up for."""
     title = models.CharField(max_length=200)
@@ -27,19 +93,148 @@ class VolunteerOpportunity(models.Model):
         on_delete=models.CASCADE,
         related_name='opportunities'
     )
+    volunteer_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of volunteers signed up, maintained by Signup writes"
+    )
+    capacity = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Most volunteers the sign-up form accepts before waitlisting; empty for no limit"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = VolunteerOpportunityQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Volunteer Opportunities"
         ordering = ['date', 'title']
+        indexes = [
+            # Listing and upcoming (date >= today) in the default ordering.
+            models.Index(fields=['date', 'title'], name='opportunity_date_title_idx'),
+            # The category filter, optionally with a date range, in order.
+            models.Index(fields=['category', 'date', 'title'], name='opportunity_category_date_idx'),
+            # Opportunities changed since a point in time, for the matching index.
+            models.Index(fields=['updated_at'], name='opportunity_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.date}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_date = instance.__dict__.get('date')
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        instance._loaded_capacity = instance.__dict__.get('capacity')
+        return instance
+
+    def save(self, *args, **kwargs):
+        previous = None if self._state.adding else getattr(self, '_loaded_capacity', self.capacity)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Signups change the stored count behind this instance's back;
+            # writing it back would undo them.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'volunteer_count'
+            ]
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if previous != self.capacity:
+                promote_waitlist([self.pk], using=self._state.db)
+        self._loaded_capacity = self.capacity
+
+    save.alters_data = True
+
     @property
-    def volunteer_count(self):
-        return self.volunteers.count()
+    def is_full(self):
+        return self.capacity is not None and self.volunteer_count >= self.capacity
+
+
+def adjust_volunteer_counts(deltas, using=None):
+    """Apply ``{opportunity_id: delta}`` to the stored volunteer counts.
+
+    Opportunities sharing the same delta are updated together, so a bulk
+    insert spread evenly over many opportunities costs a single UPDATE.
+    """
+    deltas = {opportunity_id: delta for opportunity_id, delta in deltas.items() if delta}
+    by_delta = {}
+    for opportunity_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(opportunity_id)
+    for delta, opportunity_ids in by_delta.items():
+        VolunteerOpportunity.objects.using(using).filter(pk__in=opportunity_ids).update(
+            volunteer_count=Greatest(F('volunteer_count') + delta, Value(0))
+        )
+    if deltas:
+        volunteer_counts_changed.send(sender=Signup, deltas=deltas, using=using or 'default')
+    freed = [opportunity_id for opportunity_id, delta in deltas.items() if delta < 0]
+    if freed:
+        promote_waitlist(freed, using=using)
+
+
+def promote_waitlist(opportunity_ids, using=None):
+    """Sign waitlisted volunteers up for places that have opened, first come first served.
+
+    Returns the new signups.
+    """
+    promoted = []
+    for opportunity_id in opportunity_ids:
+        waiting = WaitlistEntry.objects.using(using).filter(opportunity_id=opportunity_id)
+        for entry in waiting.order_by('created_at', 'pk').iterator():
+            if not VolunteerOpportunity.objects.using(using).claim_place(opportunity_id):
+                break
+            promoted.append(entry)
+    if not promoted:
+        return []
+    WaitlistEntry.objects.using(using).filter(pk__in=[entry.pk for entry in promoted]).delete()
+    return Signup.objects.using(using)._insert_claimed([
+        Signup(volunteer_id=entry.volunteer_id, opportunity_id=entry.opportunity_id) for entry in promoted
+    ])
+
+
+def signup_day(signup):
+    """The local date ``signup`` was made, which is how signups are counted by day."""
+    return timezone.localdate(signup.created_at)
+
+
+def record_signup_changes(changes, using=None):
+    """Announce ``{(opportunity_id, day): delta}`` signup changes and apply them to the stored counts."""
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if changes:
+        signups_changed.send(sender=Signup, changes=changes, using=using or 'default')
+    adjust_volunteer_counts(_by_opportunity(changes), using=using)
+
+
+def _by_day(signups, delta=1):
+    changes = {}
+    for signup in signups:
+        key = (signup.opportunity_id, signup_day(signup))
+        changes[key] = changes.get(key, 0) + delta
+    return changes
+
+
+def _by_opportunity(changes):
+    deltas = {}
+    for (opportunity_id, _), delta in changes.items():
+        deltas[opportunity_id] = deltas.get(opportunity_id, 0) + delta
+    return deltas
+
+
+def recount_volunteer_counts(opportunity_ids, using=None):
+    """Recount the given opportunities and report the resulting deltas.
+
+    For counts that may have drifted, such as those the admin's recount
+    action is asked to fix.
+    """
+    opportunities = VolunteerOpportunity.objects.using(using).filter(pk__in=opportunity_ids)
+    before = dict(opportunities.values_list('pk', 'volunteer_count'))
+    opportunities.recount_volunteers()
+    after = dict(opportunities.values_list('pk', 'volunteer_count'))
+    deltas = {pk: after[pk] - before.get(pk, 0) for pk in after if after[pk] != before.get(pk, 0)}
+    if deltas:
+        volunteer_counts_changed.send(sender=Signup, deltas=deltas, using=using or 'default')
 
 
 def validate_age(value):
@@ -48,21 +243,380 @@ def validate_age(value):
         raise ValidationError('Volunteers must be at least 18 years old.')
 
 
+class VolunteerQuerySet(models.QuerySet):
+    """QuerySet for volunteers that keeps signup counts right when people are removed."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        volunteers_bulk_changed.send(sender=self.model, using=self.db)
+        return created
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+    update.queryset_only = True
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            counts = Signup.objects.using(self.db).filter(volunteer__in=self)._counts_by_opportunity_day()
+            result = super().delete()
+            record_signup_changes({key: -n for key, n in counts.items()}, using=self.db)
+        return result
+
+    delete.queryset_only = True
+
+
 class Volunteer(models.Model):
-    """Volunteers who sign up for opportunities."""
+    """A person who volunteers; their registrations are ``Signup`` rows.
+
+    Deleting a volunteer cascades to their signups, and the affected
+    opportunities' stored ``volunteer_count`` is adjusted in the same
+    transaction.
+    """
     name = models.CharField(max_length=200)
     age = models.PositiveIntegerField(validators=[MinValueValidator(18), validate_age])
     expertise = models.TextField(help_text="Describe your skills and expertise")
+    email = models.EmailField(blank=True, help_text="Where to send signup confirmations")
+    opportunities = models.ManyToManyField(
+        VolunteerOpportunity,
+        through='Signup',
+        related_name='volunteers',
+        blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VolunteerQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Sign-up looks up an existing volunteer by name, age and expertise.
+            models.Index(fields=['name'], name='volunteer_name_idx'),
+            # Volunteers changed since a point in time, for the autocomplete index.
+            models.Index(fields=['updated_at'], name='volunteer_updated_idx'),
+            # Newest first, the default ordering.
+            models.Index(fields=['created_at'], name='volunteer_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            counts = self.signups.all()._counts_by_opportunity_day()
+            result = super().delete(*args, **kwargs)
+            record_signup_changes({key: -n for key, n in counts.items()}, using=self._state.db)
+        return result
+
+    delete.alters_data = True
+
+
+class SignupQuerySet(models.QuerySet):
+    """QuerySet that keeps ``VolunteerOpportunity.volunteer_count`` in sync on bulk writes."""
+
+    def _counts_by_opportunity_day(self):
+        """``{(opportunity_id, day): n}`` by the local date the signups were made."""
+        rows = self.order_by().annotate(day=TruncDate('created_at')).values('opportunity_id', 'day').annotate(
+            n=Count('pk')
+        ).values_list('opportunity_id', 'day', 'n')
+        return {(opportunity_id, day): n for opportunity_id, day, n in rows}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # Which rows were inserted or updated is unknown, so count the
+                # affected opportunities' signups before and after instead.
+                affected = Signup.objects.using(self.db).filter(
+                    opportunity_id__in={signup.opportunity_id for signup in objs}
+                )
+                before = affected._counts_by_opportunity_day()
+                created = super().bulk_create(objs, *args, **kwargs)
+                after = affected._counts_by_opportunity_day()
+                record_signup_changes(
+                    {key: after.get(key, 0) - before.get(key, 0) for key in before.keys() | after.keys()},
+                    using=self.db,
+                )
+            else:
+                created = super().bulk_create(objs, *args, **kwargs)
+                record_signup_changes(_by_day(created), using=self.db)
+        return created
+
+    def claim(self, volunteer, opportunities):
+        """Sign ``volunteer`` up for ``opportunities``, waitlisting them where full.
+
+        Each place is claimed with ``claim_place`` and the signups are then
+        inserted, all in one short transaction. Opportunities are claimed in
+        primary key order so that concurrent signups for several of them
+        take row locks in the same order. Returns ``(signups, waitlist_entries)``.
+        """
+        opportunities = sorted(opportunities, key=lambda opportunity: opportunity.pk)
+        with transaction.atomic(using=self.db):
+            claimed, full = [], []
+            for opportunity in opportunities:
+                has_place = VolunteerOpportunity.objects.using(self.db).claim_place(opportunity.pk)
+                (claimed if has_place else full).append(opportunity)
+            signups = self._insert_claimed([
+                Signup(volunteer=volunteer, opportunity=opportunity) for opportunity in claimed
+            ])
+            waitlisted = WaitlistEntry.objects.using(self.db).bulk_create([
+                WaitlistEntry(volunteer=volunteer, opportunity=opportunity) for opportunity in full
+            ])
+        return signups, waitlisted
+
+    def _insert_claimed(self, objs):
+        """Insert signups whose places ``claim_place`` has already counted."""
+        created = super().bulk_create(objs)
+        if created:
+            changes = _by_day(created)
+            signups_changed.send(sender=Signup, changes=changes, using=self.db)
+            volunteer_counts_changed.send(sender=Signup, deltas=_by_opportunity(changes), using=self.db)
+        return created
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        if 'opportunity' not in kwargs and 'opportunity_id' not in kwargs:
+            return super().update(**kwargs)
+        target = kwargs.get('opportunity_id', kwargs.get('opportunity'))
+        target = getattr(target, 'pk', target)
+        with transaction.atomic(using=self.db):
+            counts = self._counts_by_opportunity_day()
+            rows = super().update(**kwargs)
+            changes = {key: -n for key, n in counts.items()}
+            for (_, day), n in counts.items():
+                changes[target, day] = changes.get((target, day), 0) + n
+            record_signup_changes(changes, using=self.db)
+        return rows
+
+    update.queryset_only = True
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            counts = self._counts_by_opportunity_day()
+            result = super().delete()
+            record_signup_changes({key: -n for key, n in counts.items()}, using=self.db)
+        return result
+
+    delete.queryset_only = True
+
+
+class Signup(models.Model):
+    """A volunteer's registration for one opportunity.
+
+    Saving or deleting a signup adjusts the opportunity's stored
+    ``volunteer_count`` in the same transaction. Signups removed by an
+    opportunity or category cascade need no adjustment since the counted
+    row goes with them.
+    """
+    volunteer = models.ForeignKey(
+        Volunteer,
+        on_delete=models.CASCADE,
+        related_name='signups'
+    )
     opportunity = models.ForeignKey(
         VolunteerOpportunity,
         on_delete=models.CASCADE,
-        related_name='volunteers'
+        related_name='signups'
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SignupQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['volunteer', 'opportunity'], name='unique_signup'),
+        ]
+        indexes = [
+            # Volunteer list and recent sign-ups, newest first.
+            models.Index(fields=['created_at'], name='signup_created_idx'),
+            # An opportunity's signups, newest first.
+            models.Index(fields=['opportunity', 'created_at'], name='signup_opportunity_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.volunteer.name} - {self.opportunity.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_opportunity_id = instance.__dict__.get('opportunity_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        previous = None if self._state.adding else getattr(self, '_loaded_opportunity_id', None)
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if previous != self.opportunity_id:
+                day = signup_day(self)
+                changes = {(self.opportunity_id, day): 1}
+                if previous is not None:
+                    changes[previous, day] = -1
+                record_signup_changes(changes, using=self._state.db)
+        self._loaded_opportunity_id = self.opportunity_id
+
+    save.alters_data = True
+
+    def delete(self, *args, **kwargs):
+        key = (self.opportunity_id, signup_day(self))
+        with transaction.atomic(using=kwargs.get('using')):
+            result = super().delete(*args, **kwargs)
+            record_signup_changes({key: -1}, using=self._state.db)
+        return result
+
+    delete.alters_data = True
+
+
+class WaitlistEntry(models.Model):
+    """A volunteer waiting for a place on a full opportunity.
+
+    Entries become signups in order when places open up, see
+    ``promote_waitlist``.
+    """
+    volunteer = models.ForeignKey(
+        Volunteer,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries'
+    )
+    opportunity = models.ForeignKey(
+        VolunteerOpportunity,
+        on_delete=models.CASCADE,
+        related_name='waitlist'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Waitlist entries"
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['volunteer', 'opportunity'], name='unique_waitlist_entry'),
+        ]
+        indexes = [
+            # An opportunity's waitlist in order.
+            models.Index(fields=['opportunity', 'created_at'], name='waitlist_opportunity_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.volunteer.name} - {self.opportunity.title} (waitlisted)"
+
+
+class ActivityRollup(models.Model):
+    """Signups made and opportunities held per category and day, week or month.
+
+    Maintained incrementally by ``volunteers.rollups`` as signups and
+    opportunities change; ``backfill_rollups`` rebuilds it from scratch.
+    Signups count towards the period they were made in, opportunities
+    towards the period of their date.
+    """
+    DAY, WEEK, MONTH = 'day', 'week', 'month'
+    GRANULARITY_CHOICES = [(DAY, 'Day'), (WEEK, 'Week'), (MONTH, 'Month')]
+
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    period = models.DateField(help_text="First day of the period; weeks start on Monday")
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='activity_rollups'
+    )
+    signups = models.IntegerField(default=0)
+    opportunities = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['granularity', 'period', 'category']
+        constraints = [
+            # Also serves date range lookups for one granularity.
+            models.UniqueConstraint(fields=['granularity', 'period', 'category'], name='unique_activity_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.category} - {self.granularity} of {self.period}"
+
+
+class ArchivedOpportunity(models.Model):
+    """A past opportunity moved out of the hot tables by ``archive_opportunities``.
+
+    Keeps the primary key it had, so links to it keep working.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    date = models.DateField()
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='archived_opportunities'
+    )
+    volunteer_count = models.PositiveIntegerField(default=0)
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Archived opportunities"
+        ordering = ['date', 'title']
+
+    def __str__(self):
+        return f"{self.title} - {self.date} (archived)"
+
+
+class ArchivedSignup(models.Model):
+    """A signup for an archived opportunity, with a copy of the volunteer's details.
+
+    The volunteer is removed from the hot tables once nothing else refers
+    to them, so ``volunteer_id`` may no longer exist there.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    opportunity = models.ForeignKey(
+        ArchivedOpportunity,
+        on_delete=models.CASCADE,
+        related_name='signups'
+    )
+    volunteer_id = models.BigIntegerField(db_index=True)
+    volunteer_name = models.CharField(max_length=200)
+    volunteer_age = models.PositiveIntegerField()
+    volunteer_expertise = models.TextField()
+    volunteer_email = models.EmailField(blank=True, default='')
+    created_at = models.DateTimeField()
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.name} - {self.opportunity.title}"
\ No newline at end of file
+        return f"{self.volunteer_name} - {self.opportunity.title} (archived)"
+
+
+class Task(models.Model):
+    """A unit of background work, run by the ``run_tasks`` worker; see ``volunteers/tasks.py``.
+
+    A task is due once ``available_at`` has passed. A worker running it
+    pushes ``available_at`` forward by its visibility timeout, so the task
+    is picked up again should the worker die; finished tasks are deleted.
+    """
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    available_at = models.DateTimeField(default=timezone.now)
+    # Set by the worker currently running the task.
+    lease = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['available_at', 'id']
+        indexes = [
+            # Workers claim the pending tasks that are due, oldest first.
+            models.Index(fields=['status', 'available_at'], name='task_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
@@ -0,0 +1,237 @@
+"""Keyset (cursor) pagination, and page counts that stay cheap on big tables.
+
+Pages are selected with a ``WHERE (a, b, id) > (...)`` style filter on the
+queryset's own ordering instead of ``OFFSET``, so fetching page 1,000 costs
+the same as fetching page 1 and the database never materializes the rows
+being skipped. Cursors are opaque, URL-safe tokens encoding the sort key of
+the first or last row on the current page.
+
+``EstimatedCountPaginator`` is for the admin, whose numbered pages need a
+count: it counts at most ``EXACT_COUNT_LIMIT`` rows and estimates beyond.
+"""
+import base64
+import datetime
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Results up to this size are counted exactly.
+EXACT_COUNT_LIMIT = 10_000
+# How long a whole-table count stands in where the database keeps no statistics.
+COUNT_CACHE_TIMEOUT = 60
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor or limit from the request cannot be used."""
+
+
+def parse_limit(value, default, maximum):
+    """Validate a ``limit`` query parameter, falling back to ``default``."""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor('limit must be an integer.')
+    if not 1 <= limit <= maximum:
+        raise InvalidCursor(f'limit must be between 1 and {maximum}.')
+    return limit
+
+
+def _encode_key_value(value):
+    # Full precision: DjangoJSONEncoder truncates datetimes to milliseconds,
+    # which would skip or repeat rows created within the same millisecond.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPage:
+    """One page of results with cursors to its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate a queryset by its ordering, with the primary key as tie-breaker.
+
+    Ordering fields must be attributes of the returned objects (model fields
+    or annotations) and must not be nullable. The tie-breaker sorts in the
+    same direction as the last ordering field, so that an index on the
+    ordering (which ends with the row id in SQLite) can serve the whole
+    ORDER BY.
+    """
+
+    def __init__(self, queryset, limit, ordering=None):
+        ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            ordering.append('-pk' if ordering and ordering[-1].startswith('-') else 'pk')
+        self.ordering = ordering
+        self.queryset = queryset.order_by(*ordering)
+        self.limit = limit
+
+    def page(self, cursor=None):
+        rows, backwards, has_previous = self._window(cursor)
+        return self._page(list(rows), backwards, has_previous)
+
+    async def apage(self, cursor=None):
+        """Async version of ``page()``."""
+        rows, backwards, has_previous = self._window(cursor)
+        return self._page([row async for row in rows], backwards, has_previous)
+
+    def _window(self, cursor):
+        """The sliced queryset for a page, whether it runs backwards, and whether a previous page exists."""
+        if not cursor:
+            return self.queryset[:self.limit + 1], False, False
+        values, backwards = self.decode_cursor(cursor)
+        try:
+            queryset = self.queryset.filter(self._beyond(values, backwards))
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor('Invalid cursor.')
+        if backwards:
+            return queryset.reverse()[:self.limit + 1], True, None
+        return queryset[:self.limit + 1], False, True
+
+    def _page(self, rows, backwards, has_previous):
+        if backwards:
+            has_previous = len(rows) > self.limit
+            rows = rows[:self.limit][::-1]
+            return KeysetPage(
+                rows,
+                next_cursor=self.encode_cursor(rows[-1]) if rows else None,
+                previous_cursor=self.encode_cursor(rows[0], backwards=True) if has_previous else None,
+            )
+        has_next = len(rows) > self.limit
+        rows = rows[:self.limit]
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], backwards=True) if has_previous and rows else None,
+        )
+
+    def _beyond(self, values, backwards=False):
+        """Rows sorting strictly after (or before) the given key."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != backwards
+            condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+            equal[name] = value
+        # A redundant range on the leading field lets the database walk an
+        # index on the ordering instead of OR-ing several index lookups and
+        # sorting the result.
+        name = self.ordering[0].lstrip('-')
+        descending = self.ordering[0].startswith('-') != backwards
+        return Q(**{f'{name}__{"lte" if descending else "gte"}': values[0]}) & condition
+
+    def _key(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, obj, backwards=False):
+        payload = json.dumps(
+            {'k': self._key(obj), 'b': backwards},
+            default=_encode_key_value,
+            separators=(',', ':'),
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values, backwards = payload['k'], bool(payload['b'])
+        except (ValueError, TypeError, KeyError):
+            raise InvalidCursor('Invalid cursor.')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor('Invalid cursor.')
+        return values, backwards
+
+
+def table_statistics_count(model, using='default'):
+    """The row count of ``model``'s table from the database's statistics, or None if it has none.
+
+    PostgreSQL's ``reltuples`` and SQLite's ``sqlite_stat1`` are refreshed by
+    ``ANALYZE`` (and autovacuum or ``PRAGMA optimize``), so they lag writes.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # One row per index, starting with the number of rows indexed.
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            return max(counts) if counts else None
+    return None
+
+
+def estimated_count(model, using='default'):
+    """Roughly how many rows ``model``'s table has: from statistics, else a recently cached count."""
+    estimate = table_statistics_count(model, using)
+    if estimate is None:
+        key = f'volunteers:table-count:{using}:{model._meta.db_table}'
+        estimate = cache.get(key)
+        if estimate is None:
+            estimate = model._default_manager.using(using).count()
+            cache.set(key, estimate, timeout=COUNT_CACHE_TIMEOUT)
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """Numbered pages whose count stops at ``EXACT_COUNT_LIMIT`` rows.
+
+    Smaller results are counted exactly. Past the limit a whole table is
+    counted with ``estimated_count`` and ``estimated`` is set; a filtered
+    result is reported as the limit and ``capped`` is set, so its later
+    pages are out of reach until the filter is narrowed.
+    """
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        counted = queryset.order_by().values('pk')[:EXACT_COUNT_LIMIT + 1].count()
+        if counted <= EXACT_COUNT_LIMIT:
+            return counted
+        if queryset.query.has_filters():
+            self.capped = True
+            return EXACT_COUNT_LIMIT
+        self.estimated = True
+        return max(estimated_count(queryset.model, queryset.db), counted)
@@ -0,0 +1,138 @@
+"""Deleting opportunities in bulk.
+
+``VolunteerOpportunity.delete()`` hands the cascade to Django's collector,
+which loads every signup and waitlist entry into Python, and the rollups
+count each deleted opportunity's signups on its way out. For an
+opportunity with thousands of signups, or thousands of opportunities, that
+is slow. ``purge_batch`` instead deletes a batch of opportunities with a
+few set-based statements, like ``archive_batch`` but without keeping a
+copy: their waitlist entries, signups, the opportunities themselves, and
+volunteers left with no signups or waitlist entries.
+
+The removed signups are reported with ``signups_changed`` and the
+opportunities with ``opportunities_purged``, so the rollups and caches
+follow. Counts of other opportunities are unaffected: purged signups only
+ever counted towards the purged opportunities.
+
+``purge_volunteers_batch`` does the same for volunteers, whose queryset
+``delete()`` sends ``post_delete`` for each one. Their signups do count
+towards opportunities that stay, so those are recounted and waitlists
+promoted as for any other signup delete.
+"""
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Signup, Volunteer, VolunteerOpportunity, WaitlistEntry, record_signup_changes
+from .signals import opportunities_purged, signups_changed, volunteers_bulk_changed
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def delete_opportunity_rows(ids, using='default'):
+    """Delete opportunities, their signups, waitlist entries and the volunteers left without any.
+
+    Bypasses the models' delete hooks; callers announce the deletes.
+    Returns ``(signups, volunteers)`` deleted.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    opportunities, signups = quote(VolunteerOpportunity._meta.db_table), quote(Signup._meta.db_table)
+    volunteers, waitlist = quote(Volunteer._meta.db_table), quote(WaitlistEntry._meta.db_table)
+    in_ids = f'IN ({", ".join(["%s"] * len(ids))})'
+
+    with connection.cursor() as cursor:
+        # Picked inside the statement, before their signups go: there may be
+        # more of them than a statement can take parameters. Foreign keys are
+        # only checked at commit.
+        cursor.execute(
+            f'DELETE FROM {volunteers} WHERE id IN ('
+            f'SELECT volunteer_id FROM {signups} WHERE opportunity_id {in_ids} '
+            f'UNION SELECT volunteer_id FROM {waitlist} WHERE opportunity_id {in_ids}) '
+            f'AND NOT EXISTS (SELECT 1 FROM {signups} s '
+            f'WHERE s.volunteer_id = {volunteers}.id AND s.opportunity_id NOT {in_ids}) '
+            f'AND NOT EXISTS (SELECT 1 FROM {waitlist} w '
+            f'WHERE w.volunteer_id = {volunteers}.id AND w.opportunity_id NOT {in_ids})',
+            ids * 4,
+        )
+        deleted_volunteers = cursor.rowcount
+        cursor.execute(f'DELETE FROM {signups} WHERE opportunity_id {in_ids}', ids)
+        deleted_signups = cursor.rowcount
+        cursor.execute(f'DELETE FROM {waitlist} WHERE opportunity_id {in_ids}', ids)
+        cursor.execute(f'DELETE FROM {opportunities} WHERE id {in_ids}', ids)
+    return deleted_signups, deleted_volunteers
+
+
+def orphaned_volunteers(opportunities):
+    """The volunteers that purging ``opportunities`` deletes: those with no signup or waitlist entry elsewhere."""
+    ids = opportunities.values('pk')
+    signups = Signup.objects.filter(volunteer=OuterRef('pk'))
+    entries = WaitlistEntry.objects.filter(volunteer=OuterRef('pk'))
+    return Volunteer.objects.using(opportunities.db).filter(
+        Exists(signups.filter(opportunity__in=ids)) | Exists(entries.filter(opportunity__in=ids)),
+        ~Exists(signups.exclude(opportunity__in=ids)),
+        ~Exists(entries.exclude(opportunity__in=ids)),
+    )
+
+
+def purge_batch(queryset, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete up to ``batch_size`` opportunities of ``queryset`` with everything hanging off them.
+
+    Returns ``(opportunities, signups, volunteers)`` deleted; all zero once
+    nothing in ``queryset`` is left.
+    """
+    using = queryset.db
+    with transaction.atomic(using=using):
+        rows = list(queryset.order_by('pk').values_list('pk', 'category_id', 'date')[:batch_size])
+        if not rows:
+            return 0, 0, 0
+        ids = [pk for pk, _, _ in rows]
+        counts = Signup.objects.using(using).filter(opportunity_id__in=ids)._counts_by_opportunity_day()
+        if counts:
+            # Sent first, while the rollups can still look up the opportunities' categories.
+            signups_changed.send(sender=Signup, changes={key: -n for key, n in counts.items()}, using=using)
+        deleted_signups, deleted_volunteers = delete_opportunity_rows(ids, using)
+        opportunities_purged.send(sender=VolunteerOpportunity, opportunities=rows, using=using)
+    return len(ids), deleted_signups, deleted_volunteers
+
+
+def purge(queryset, batch_size=DEFAULT_BATCH_SIZE):
+    """Purge all of ``queryset`` one batch at a time, yielding each ``purge_batch`` result."""
+    while True:
+        deleted = purge_batch(queryset, batch_size)
+        if not deleted[0]:
+            return
+        yield deleted
+
+
+def purge_volunteers_batch(queryset, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete up to ``batch_size`` volunteers of ``queryset`` with their signups and waitlist entries.
+
+    Returns ``(volunteers, signups)`` deleted; both zero once nothing in
+    ``queryset`` is left.
+    """
+    using = queryset.db
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=using):
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return 0, 0
+        in_ids = f'IN ({", ".join(["%s"] * len(ids))})'
+        counts = Signup.objects.using(using).filter(volunteer_id__in=ids)._counts_by_opportunity_day()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {quote(WaitlistEntry._meta.db_table)} WHERE volunteer_id {in_ids}', ids)
+            cursor.execute(f'DELETE FROM {quote(Signup._meta.db_table)} WHERE volunteer_id {in_ids}', ids)
+            deleted_signups = cursor.rowcount
+            cursor.execute(f'DELETE FROM {quote(Volunteer._meta.db_table)} WHERE id {in_ids}', ids)
+        record_signup_changes({key: -n for key, n in counts.items()}, using=using)
+        volunteers_bulk_changed.send(sender=Volunteer, using=using)
+    return len(ids), deleted_signups
+
+
+def purge_volunteers(queryset, batch_size=DEFAULT_BATCH_SIZE):
+    """Purge all of ``queryset`` one batch at a time, yielding each ``purge_volunteers_batch`` result."""
+    while True:
+        deleted = purge_volunteers_batch(queryset, batch_size)
+        if not deleted[0]:
+            return
+        yield deleted
@@ -0,0 +1,285 @@
+"""Activity rollups: signups and opportunities per category and period.
+
+``ActivityRollup`` holds one row per granularity (day, week, month),
+period and category, so a chart over any date range reads a handful of
+rows instead of scanning signups and opportunities. Every write that adds,
+removes or moves a signup or an opportunity adds its changes to the day,
+week and month rows in the same transaction, with one upsert statement.
+
+Queryset updates of opportunity dates or categories cannot say which
+rows moved; they queue a ``rebuild_categories`` task, in the same
+transaction, that recounts the rows of the categories involved. The
+migration creating the table fills it from the existing data, and
+``backfill_rollups`` rebuilds it on demand.
+
+Archiving opportunities does not change the counts: archived signups and
+opportunities are still history, and rebuilds count them from the archive.
+"""
+from datetime import date, timedelta
+
+from django.db import connections, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    ActivityRollup, ArchivedOpportunity, ArchivedSignup, Category, Signup, VolunteerOpportunity,
+)
+from .signals import opportunities_bulk_changed, opportunities_purged, signups_changed
+from .tasks import enqueue, task
+
+GRANULARITIES = (ActivityRollup.DAY, ActivityRollup.WEEK, ActivityRollup.MONTH)
+
+# Rows per upsert statement, well under SQLite's limit on bound parameters.
+UPSERT_BATCH_SIZE = 500
+
+
+def period_start(day, granularity):
+    """The first day of the ``granularity`` period containing ``day``."""
+    if granularity == ActivityRollup.WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == ActivityRollup.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def next_period(period, granularity):
+    """The first day of the period after the one starting on ``period``."""
+    if granularity == ActivityRollup.WEEK:
+        return period + timedelta(weeks=1)
+    if granularity == ActivityRollup.MONTH:
+        return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+    return period + timedelta(days=1)
+
+
+def periods(start, end, granularity):
+    """Starts of the periods from the one containing ``start`` to the one containing ``end``."""
+    period, last = period_start(start, granularity), period_start(end, granularity)
+    while period <= last:
+        yield period
+        period = next_period(period, granularity)
+
+
+def apply_changes(changes, using='default'):
+    """Add ``{(category_id, day): (signups, opportunities)}`` to every granularity's rows."""
+    rows = {}
+    for (category_id, day), (signups, opportunities) in changes.items():
+        for granularity in GRANULARITIES:
+            key = (granularity, period_start(day, granularity), category_id)
+            total = rows.setdefault(key, [0, 0])
+            total[0] += signups
+            total[1] += opportunities
+    # Sorted, so concurrent writers lock rows in the same order.
+    rows = sorted((*key, *total) for key, total in rows.items() if any(total))
+    connection = connections[using]
+    table = connection.ops.quote_name(ActivityRollup._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table} (granularity, period, category_id, signups, opportunities) '
+                f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(batch))} '
+                f'ON CONFLICT (granularity, period, category_id) DO UPDATE SET '
+                f'signups = {table}.signups + excluded.signups, '
+                f'opportunities = {table}.opportunities + excluded.opportunities',
+                [
+                    value
+                    for granularity, period, category_id, signups, opportunities in batch
+                    for value in (
+                        granularity, connection.ops.adapt_datefield_value(period),
+                        category_id, signups, opportunities,
+                    )
+                ],
+            )
+
+
+def _add(changes, key, signups=0, opportunities=0):
+    current = changes.get(key, (0, 0))
+    changes[key] = (current[0] + signups, current[1] + opportunities)
+
+
+def counted(using='default', categories=None):
+    """``{(category_id, day): (signups, opportunities)}`` counted from the source tables.
+
+    One grouped scan of each of the hot and archive tables, limited to the
+    ids in ``categories`` if given.
+    """
+    changes = {}
+    for model in (Signup, ArchivedSignup):
+        signups = model.objects.using(using).order_by()
+        if categories is not None:
+            signups = signups.filter(opportunity__category_id__in=categories)
+        signups = signups.annotate(day=TruncDate('created_at')).values(
+            'opportunity__category_id', 'day'
+        ).annotate(n=Count('pk')).values_list('opportunity__category_id', 'day', 'n')
+        for category_id, day, n in signups.iterator():
+            _add(changes, (category_id, day), signups=n)
+    for model in (VolunteerOpportunity, ArchivedOpportunity):
+        opportunities = model.objects.using(using).order_by()
+        if categories is not None:
+            opportunities = opportunities.filter(category_id__in=categories)
+        opportunities = opportunities.values(
+            'category_id', 'date'
+        ).annotate(n=Count('pk')).values_list('category_id', 'date', 'n')
+        for category_id, day, n in opportunities.iterator():
+            _add(changes, (category_id, day), opportunities=n)
+    return changes
+
+
+def stored(using='default'):
+    """The day rows of the table in the same form as ``counted()``."""
+    rows = ActivityRollup.objects.using(using).filter(granularity=ActivityRollup.DAY).values_list(
+        'category_id', 'period', 'signups', 'opportunities'
+    )
+    return {
+        (category_id, day): (signups, opportunities)
+        for category_id, day, signups, opportunities in rows.iterator()
+        if signups or opportunities
+    }
+
+
+def rebuild(using='default', categories=None):
+    """Recompute the table, or the rows of the ids in ``categories``; returns the number of (category, day) pairs."""
+    with transaction.atomic(using=using):
+        rows = ActivityRollup.objects.using(using).all()
+        if categories is not None:
+            rows = rows.filter(category_id__in=categories)
+        # Deleting first takes the write lock, so no upsert lands between
+        # the count and the new rows.
+        rows.delete()
+        changes = counted(using, categories)
+        apply_changes(changes, using)
+    return len(changes)
+
+
+@task()
+def rebuild_categories(category_ids=None):
+    """Recompute the rows of ``category_ids``, or the whole table if None."""
+    rebuild(categories=category_ids)
+
+
+def activity(start, end, granularity, category=None, using=None):
+    """Signup and opportunity counts per period and category between two dates.
+
+    Periods are those containing ``start`` through the one containing
+    ``end``, each reported in full. Returns ``{'periods': [...], 'series':
+    [...], 'totals': {...}}`` with a series per category (or just
+    ``category``) and zeros for periods without activity.
+    """
+    starts = list(periods(start, end, granularity))
+    position = {period: i for i, period in enumerate(starts)}
+    categories = Category.objects.using(using).order_by('name')
+    rows = ActivityRollup.objects.using(using).filter(
+        granularity=granularity, period__gte=starts[0], period__lte=starts[-1]
+    ).order_by()
+    if category is not None:
+        categories = categories.filter(pk=category.pk)
+        rows = rows.filter(category=category)
+
+    series = {
+        category.pk: {
+            'category': {'id': category.pk, 'name': category.name, 'slug': category.slug},
+            'signups': [0] * len(starts),
+            'opportunities': [0] * len(starts),
+        }
+        for category in categories
+    }
+    totals = {'signups': [0] * len(starts), 'opportunities': [0] * len(starts)}
+    for period, category_id, signups, opportunities in rows.values_list(
+        'period', 'category_id', 'signups', 'opportunities'
+    ):
+        i = position[period]
+        series[category_id]['signups'][i] = signups
+        series[category_id]['opportunities'][i] = opportunities
+        totals['signups'][i] += signups
+        totals['opportunities'][i] += opportunities
+    return {
+        'periods': [period.isoformat() for period in starts],
+        'series': list(series.values()),
+        'totals': totals,
+    }
+
+
+def _signup_days(opportunity, using):
+    """``{day: n}`` for the signups of ``opportunity``."""
+    counts = Signup.objects.using(using).filter(opportunity=opportunity)._counts_by_opportunity_day()
+    return {day: n for (_, day), n in counts.items()}
+
+
+@receiver(signups_changed, sender=Signup)
+def signups_changed_receiver(sender, changes, using, **kwargs):
+    categories = dict(
+        VolunteerOpportunity.objects.using(using).filter(
+            pk__in={opportunity_id for opportunity_id, _ in changes}
+        ).values_list('pk', 'category_id')
+    )
+    by_category = {}
+    for (opportunity_id, day), delta in changes.items():
+        if opportunity_id in categories:
+            _add(by_category, (categories[opportunity_id], day), signups=delta)
+    apply_changes(by_category, using)
+
+
+@receiver(pre_save, sender=VolunteerOpportunity)
+def opportunity_saving(sender, instance, using, **kwargs):
+    if instance._state.adding:
+        instance._rollup_previous = None
+        return
+    previous = (getattr(instance, '_loaded_date', None), getattr(instance, '_loaded_category_id', None))
+    if None in previous:
+        previous = VolunteerOpportunity.objects.using(using).filter(pk=instance.pk).values_list(
+            'date', 'category_id'
+        ).first()
+    instance._rollup_previous = previous
+
+
+@receiver(post_save, sender=VolunteerOpportunity)
+def opportunity_saved(sender, instance, created, using, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    current = (instance.date, instance.category_id)
+    if previous == current:
+        return
+    changes = {}
+    _add(changes, (current[1], current[0]), opportunities=1)
+    if previous is not None:
+        _add(changes, (previous[1], previous[0]), opportunities=-1)
+        if previous[1] != current[1]:
+            # The signups move to the new category with the opportunity.
+            for day, n in _signup_days(instance, using).items():
+                _add(changes, (current[1], day), signups=n)
+                _add(changes, (previous[1], day), signups=-n)
+    apply_changes(changes, using)
+
+
+@receiver(pre_delete, sender=VolunteerOpportunity)
+def opportunity_deleting(sender, instance, using, **kwargs):
+    # Its signups are removed by the cascade without sending signups_changed.
+    changes = {}
+    for day, n in _signup_days(instance, using).items():
+        _add(changes, (instance.category_id, day), signups=-n)
+    _add(changes, (instance.category_id, instance.date), opportunities=-1)
+    apply_changes(changes, using)
+
+
+@receiver(opportunities_bulk_changed, sender=VolunteerOpportunity)
+def opportunities_bulk_changed_receiver(sender, using, opportunities=None, categories=None, **kwargs):
+    if opportunities is None:
+        enqueue(
+            rebuild_categories, using=using,
+            category_ids=None if categories is None else sorted(categories),
+        )
+        return
+    changes = {}
+    for opportunity in opportunities:
+        _add(changes, (opportunity.category_id, opportunity.date), opportunities=1)
+    apply_changes(changes, using)
+
+
+@receiver(opportunities_purged, sender=VolunteerOpportunity)
+def opportunities_purged_receiver(sender, opportunities, using, **kwargs):
+    # Their signups were subtracted through signups_changed.
+    changes = {}
+    for _, category_id, date in opportunities:
+        _add(changes, (category_id, date), opportunities=-1)
+    apply_changes(changes, using)
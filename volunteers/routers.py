@@ -0,0 +1,120 @@
+"""Primary/replica database routing.
+
+Writes always go to the primary (``default``). Reads go to the replica only
+while a view marked with ``@replica_reads`` handles a GET or HEAD request;
+everything else, including the admin, management commands and any view
+that writes, reads from the primary. ``ReplicaRoutingMiddleware`` makes that
+decision per request and keeps it in a context variable, which the router
+consults and which async views carry into the ORM's worker threads.
+
+A replica lags behind the primary, so after a client sends a POST the
+middleware sets a short-lived cookie and that client's reads stay on the
+primary until it expires. Someone who just signed up therefore sees their
+signup on the dashboard they are redirected to.
+
+``settings.REPLICA_DATABASE`` names the replica alias. Without one, or when
+the alias is the primary database under another name (as under the test
+runner, where it is a test mirror), all reads go to the primary.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'read_primary'
+
+_replica_reads = ContextVar('volunteers_replica_reads', default=False)
+
+
+def replica_reads(view):
+    """Mark a read-only view whose queries may be served by the replica."""
+    view.replica_reads = True
+    return view
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, e.g. to cache the results."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_database():
+    """The alias of a separate replica database, or None."""
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    if alias is None or alias not in connections:
+        return None
+    if connections[alias].settings_dict['NAME'] == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return None
+    return alias
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            return replica_database()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or objects loaded from the replica would be saved back to it.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, schema included.
+        if db == getattr(settings, 'REPLICA_DATABASE', None):
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Route reads of ``@replica_reads`` views to the replica, except for pinned clients."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _replica_reads.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = _replica_reads.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        return self.pin(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _replica_reads.set(self.use_replica(request, view_func))
+
+    def use_replica(self, request, view_func):
+        return (
+            getattr(view_func, 'replica_reads', False)
+            and request.method in ('GET', 'HEAD')
+            and PIN_COOKIE not in request.COOKIES
+        )
+
+    def pin(self, request, response):
+        """Keep a client that just wrote on the primary until the replica catches up."""
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
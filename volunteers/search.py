@@ -0,0 +1,183 @@
+"""Full-text search over volunteer opportunities.
+
+On SQLite the title and description are indexed in an FTS5 virtual table
+that uses the opportunities table as external content. Triggers keep the
+index in step with every write path, including ``bulk_create`` and
+queryset ``update``/``delete`` that bypass model hooks. Other backends,
+or SQLite builds without FTS5, fall back to ``icontains`` matching.
+
+Volunteers are found by a prefix of their name or their exact email
+address instead, which SQLite answers from ``NOCASE`` indexes.
+"""
+import re
+
+from django.db import OperationalError, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'volunteers_opportunity_fts'
+CONTENT_TABLE = 'volunteers_volunteeropportunity'
+
+# Title matches weigh ten times as much as description matches.
+RANK_SQL = f'bm25({FTS_TABLE}, 10.0, 1.0)'
+
+FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='{CONTENT_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {CONTENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {CONTENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON {CONTENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+# SQLite only uses an index for LIKE, which Django's ``istartswith`` and
+# ``iexact`` compile to, if the index has the NOCASE collation.
+NOCASE_INDEXES = [
+    ('volunteer_name_nocase_idx', 'volunteers_volunteer', 'name'),
+    ('volunteer_email_nocase_idx', 'volunteers_volunteer', 'email'),
+]
+
+_fts_available = {}
+
+
+def install_fts(connection, rebuild=False):
+    """Create the FTS table and sync triggers if missing.
+
+    Safe to run repeatedly. It runs after every migrate because SQLite
+    table rebuilds done by Django's schema editor drop the triggers.
+    Returns False when the backend has no FTS5 support.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            for statement in FTS_DDL:
+                cursor.execute(statement)
+            if rebuild:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except OperationalError:
+        # SQLite compiled without FTS5.
+        return False
+    _fts_available.pop(connection.settings_dict['NAME'], None)
+    return True
+
+
+def install_nocase_indexes(connection):
+    """Create the NOCASE indexes if missing; like the FTS triggers, table rebuilds drop them.
+
+    Migration 0015 creates them first. Indexes on columns an unapplied
+    migration would add are skipped.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        columns = {}
+        for name, table, column in NOCASE_INDEXES:
+            if table not in columns:
+                columns[table] = {
+                    field.name for field in connection.introspection.get_table_description(cursor, table)
+                }
+            if column in columns[table]:
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} COLLATE NOCASE)')
+    return True
+
+
+def uninstall_fts(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    _fts_available.pop(connection.settings_dict['NAME'], None)
+
+
+def fts_available(using='default'):
+    """Whether the FTS index exists on the given database."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    key = connection.settings_dict['NAME']
+    if key not in _fts_available:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [FTS_TABLE],
+            )
+            _fts_available[key] = cursor.fetchone() is not None
+    return _fts_available[key]
+
+
+def build_match_expression(term):
+    """Turn user input into an FTS5 query where every word is a prefix match.
+
+    ``"math tut"`` becomes ``"math"* "tut"*``, i.e. both prefixes must match.
+    Returns an empty string when the input has no searchable words.
+    """
+    words = re.findall(r'\w+', term)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_opportunities(queryset, term):
+    """Filter opportunities matching ``term``, best matches first.
+
+    Matching rows are annotated with ``search_rank`` (lower is better) when
+    the FTS index is in use. Without it, rows are matched with
+    ``icontains`` and keep the queryset's ordering.
+    """
+    expression = build_match_expression(term)
+    if not expression or not fts_available(queryset.db):
+        return match_opportunities(queryset, term)
+
+    rank = RawSQL(
+        f'SELECT {RANK_SQL} FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {CONTENT_TABLE}.id',
+        [expression],
+    )
+    ordering = ['search_rank', *(queryset.query.order_by or queryset.model._meta.ordering)]
+    return match_opportunities(queryset, term).annotate(search_rank=rank).order_by(*ordering)
+
+
+def match_opportunities(queryset, term):
+    """Filter opportunities matching ``term`` like ``search_opportunities``, without ranking them.
+
+    For listings in an order of their own: ranking costs a second index
+    lookup for every match.
+    """
+    expression = build_match_expression(term)
+    if not expression or not fts_available(queryset.db):
+        return queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    matches = RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [expression],
+    )
+    return queryset.filter(pk__in=matches)
+
+
+def search_volunteers(queryset, term):
+    """Filter volunteers whose name starts with ``term`` or whose email is ``term``, ignoring case."""
+    term = term.strip()
+    if not term:
+        return queryset
+    return queryset.filter(Q(name__istartswith=term) | Q(email__iexact=term))
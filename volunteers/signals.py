@@ -0,0 +1,38 @@
+"""Signals for writes that bypass ``post_save``/``post_delete``."""
+from django.dispatch import Signal
+
+# Sent after stored volunteer counts change. Arguments: ``deltas``, a dict
+# of ``{opportunity_id: change}``, and ``using``.
+volunteer_counts_changed = Signal()
+
+# Sent after signups are created, deleted or moved to another opportunity.
+# Arguments: ``changes``, a dict of ``{(opportunity_id, day): change}`` where
+# ``day`` is the local date the signups were made; and ``using``.
+signups_changed = Signal()
+
+# Sent after a bulk write to opportunities (``bulk_create`` or a queryset
+# ``update`` touching dates or categories). Arguments: ``using``;
+# ``opportunities``, the created instances for ``bulk_create`` or None; and
+# for an ``update``, ``categories``, the ids of the categories opportunities
+# were moved from or to, or None when they are unknown.
+opportunities_bulk_changed = Signal()
+
+# Sent after volunteers are created with ``bulk_create`` or deleted with
+# set-based statements. Arguments: ``using``.
+volunteers_bulk_changed = Signal()
+
+# Sent after past opportunities, their signups and volunteers left without
+# any are moved to the archive tables. Arguments: ``opportunity_ids`` and
+# ``using``.
+opportunities_archived = Signal()
+
+# Sent after opportunities are deleted with set-based statements along with
+# their signups, waitlist entries and volunteers left without any; the
+# signups are reported with ``signups_changed``. Arguments:
+# ``opportunities``, a list of ``(id, category_id, date)``, and ``using``.
+opportunities_purged = Signal()
+
+# Sent after duplicate volunteers are merged into one and deleted.
+# Arguments: ``survivors``, a dict of ``{deleted_volunteer_id:
+# surviving_volunteer_id}``, and ``using``.
+volunteers_merged = Signal()
@@ -0,0 +1,48 @@
+"""Connection profile for SQLite.
+
+Every new SQLite connection runs the PRAGMAs in ``settings.SQLITE_PRAGMAS``
+from a ``connection_created`` receiver. The production profile in settings
+switches to write-ahead logging so readers are not blocked by a writer,
+relaxes ``synchronous`` to NORMAL (safe under WAL: a power loss can only lose
+the last commits, not corrupt the file), enlarges the page cache, memory-maps
+the file, waits on a locked database instead of failing immediately and
+keeps temporary tables in memory.
+
+A value of None leaves that PRAGMA at SQLite's default.
+"""
+from django.conf import settings
+
+# Applied in this order: busy_timeout first so that switching the journal
+# mode waits for other connections instead of failing.
+PRAGMA_ORDER = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+
+
+def pragmas():
+    """The configured PRAGMAs, in the order they are applied."""
+    configured = getattr(settings, 'SQLITE_PRAGMAS', {})
+    ordered = [name for name in PRAGMA_ORDER if name in configured]
+    ordered += sorted(set(configured) - set(PRAGMA_ORDER))
+    return [(name, configured[name]) for name in ordered if configured[name] is not None]
+
+
+def apply_pragmas(connection):
+    with connection.cursor() as cursor:
+        for name, value in pragmas():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def current_pragmas(connection):
+    """The values the connection is actually running with, by PRAGMA name."""
+    values = {}
+    with connection.cursor() as cursor:
+        for name, _ in pragmas():
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            # mmap_size reports nothing for in-memory databases.
+            values[name] = row[0] if row else None
+    return values
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection)
@@ -0,0 +1,377 @@
+"""Cached dashboard statistics.
+
+The dashboard totals and per-category breakdown are kept as one snapshot in
+Django's cache. Writes patch the snapshot in place after their transaction
+commits, so the front page normally never touches the database for stats.
+
+Correctness rests on a generation counter stored next to the snapshot. A
+snapshot is only served while its generation matches the counter, and any
+change that cannot be applied incrementally (category edits, bulk writes, a
+patch racing a rebuild) just bumps the counter. The snapshot also records
+the day it was computed for, since "upcoming" changes at midnight without
+any write. A stale snapshot is rebuilt by a single caller holding a cache
+lock while the others keep serving it; on a cold cache the others wait
+briefly for the rebuild instead of all querying at once.
+
+``aget_dashboard_stats`` is the same for async views, using the cache's
+async API and running the three rebuild queries concurrently.
+
+The snapshot covers the hot tables only. ``with_archived`` adds the
+archive's totals, which are cached separately until the next archive run.
+"""
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ArchivedOpportunity, ArchivedSignup, Category, VolunteerOpportunity, Volunteer
+from .routers import primary_reads
+from .signals import (
+    opportunities_archived, opportunities_bulk_changed, opportunities_purged, volunteer_counts_changed,
+    volunteers_bulk_changed, volunteers_merged,
+)
+
+SNAPSHOT_KEY = 'volunteers:dashboard-stats'
+GENERATION_KEY = 'volunteers:dashboard-stats:generation'
+LOCK_KEY = 'volunteers:dashboard-stats:lock'
+ARCHIVE_KEY = 'volunteers:dashboard-stats:archive'
+
+# Upper bound on staleness should an update be lost, e.g. when a worker
+# dies between commit and patching the cache.
+SNAPSHOT_TIMEOUT = getattr(settings, 'DASHBOARD_STATS_TIMEOUT', 60 * 60)
+LOCK_TIMEOUT = 30
+COLD_WAIT = 2.0
+COLD_POLL_INTERVAL = 0.05
+
+
+def _opportunity_totals(today):
+    return {'total': Count('pk'), 'upcoming': Count('pk', filter=Q(date__gte=today))}
+
+
+def _category_stats():
+    return Category.objects.annotate(
+        opportunity_count=Count('opportunities'),
+        volunteer_count=Sum('opportunities__volunteer_count', default=0),
+    ).values('id', 'name', 'slug', 'opportunity_count', 'volunteer_count')
+
+
+def _snapshot(today, totals, volunteers, categories):
+    return {
+        'as_of': today.isoformat(),
+        'total_opportunities': totals['total'],
+        'upcoming_opportunities': totals['upcoming'],
+        'total_volunteers': volunteers,
+        'categories': categories,
+    }
+
+
+def compute_dashboard_stats(today=None):
+    """Compute the stats snapshot from the database (three queries).
+
+    Always reads the primary: writes patch the cached snapshot from here on,
+    so it must not start out behind a lagging replica.
+    """
+    today = today or timezone.now().date()
+    with primary_reads():
+        totals = VolunteerOpportunity.objects.aggregate(**_opportunity_totals(today))
+        return _snapshot(today, totals, Volunteer.objects.count(), list(_category_stats()))
+
+
+async def acompute_dashboard_stats(today=None):
+    """Async version of ``compute_dashboard_stats()``, issuing the queries concurrently."""
+    today = today or timezone.now().date()
+
+    async def categories():
+        return [row async for row in _category_stats()]
+
+    with primary_reads():
+        totals, volunteers, categories = await asyncio.gather(
+            VolunteerOpportunity.objects.aaggregate(**_opportunity_totals(today)),
+            Volunteer.objects.acount(),
+            categories(),
+        )
+    return _snapshot(today, totals, volunteers, categories)
+
+
+def get_dashboard_stats():
+    """Return the current stats, rebuilding the cached snapshot if needed."""
+    today = timezone.now().date().isoformat()
+    snapshot, generation = _read()
+    if snapshot is not None and snapshot['as_of'] == today:
+        return _public(snapshot)
+
+    if _acquire_lock():
+        try:
+            return _public(_rebuild(generation))
+        finally:
+            _release_lock()
+
+    if snapshot is not None:
+        # Yesterday's numbers while another worker rolls the snapshot over.
+        return _public(snapshot)
+
+    deadline = time.monotonic() + COLD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(COLD_POLL_INTERVAL)
+        snapshot, _ = _read()
+        if snapshot is not None and snapshot['as_of'] == today:
+            return _public(snapshot)
+    return _public(compute_dashboard_stats())
+
+
+async def aget_dashboard_stats():
+    """Async version of ``get_dashboard_stats()``."""
+    today = timezone.now().date().isoformat()
+    snapshot, generation = await _aread()
+    if snapshot is not None and snapshot['as_of'] == today:
+        return _public(snapshot)
+
+    if await cache.aadd(LOCK_KEY, True, timeout=LOCK_TIMEOUT):
+        try:
+            snapshot = await acompute_dashboard_stats()
+            snapshot['generation'] = generation
+            await cache.aset(SNAPSHOT_KEY, snapshot, timeout=SNAPSHOT_TIMEOUT)
+            return _public(snapshot)
+        finally:
+            await cache.adelete(LOCK_KEY)
+
+    if snapshot is not None:
+        return _public(snapshot)
+
+    deadline = time.monotonic() + COLD_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(COLD_POLL_INTERVAL)
+        snapshot, _ = await _aread()
+        if snapshot is not None and snapshot['as_of'] == today:
+            return _public(snapshot)
+    return _public(await acompute_dashboard_stats())
+
+
+def invalidate_dashboard_stats():
+    """Discard the cached snapshot; the next read rebuilds it."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+    cache.delete(ARCHIVE_KEY)
+
+
+def _archive_queries():
+    categories = ArchivedOpportunity.objects.order_by().values('category_id').annotate(
+        opportunity_count=Count('pk'), volunteer_count=Sum('volunteer_count', default=0),
+    ).values_list('category_id', 'opportunity_count', 'volunteer_count')
+    # Archived volunteers are those no longer in the hot table.
+    volunteers = ArchivedSignup.objects.exclude(
+        volunteer_id__in=Volunteer.objects.values('pk')
+    ).values('volunteer_id').distinct()
+    return categories, volunteers
+
+
+def _archive_totals(categories, volunteers):
+    return {
+        'total_opportunities': sum(row[1] for row in categories),
+        'total_volunteers': volunteers,
+        'categories': {category_id: (opportunities, signups) for category_id, opportunities, signups in categories},
+    }
+
+
+def get_archive_stats():
+    """Totals of the archive tables, cached until the next archive run.
+
+    Computed from the primary for the same reason as the snapshot.
+    """
+    totals = cache.get(ARCHIVE_KEY)
+    if totals is None:
+        with primary_reads():
+            categories, volunteers = _archive_queries()
+            totals = _archive_totals(list(categories), volunteers.count())
+        cache.set(ARCHIVE_KEY, totals, timeout=SNAPSHOT_TIMEOUT)
+    return totals
+
+
+async def aget_archive_stats():
+    """Async version of ``get_archive_stats()``."""
+    totals = await cache.aget(ARCHIVE_KEY)
+    if totals is None:
+        categories, volunteers = _archive_queries()
+
+        async def category_rows():
+            return [row async for row in categories]
+
+        with primary_reads():
+            rows, count = await asyncio.gather(category_rows(), volunteers.acount())
+        totals = _archive_totals(rows, count)
+        await cache.aset(ARCHIVE_KEY, totals, timeout=SNAPSHOT_TIMEOUT)
+    return totals
+
+
+def with_archived(stats, archive):
+    """``stats`` with the archive's opportunities and volunteers added to the totals."""
+    categories = []
+    for category in stats['categories']:
+        opportunities, volunteers = archive['categories'].get(category['id'], (0, 0))
+        categories.append({
+            **category,
+            'opportunity_count': category['opportunity_count'] + opportunities,
+            'volunteer_count': category['volunteer_count'] + volunteers,
+        })
+    return {
+        **stats,
+        'total_opportunities': stats['total_opportunities'] + archive['total_opportunities'],
+        'total_volunteers': stats['total_volunteers'] + archive['total_volunteers'],
+        'categories': categories,
+    }
+
+
+def _read():
+    return _current(cache.get_many([SNAPSHOT_KEY, GENERATION_KEY]))
+
+
+def _current(values):
+    """The snapshot from a cache read, or None if its generation is outdated."""
+    generation = values.get(GENERATION_KEY, 0)
+    snapshot = values.get(SNAPSHOT_KEY)
+    if snapshot is not None and snapshot['generation'] != generation:
+        snapshot = None
+    return snapshot, generation
+
+
+async def _aread():
+    values = await cache.aget_many([SNAPSHOT_KEY, GENERATION_KEY])
+    return _current(values)
+
+
+def _rebuild(generation):
+    snapshot = compute_dashboard_stats()
+    snapshot['generation'] = generation
+    cache.set(SNAPSHOT_KEY, snapshot, timeout=SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _public(snapshot):
+    return {key: value for key, value in snapshot.items() if key not in ('as_of', 'generation')}
+
+
+def _acquire_lock():
+    return cache.add(LOCK_KEY, True, timeout=LOCK_TIMEOUT)
+
+
+def _release_lock():
+    cache.delete(LOCK_KEY)
+
+
+def _patch(apply, using=None):
+    """Apply ``apply(snapshot)`` to the cached snapshot once the transaction commits."""
+    def patch():
+        if not _acquire_lock():
+            invalidate_dashboard_stats()
+            return
+        try:
+            snapshot, _ = _read()
+            if snapshot is None or snapshot['as_of'] != timezone.now().date().isoformat():
+                return
+            if apply(snapshot) is False:
+                invalidate_dashboard_stats()
+                return
+            cache.set(SNAPSHOT_KEY, snapshot, timeout=SNAPSHOT_TIMEOUT)
+        finally:
+            _release_lock()
+
+    transaction.on_commit(patch, using=using)
+
+
+def _add_opportunity(snapshot, date, category_id, sign, volunteers):
+    """Add (``sign=1``) or remove (``sign=-1``) one opportunity; False if unknown category."""
+    for category in snapshot['categories']:
+        if category['id'] == category_id:
+            break
+    else:
+        return False
+    snapshot['total_opportunities'] += sign
+    if date.isoformat() >= snapshot['as_of']:
+        snapshot['upcoming_opportunities'] += sign
+    category['opportunity_count'] += sign
+    category['volunteer_count'] += sign * volunteers
+
+
+@receiver(post_save, sender=VolunteerOpportunity)
+def opportunity_saved(sender, instance, created, using, **kwargs):
+    previous = (getattr(instance, '_loaded_date', None), getattr(instance, '_loaded_category_id', None))
+    current = (instance.date, instance.category_id)
+    instance._loaded_date, instance._loaded_category_id = current
+    if created:
+        _patch(lambda snapshot: _add_opportunity(snapshot, *current, 1, 0), using)
+    elif previous != current:
+        if None in previous:
+            transaction.on_commit(invalidate_dashboard_stats, using=using)
+            return
+        volunteers = instance.volunteer_count
+
+        def move(snapshot):
+            if _add_opportunity(snapshot, *previous, -1, volunteers) is False:
+                return False
+            return _add_opportunity(snapshot, *current, 1, volunteers)
+
+        _patch(move, using)
+
+
+@receiver(post_delete, sender=VolunteerOpportunity)
+def opportunity_deleted(sender, instance, using, **kwargs):
+    volunteers = instance.volunteer_count
+
+    _patch(lambda snapshot: _add_opportunity(snapshot, instance.date, instance.category_id, -1, volunteers), using)
+
+
+@receiver(volunteer_counts_changed)
+def volunteer_counts_updated(sender, deltas, using, **kwargs):
+    categories = dict(
+        VolunteerOpportunity.objects.using(using).filter(pk__in=deltas).values_list('pk', 'category_id')
+    )
+    by_category = {}
+    for opportunity_id, delta in deltas.items():
+        category_id = categories.get(opportunity_id)
+        by_category[category_id] = by_category.get(category_id, 0) + delta
+
+    def apply(snapshot):
+        if None in by_category:
+            return False
+        for category in snapshot['categories']:
+            category['volunteer_count'] += by_category.get(category['id'], 0)
+
+    _patch(apply, using)
+
+
+def _add_volunteers(snapshot, count):
+    snapshot['total_volunteers'] += count
+
+
+@receiver(post_save, sender=Volunteer)
+def volunteer_saved(sender, instance, created, using, **kwargs):
+    if created:
+        _patch(lambda snapshot: _add_volunteers(snapshot, 1), using)
+
+
+@receiver(post_delete, sender=Volunteer)
+def volunteer_deleted(sender, instance, using, **kwargs):
+    _patch(lambda snapshot: _add_volunteers(snapshot, -1), using)
+
+
+@receiver(volunteers_merged)
+def volunteers_merged_receiver(sender, survivors, using, **kwargs):
+    _patch(lambda snapshot: _add_volunteers(snapshot, -len(survivors)), using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(opportunities_bulk_changed)
+@receiver(opportunities_archived)
+@receiver(opportunities_purged)
+@receiver(volunteers_bulk_changed)
+def dashboard_stats_invalidated(sender, using, **kwargs):
+    transaction.on_commit(invalidate_dashboard_stats, using=using)
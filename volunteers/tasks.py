@@ -0,0 +1,275 @@
+"""A small database-backed task queue.
+
+Work the response need not wait for, like a signup confirmation email, is
+queued with ``enqueue`` as a ``Task`` row in the same transaction as the
+write it follows from: the task exists exactly when that write committed,
+and nothing but the database is needed to run it. ``manage.py run_tasks``
+workers run the queued tasks on a thread pool.
+
+A worker claims due tasks with one guarded UPDATE that stamps them with its
+lease and moves their ``available_at`` past the visibility timeout, so two
+workers never claim the same task and the tasks of a worker that dies are
+claimed again once the timeout passes. A task may therefore run more than
+once and must be safe to. A task that raises is retried with exponential
+backoff until it has been tried ``max_attempts`` times, then kept as failed
+for inspection in the admin.
+
+Workers count outcomes and time tasks per task name, served in Prometheus
+text format by ``run_tasks --metrics-port``. The queue depth is read from
+the table, by that endpoint and by the site's ``/metrics/`` view alike.
+"""
+import logging
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .metrics import LATENCY_BUCKETS, Histogram, MetricsRegistry, _escape
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+VISIBILITY_TIMEOUT = getattr(settings, 'TASKS_VISIBILITY_TIMEOUT', 5 * 60)
+DEFAULT_MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubling with every further attempt.
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+# {name: (function, max_attempts)} of the functions decorated with ``@task``.
+handlers = {}
+
+
+def task(max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register the decorated function as a task that ``enqueue`` can queue."""
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__name__}'
+        handlers[func.task_name] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(func, *, delay=0, using='default', **kwargs):
+    """Queue ``func(**kwargs)`` to run in a worker after ``delay`` seconds.
+
+    ``kwargs`` must be JSON-serialisable. Inside a transaction, workers see
+    the task once the transaction commits.
+    """
+    if getattr(func, 'task_name', None) not in handlers:
+        raise ValueError(f'{func!r} is not a task.')
+    now = timezone.now()
+    return Task.objects.using(using).create(
+        name=func.task_name,
+        kwargs=kwargs,
+        max_attempts=handlers[func.task_name][1],
+        available_at=now + timedelta(seconds=delay),
+        created_at=now,
+    )
+
+
+def claim(limit, visibility_timeout=VISIBILITY_TIMEOUT, using='default'):
+    """Lease up to ``limit`` due tasks, oldest first, hiding them from other workers."""
+    now = timezone.now()
+    due = Task.objects.using(using).filter(status=Task.PENDING, available_at__lte=now)
+    ids = list(due.order_by('available_at', 'pk').values_list('pk', flat=True)[:limit])
+    if not ids:
+        return []
+    lease = uuid.uuid4()
+    # Guarded by the same conditions: a task another worker claimed since is
+    # no longer due and is left alone.
+    due.filter(pk__in=ids).update(
+        lease=lease,
+        available_at=now + timedelta(seconds=visibility_timeout),
+        attempts=F('attempts') + 1,
+    )
+    return list(Task.objects.using(using).filter(pk__in=ids, lease=lease).order_by('available_at', 'pk'))
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def run(task, using='default'):
+    """Run a claimed task: delete it if it succeeds, otherwise schedule a retry or mark it failed.
+
+    Returns the outcome: ``'succeeded'``, ``'retried'`` or ``'failed'``.
+    """
+    started = time.perf_counter()
+    if task.attempts == 1:
+        task_metrics.observe_wait(task.name, (timezone.now() - task.created_at).total_seconds())
+    # Only while the lease is ours: past the visibility timeout another
+    # worker may have claimed the task again.
+    leased = Task.objects.using(using).filter(pk=task.pk, lease=task.lease)
+    handler = handlers.get(task.name)
+    try:
+        if handler is None:
+            raise LookupError(f'Unknown task {task.name!r}.')
+        if task.attempts > task.max_attempts:
+            raise RuntimeError(f'Gave up after {task.max_attempts} attempts; the last one did not finish.')
+        handler[0](**task.kwargs)
+    except Exception:
+        failed = handler is None or task.attempts >= task.max_attempts
+        outcome = 'failed' if failed else 'retried'
+        logger.exception('Task %s #%s %s (attempt %d).', task.name, task.pk, outcome, task.attempts)
+        leased.update(
+            status=Task.FAILED if failed else Task.PENDING,
+            lease=None,
+            last_error=traceback.format_exc(),
+            available_at=timezone.now() + timedelta(seconds=retry_delay(task.attempts)),
+        )
+    else:
+        outcome = 'succeeded'
+        leased.delete()
+    task_metrics.record(task.name, outcome, time.perf_counter() - started)
+    return outcome
+
+
+def run_due_tasks(batch_size=100, using='default'):
+    """Run due tasks in this thread until none are left; returns how many ran.
+
+    Tasks retried during the run are not due yet and wait for a worker.
+    """
+    ran = 0
+    while True:
+        tasks = claim(batch_size, using=using)
+        if not tasks:
+            return ran
+        for task in tasks:
+            run(task, using)
+        ran += len(tasks)
+
+
+class Worker:
+    """Claims due tasks and runs them on a pool of ``threads`` threads.
+
+    Only as many tasks are claimed as there are idle threads, so none sits
+    claimed in the pool's queue while its visibility timeout runs out.
+    """
+
+    def __init__(self, threads=4, visibility_timeout=VISIBILITY_TIMEOUT, poll_interval=1.0, using='default'):
+        self.threads = threads
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.using = using
+        self.stopping = threading.Event()
+
+    def run(self, once=False):
+        """Work until ``stop()``, or with ``once`` until no task is due or running.
+
+        Returns a ``Counter`` of the outcomes of the tasks run.
+        """
+        outcomes = Counter()
+        running = set()
+        try:
+            with ThreadPoolExecutor(self.threads, thread_name_prefix='task') as pool:
+                while not self.stopping.is_set():
+                    idle = self.threads - len(running)
+                    tasks = claim(idle, self.visibility_timeout, self.using) if idle else []
+                    running.update(pool.submit(self._run, task) for task in tasks)
+                    if running and (not tasks or len(running) == self.threads):
+                        done, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                        outcomes.update(future.result() for future in done)
+                    elif not tasks:
+                        if once:
+                            break
+                        self.stopping.wait(self.poll_interval)
+                # Leaving the pool waits for the running tasks to finish.
+        finally:
+            outcomes.update(future.result() for future in running if future.done())
+        return outcomes
+
+    def stop(self):
+        self.stopping.set()
+
+    def _run(self, task):
+        # Each pool thread has its own connection; drop it if it is too old or broken.
+        close_old_connections()
+        try:
+            return run(task, self.using)
+        except Exception:
+            # The database went away mid-task; the task is run again once its lease expires.
+            logger.exception('Worker failed to record the outcome of task %s #%s.', task.name, task.pk)
+            return 'lost'
+        finally:
+            close_old_connections()
+
+
+class TaskMetrics:
+    """Thread-safe counts and latency histograms of the tasks run in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.outcomes = {}
+        self.durations = {}
+        self.waits = {}
+
+    def record(self, name, outcome, duration):
+        with self._lock:
+            self.outcomes[name, outcome] = self.outcomes.get((name, outcome), 0) + 1
+            self.durations.setdefault(name, Histogram(LATENCY_BUCKETS)).observe(duration)
+
+    def observe_wait(self, name, seconds):
+        with self._lock:
+            self.waits.setdefault(name, Histogram(WAIT_BUCKETS)).observe(seconds)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            MetricsRegistry._render_counter(
+                lines, 'volunteers_tasks_total', 'Task attempts run, by task and outcome.',
+                ((f'task="{_escape(name)}",outcome="{outcome}"', count)
+                 for (name, outcome), count in sorted(self.outcomes.items())),
+            )
+            MetricsRegistry._render_histogram(
+                lines, 'volunteers_task_duration_seconds', 'Time to run a task attempt, by task.',
+                sorted(self.durations.items()), 'task',
+            )
+            MetricsRegistry._render_histogram(
+                lines, 'volunteers_task_wait_seconds', 'Time from queueing a task to its first attempt, by task.',
+                sorted(self.waits.items()), 'task',
+            )
+        return '\n'.join(lines) + '\n'
+
+
+task_metrics = TaskMetrics()
+
+
+def queue_depth(using='default'):
+    """Tasks by state, and the age in seconds of the oldest due task (0 if none)."""
+    now = timezone.now()
+    pending = Q(status=Task.PENDING)
+    due = pending & Q(available_at__lte=now)
+    counts = Task.objects.using(using).aggregate(
+        due=Count('pk', filter=due),
+        running=Count('pk', filter=pending & Q(available_at__gt=now, lease__isnull=False)),
+        scheduled=Count('pk', filter=pending & Q(available_at__gt=now, lease__isnull=True)),
+        failed=Count('pk', filter=Q(status=Task.FAILED)),
+        oldest=Min('created_at', filter=due),
+    )
+    oldest = counts.pop('oldest')
+    return counts, (now - oldest).total_seconds() if oldest else 0.0
+
+
+def render_queue_depth(using='default'):
+    """The queue depth as Prometheus gauges."""
+    counts, oldest = queue_depth(using)
+    lines = [
+        '# HELP volunteers_tasks Queued tasks by state.',
+        '# TYPE volunteers_tasks gauge',
+        *(f'volunteers_tasks{{state="{state}"}} {count}' for state, count in counts.items()),
+        '# HELP volunteers_task_oldest_due_seconds Age of the oldest task waiting for a worker.',
+        '# TYPE volunteers_task_oldest_due_seconds gauge',
+        f'volunteers_task_oldest_due_seconds {round(oldest, 3)}',
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,75 @@
+"""View benchmarks with query budgets.
+
+Run only the benchmarks with ``python manage.py test --tag benchmark``, or
+skip them with ``--exclude-tag benchmark``. Environment variables:
+
+``BENCHMARK_SIZES``
+    Comma-separated opportunity counts to benchmark, default ``100,1000``.
+``BENCHMARK_REPEATS``
+    Timed requests per endpoint and size, default 20.
+``BENCHMARK_TOLERANCE``
+    Allowed p95 latency growth over the baseline, default 1.0 (100%).
+``BENCHMARK_UPDATE_BASELINE``
+    Set to 1 to rewrite ``benchmark_baseline.json`` from this run.
+"""
+import os
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, tag
+from django.utils import timezone
+
+from . import benchmarks
+from .models import VolunteerOpportunity
+
+
+def env_list(name, default):
+    return [int(value) for value in os.environ.get(name, default).split(',') if value.strip()]
+
+
+@tag('benchmark')
+class ViewBenchmarkTests(TestCase):
+    sizes = env_list('BENCHMARK_SIZES', '100,1000')
+    repeats = int(os.environ.get('BENCHMARK_REPEATS', 20))
+    tolerance = float(os.environ.get('BENCHMARK_TOLERANCE', 1.0))
+    update_baseline = os.environ.get('BENCHMARK_UPDATE_BASELINE') == '1'
+
+    def grow_dataset(self, size):
+        """Add synthetic opportunities until there are ``size`` of them."""
+        missing = size - VolunteerOpportunity.objects.count()
+        if missing > 0:
+            call_command(
+                'seed_data', opportunities=missing, volunteers_per_opportunity=(0, 10),
+                seed=size, batch_size=5000, stdout=StringIO(),
+            )
+        self.upcoming = VolunteerOpportunity.objects.filter(date__gte=timezone.now().date()).first()
+
+    def test_views_within_budget(self):
+        cache.clear()
+        baseline = {} if self.update_baseline else benchmarks.load_baseline()
+        measurements = []
+        failures = []
+        for size in sorted(self.sizes):
+            self.grow_dataset(size)
+            for endpoint in benchmarks.ENDPOINTS:
+                url, data, headers = endpoint.build(self)
+                m = benchmarks.measure(self.client, endpoint, url, data, size, self.repeats, headers)
+                measurements.append(m)
+                if m.status != endpoint.expected_status:
+                    failures.append(f'{m.endpoint} @ {size}: HTTP {m.status}, expected {endpoint.expected_status}')
+                if m.queries > endpoint.max_queries:
+                    failures.append(f'{m.endpoint} @ {size}: {m.queries} queries, budget {endpoint.max_queries}')
+                for problem in benchmarks.regressions(m, baseline, self.tolerance):
+                    failures.append(f'{m.endpoint} @ {size}: regressed, {problem}')
+
+        print('\n' + benchmarks.format_table(measurements))
+        if self.update_baseline:
+            benchmarks.write_baseline(measurements)
+        self.assertEqual(failures, [])
+
+        # Query counts must not depend on the amount of data.
+        by_endpoint = {}
+        for m in measurements:
+            by_endpoint.setdefault(m.endpoint, set()).add(m.queries)
+        self.assertEqual({name: counts for name, counts in by_endpoint.items() if len(counts) > 1}, {})
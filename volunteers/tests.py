@@ -1,3 +1,1461 @@
-from django.test import TestCase
+import csv
+import json
+import random
+import re
+import sqlite3
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archive, autocomplete, benchmarks, duplicates, matching, pagination, rollups, tasks
+from .models import ActivityRollup, ArchivedOpportunity, ArchivedSignup, Category, Signup, Task, VolunteerOpportunity, Volunteer, WaitlistEntry
+from .metrics import MetricsRegistry, registry
+from .pagination import KeysetPaginator
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, _replica_reads, replica_database
+from .search import build_match_expression, search_opportunities
+from .sqlite import current_pragmas
+from .stats import acompute_dashboard_stats, compute_dashboard_stats, get_dashboard_stats
+
+
+class VolunteerTestMixin:
+    """Shared fixtures for the volunteers app tests."""
+
+    def make_opportunity(self, title='Beach Cleanup', days=7, category=None, **kwargs):
+        return VolunteerOpportunity.objects.create(
+            title=title,
+            description=kwargs.pop('description', f'Help out with {title.lower()}.'),
+            date=timezone.now().date() + timedelta(days=days),
+            category=category or Category.objects.get(slug='other'),
+            **kwargs
+        )
+
+    def make_signup(self, opportunity, name='Sarah Johnson', **kwargs):
+        """Create a volunteer and sign them up for ``opportunity``."""
+        volunteer = Volunteer.objects.create(
+            name=name,
+            age=kwargs.pop('age', 30),
+            expertise=kwargs.pop('expertise', 'Organizing community events.'),
+            **kwargs
+        )
+        return Signup.objects.create(volunteer=volunteer, opportunity=opportunity)
+
+
+class VolunteerCountTests(VolunteerTestMixin, TestCase):
+    """The stored volunteer_count follows every kind of Signup and Volunteer write."""
+
+    def setUp(self):
+        self.first = self.make_opportunity('Beach Cleanup')
+        self.second = self.make_opportunity('Food Bank Shift')
+
+    def assertCounts(self, first, second):
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.volunteer_count, self.second.volunteer_count), (first, second))
+
+    def test_create_and_delete(self):
+        signup = self.make_signup(self.first)
+        self.make_signup(self.first, name='Michael Chen')
+        self.assertCounts(2, 0)
+        signup.delete()
+        self.assertCounts(1, 0)
+
+    def test_reassign(self):
+        signup = self.make_signup(self.first)
+        signup = Signup.objects.get(pk=signup.pk)
+        signup.opportunity = self.second
+        signup.save()
+        self.assertCounts(0, 1)
+        signup.save()
+        self.assertCounts(0, 1)
+
+    def test_bulk_operations(self):
+        volunteers = Volunteer.objects.bulk_create([
+            Volunteer(name=f'Volunteer {i}', age=30, expertise='General help') for i in range(5)
+        ])
+        Signup.objects.bulk_create([Signup(volunteer=volunteer, opportunity=self.first) for volunteer in volunteers])
+        self.assertCounts(5, 0)
+        Signup.objects.filter(volunteer__name__in=['Volunteer 0', 'Volunteer 1']).update(opportunity=self.second)
+        self.assertCounts(3, 2)
+        Signup.objects.filter(opportunity=self.first).delete()
+        self.assertCounts(0, 2)
+        Signup.objects.bulk_create(
+            [Signup(volunteer=volunteer, opportunity=self.second) for volunteer in volunteers],
+            ignore_conflicts=True,
+        )
+        self.assertCounts(0, 5)
+
+    def test_deleting_volunteer_removes_their_signups(self):
+        signup = self.make_signup(self.first)
+        Signup.objects.create(volunteer=signup.volunteer, opportunity=self.second)
+        self.make_signup(self.second, name='Michael Chen')
+        self.assertCounts(1, 2)
+        signup.volunteer.delete()
+        self.assertCounts(0, 1)
+        Volunteer.objects.all().delete()
+        self.assertCounts(0, 0)
+
+    def test_recount_command_repairs_drift(self):
+        self.make_signup(self.first)
+        VolunteerOpportunity.objects.filter(pk=self.first.pk).update(volunteer_count=7)
+        out = StringIO()
+        call_command('recount_volunteers', stdout=out)
+        self.assertIn('repaired 1', out.getvalue())
+        self.assertCounts(1, 0)
+
+    def test_opportunity_list_does_not_count_per_row(self):
+        for i in range(10):
+            self.make_signup(self.make_opportunity(f'Opportunity {i}'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('volunteers:opportunity_list'))
+
+
+class VolunteerSignupTests(VolunteerTestMixin, TestCase):
+    """One form submission signs a person up for several opportunities."""
+
+    def setUp(self):
+        self.opportunities = [self.make_opportunity(f'Opportunity {i}') for i in range(3)]
+        self.url = reverse('volunteers:volunteer_signup')
+
+    def signup(self, opportunities, name='Sarah Johnson'):
+        return self.client.post(self.url, {
+            'name': name,
+            'age': 30,
+            'expertise': 'Organizing community events.',
+            'opportunities': [opportunity.pk for opportunity in opportunities],
+        })
+
+    def test_signs_up_for_several_opportunities(self):
+        response = self.signup(self.opportunities[:2])
+        self.assertRedirects(response, reverse('volunteers:dashboard'))
+        volunteer = Volunteer.objects.get()
+        self.assertQuerySetEqual(
+            volunteer.opportunities.order_by('pk'), self.opportunities[:2]
+        )
+        self.assertEqual(
+            [opportunity.volunteer_count for opportunity in VolunteerOpportunity.objects.order_by('pk')], [1, 1, 0]
+        )
+
+    def test_repeat_signup_reuses_volunteer(self):
+        self.signup(self.opportunities[:2])
+        self.signup(self.opportunities[1:])
+        self.signup(self.opportunities[:1], name='Michael Chen')
+        self.assertEqual(Volunteer.objects.count(), 2)
+        self.assertEqual(Signup.objects.count(), 4)
+        self.assertFalse(VolunteerOpportunity.objects.with_stale_volunteer_count().exists())
+
+    def test_list_shows_when_each_signup_was_made(self):
+        self.signup(self.opportunities[:1])
+        Volunteer.objects.update(created_at=timezone.now() - timedelta(days=400))
+        Signup.objects.update(created_at=timezone.now() - timedelta(days=400))
+        self.signup(self.opportunities[1:2])
+        response = self.client.get(reverse('volunteers:volunteer_list'))
+        first_signed_up = timezone.localdate() - timedelta(days=400)
+        self.assertContains(response, f'{first_signed_up:%b %d, %Y}', count=1)
+        self.assertContains(response, f'{timezone.localdate():%b %d, %Y}')
+
+    def test_signup_never_changes_an_email(self):
+        self.client.post(self.url, {
+            'name': 'Sarah Johnson', 'age': 30, 'expertise': 'Organizing community events.',
+            'email': 'sarah@example.com', 'opportunities': [self.opportunities[0].pk],
+        })
+        self.client.post(self.url, {
+            'name': 'Sarah Johnson', 'age': 30, 'expertise': 'Organizing community events.',
+            'email': 'someone@example.com', 'opportunities': [self.opportunities[1].pk],
+        })
+        self.assertQuerySetEqual(
+            Volunteer.objects.order_by('pk').values_list('email', flat=True),
+            ['sarah@example.com', 'someone@example.com'],
+        )
+        self.assertEqual(Volunteer.objects.get(email='sarah@example.com').signups.count(), 1)
+
+    def test_requires_an_opportunity(self):
+        response = self.signup([])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('opportunities', response.context['form'].errors)
+        self.assertFalse(Volunteer.objects.exists())
+
+
+class CapacityTests(VolunteerTestMixin, TestCase):
+    """Signups stop at capacity, the rest wait and move up as places open."""
+
+    def setUp(self):
+        self.opportunity = self.make_opportunity('Beach Cleanup', capacity=2)
+
+    def person(self, name):
+        return Volunteer.objects.create(name=name, age=30, expertise='Events.')
+
+    def claim(self, name, opportunity=None):
+        return Signup.objects.claim(self.person(name), [opportunity or self.opportunity])
+
+    def test_waitlists_when_full(self):
+        # Both claims see the last free place in a stale instance; only one gets it.
+        self.claim('First')
+        stale = VolunteerOpportunity.objects.get()
+        self.assertEqual(len(self.claim('Second', stale)[0]), 1)
+        signups, waitlisted = self.claim('Third', stale)
+        self.assertEqual((signups, len(waitlisted)), ([], 1))
+        opportunity = VolunteerOpportunity.objects.get()
+        self.assertEqual(opportunity.volunteer_count, 2)
+        self.assertTrue(opportunity.is_full)
+        self.assertFalse(VolunteerOpportunity.objects.with_stale_volunteer_count().exists())
+
+    def test_freed_places_go_to_waitlist_in_order(self):
+        first = self.claim('First')[0][0]
+        self.claim('Second')
+        self.claim('Third')
+        self.claim('Fourth')
+        first.delete()
+        self.assertEqual(
+            list(Signup.objects.order_by('volunteer__name').values_list('volunteer__name', flat=True)),
+            ['Second', 'Third'],
+        )
+        Volunteer.objects.get(name='Second').delete()
+        self.assertEqual(list(WaitlistEntry.objects.all()), [])
+        self.assertEqual(VolunteerOpportunity.objects.get().volunteer_count, 2)
+
+    def test_raising_capacity_promotes(self):
+        for name in ('First', 'Second', 'Third', 'Fourth'):
+            self.claim(name)
+        opportunity = VolunteerOpportunity.objects.get()
+        opportunity.capacity = 3
+        opportunity.save()
+        self.assertEqual(VolunteerOpportunity.objects.get().volunteer_count, 3)
+        opportunity.capacity = None
+        opportunity.save()
+        self.assertEqual(VolunteerOpportunity.objects.get().volunteer_count, 4)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_signup_form_reports_waitlist(self):
+        for name in ('First', 'Second'):
+            self.claim(name)
+        other = self.make_opportunity('Food Drive')
+        response = self.client.post(reverse('volunteers:volunteer_signup'), {
+            'name': 'Sarah Johnson', 'age': 30, 'expertise': 'Events.',
+            'opportunities': [self.opportunity.pk, other.pk],
+        }, follow=True)
+        messages = [str(message) for message in response.context['messages']]
+        self.assertIn('signed up for "Food Drive"', messages[0])
+        self.assertIn('"Beach Cleanup" is full', messages[1])
+        self.assertEqual(WaitlistEntry.objects.get().volunteer.name, 'Sarah Johnson')
+
+
+class FragmentCacheTests(VolunteerTestMixin, TestCase):
+    """Opportunity cards are served from the fragment cache until their data changes."""
+
+    def setUp(self):
+        cache.clear()
+        caches['template_fragments'].clear()
+        self.opportunity = self.make_opportunity('Beach Cleanup')
+        self.url = reverse('volunteers:opportunity_list')
+
+    def test_card_cached_until_opportunity_changes(self):
+        self.assertContains(self.client.get(self.url), 'Beach Cleanup')
+        # Same updated_at and count: the cached card is served.
+        VolunteerOpportunity.objects.filter(pk=self.opportunity.pk).update(
+            title='Renamed', updated_at=self.opportunity.updated_at
+        )
+        self.assertContains(self.client.get(self.url), 'Beach Cleanup')
+        self.make_signup(self.opportunity)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Renamed')
+        self.assertContains(response, '1 signed up')
+
+    def test_category_change_invalidates_its_cards(self):
+        self.client.get(self.url)
+        self.client.get(reverse('volunteers:dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            category = self.opportunity.category
+            category.name = 'Miscellaneous'
+            category.save()
+        self.assertContains(self.client.get(self.url), 'Miscellaneous')
+        self.assertContains(self.client.get(reverse('volunteers:dashboard')), 'Miscellaneous', count=2)
+
+
+class QueryPlanTests(VolunteerTestMixin, TestCase):
+    """The main list and lookup queries are served by indexes, not full scans or sorts."""
+
+    FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+    def setUp(self):
+        self.category = Category.objects.get(slug='tutoring')
+        for i in range(30):
+            opportunity = self.make_opportunity(f'Opportunity {i}', days=i - 10, category=self.category)
+            self.make_signup(opportunity, name=f'Volunteer {i}')
+        self.today = timezone.now().date()
+
+    def assertIndexed(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        problems = [step for step in plan if self.FULL_SCAN.match(step) or 'TEMP B-TREE' in step]
+        self.assertEqual(problems, [], f'{sql}\n' + '\n'.join(plan))
+
+    def assertQuerySetIndexed(self, queryset):
+        self.assertIndexed(*queryset.query.sql_with_params())
+
+    def assertPagesIndexed(self, queryset):
+        paginator = KeysetPaginator(queryset, 10)
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.page()
+            paginator.page(page.next_cursor)
+            paginator.page(paginator.page(page.next_cursor).previous_cursor)
+        for query in queries:
+            self.assertIndexed(query['sql'])
+
+    def test_opportunity_queries(self):
+        opportunities = VolunteerOpportunity.objects.select_related('category')
+        self.assertPagesIndexed(opportunities)
+        self.assertPagesIndexed(opportunities.filter(date__gte=self.today))
+        self.assertPagesIndexed(opportunities.filter(category=self.category))
+        self.assertPagesIndexed(opportunities.filter(
+            category=self.category, date__gte=self.today, date__lte=self.today + timedelta(days=10)
+        ))
+        self.assertQuerySetIndexed(opportunities.filter(date__gte=self.today)[:5])
+
+    def test_signup_queries(self):
+        signups = Signup.objects.select_related('volunteer', 'opportunity', 'opportunity__category')
+        self.assertPagesIndexed(signups)
+        self.assertQuerySetIndexed(signups[:5])
+        opportunity = VolunteerOpportunity.objects.first()
+        self.assertQuerySetIndexed(Signup.objects.filter(opportunity__in=[opportunity]).select_related('volunteer'))
+        self.assertQuerySetIndexed(
+            Volunteer.objects.filter(name='Volunteer 1', age=30, expertise='Organizing community events.').order_by('pk')
+        )
+
+
+class OpportunitySearchTests(VolunteerTestMixin, TestCase):
+    """Full-text search stays in sync with writes and ranks title matches first."""
+
+    def search(self, term):
+        return list(search_opportunities(VolunteerOpportunity.objects.all(), term))
+
+    def test_match_expression_uses_prefixes(self):
+        self.assertEqual(build_match_expression('math tut-'), '"math"* "tut"*')
+        self.assertEqual(build_match_expression('--'), '')
+
+    def test_prefix_match_and_ranking(self):
+        in_description = self.make_opportunity('Homework Club', description='Mathematics help for kids.')
+        in_title = self.make_opportunity('Math Tutoring', description='Weekly sessions.')
+        self.make_opportunity('Beach Cleanup')
+        self.assertEqual(self.search('mat'), [in_title, in_description])
+
+    def test_index_follows_updates_and_deletes(self):
+        opportunity = self.make_opportunity('Soup Kitchen', description='Serving hot meals.')
+        VolunteerOpportunity.objects.filter(pk=opportunity.pk).update(title='Food Pantry')
+        self.assertEqual(self.search('soup'), [])
+        self.assertEqual(self.search('pantry'), [opportunity])
+        opportunity.delete()
+        self.assertEqual(self.search('pantry'), [])
+
+    def test_api_uses_search(self):
+        self.make_opportunity('Senior Technology Workshop')
+        self.make_opportunity('Beach Cleanup')
+        response = self.client.get(reverse('volunteers:api_opportunities'), {'search': 'tech work'})
+        titles = [opp['title'] for opp in response.json()['opportunities']]
+        self.assertEqual(titles, ['Senior Technology Workshop'])
+
+    def test_ranked_results_paginate(self):
+        self.make_opportunity('Tech Support', description='Laptops.')
+        self.make_opportunity('Library Hours', description='Tech help desk.')
+        url = reverse('volunteers:api_opportunities')
+        first = self.client.get(url, {'search': 'tech', 'limit': 1}).json()
+        second = self.client.get(url, {'search': 'tech', 'limit': 1, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(first['opportunities'][0]['title'], 'Tech Support')
+        self.assertEqual(second['opportunities'][0]['title'], 'Library Hours')
+        self.assertIsNone(second['next_cursor'])
+
+
+class FacetTests(VolunteerTestMixin, TestCase):
+    """Facet counts follow the other filters; category counts ignore the category filter."""
+
+    def setUp(self):
+        self.tutoring = Category.objects.get(slug='tutoring')
+        self.math = self.make_opportunity('Math Tutoring', days=3, category=self.tutoring)
+        self.reading = self.make_opportunity('Reading Tutoring', days=40, category=self.tutoring)
+        self.make_opportunity('Tutoring Fair', days=3)
+        self.make_opportunity('Beach Cleanup', days=3)
+
+    def facets(self, **params):
+        response = self.client.get(reverse('volunteers:api_opportunities'), {'facets': '1', **params})
+        return response.json()['facets']
+
+    def test_category_counts_ignore_selected_category(self):
+        facets = self.facets(search='tutoring', category=self.tutoring.pk)
+        self.assertEqual(
+            [(row['slug'], row['count']) for row in facets['categories']], [('other', 1), ('tutoring', 2)]
+        )
+        months = {f'{opp.date:%Y-%m}' for opp in (self.math, self.reading)}
+        self.assertEqual(sum(row['count'] for row in facets['months']), 2)
+        self.assertEqual({row['month'] for row in facets['months']}, months)
+
+    def test_facets_only_on_request(self):
+        response = self.client.get(reverse('volunteers:api_opportunities'))
+        self.assertNotIn('facets', response.json())
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('volunteers:opportunity_list'))
+        self.assertIsNone(response.context['facets'])
+
+    def test_list_shows_counts_and_month_links(self):
+        response = self.client.get(reverse('volunteers:opportunity_list'), {'search': 'tutoring', 'facets': '1'})
+        self.assertContains(response, 'Tutoring (2)')
+        self.assertContains(response, 'Other (1)')
+        month = response.context['facets']['months'][0]
+        self.assertIn(f"date_from={month['month'].isoformat()}", month['query'])
+        self.assertIn('facets=1', month['query'])
+
+
+class RecommendationTests(VolunteerTestMixin, TestCase):
+    """Opportunities are ranked by how well they match a volunteer's expertise."""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(matching, 'index', matching.MatchingIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tutoring = self.make_opportunity(
+            'Math Tutoring', description='Tutor students in algebra and geometry after school.'
+        )
+        self.cleanup = self.make_opportunity('Beach Cleanup', description='Collect litter along the shore.')
+        self.make_opportunity('Garden Day', description='Plant vegetables in the community garden.')
+
+    def titles(self, expertise):
+        return [opp.title for opp in matching.recommend(expertise)]
+
+    def test_best_match_first(self):
+        self.assertEqual(self.titles('Retired math teacher, tutored students for years'), ['Math Tutoring'])
+        self.assertEqual(self.titles('gardening and planting')[0], 'Garden Day')
+        self.assertEqual(self.titles('the and of'), [])
+
+    def test_changes_picked_up_after_commit(self):
+        self.assertEqual(self.titles('litter'), ['Beach Cleanup'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_opportunity('Park Litter Pick', description='Pick up litter in the park.')
+            self.cleanup.delete()
+        self.assertEqual(self.titles('litter'), ['Park Litter Pick'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tutoring.date = timezone.now().date() - timedelta(days=1)
+            self.tutoring.save()
+        self.assertEqual(self.titles('math tutoring'), [])
+
+    def test_api(self):
+        url = reverse('volunteers:api_recommendations')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        data = self.client.get(url, {'expertise': 'algebra tutor', 'limit': 1}).json()
+        self.assertEqual([opp['title'] for opp in data['opportunities']], ['Math Tutoring'])
+        self.assertGreater(data['opportunities'][0]['score'], 0)
+
+    def test_signup_page_recommends_for_entered_expertise(self):
+        response = self.client.post(
+            reverse('volunteers:volunteer_signup'),
+            {'name': 'Sam Lee', 'age': 40, 'expertise': 'Algebra tutor'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([opp.title for opp in response.context['recommended']], ['Math Tutoring'])
+        self.assertContains(response, f'data-opportunity="{self.tutoring.pk}"')
+
+
+class MatchingScorerTests(TestCase):
+    """The vectorised scorer ranks like the pure-Python one it replaces when numpy is installed."""
+
+    @skipUnless(matching.numpy is not None, 'numpy is not installed')
+    def test_numpy_ranks_like_python(self):
+        rng = random.Random(5)
+        words = ['tutor', 'math', 'garden', 'beach', 'litter', 'cook', 'food', 'paint', 'read', 'build', 'sort']
+        index = matching.MatchingIndex()
+        today = timezone.now().date()
+        for pk in range(1, 301):
+            title = ' '.join(rng.sample(words, 2))
+            # Every tenth opportunity repeats an earlier one, so scores tie.
+            description = title if pk % 10 == 0 else ' '.join(rng.choices(words, k=rng.randint(1, 8)))
+            index.add(pk, title, description, today + timedelta(days=pk % 30))
+        for pk in range(1, 301, 7):
+            index.discard(pk)
+        for text in ('math tutor', 'beach litter food', 'cook cook paint', 'garden'):
+            for limit, day in ((1, today), (5, today), (40, today + timedelta(days=15)), (500, today)):
+                weights = index.query_weights(text)
+                self.assertEqual(
+                    index._score_numpy(weights, limit, day.toordinal()),
+                    index._score_python(weights, limit, day.toordinal()),
+                    (text, limit),
+                )
+
+
+class AutocompleteTests(VolunteerTestMixin, TestCase):
+    """Suggestions match word prefixes, rank by use and follow writes."""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(autocomplete, 'index', autocomplete.AutocompleteIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(autocomplete, 'MIN_SYNC_INTERVAL', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tutoring = Category.objects.get(slug='tutoring')
+        self.math = self.make_opportunity('Math Tutoring', category=self.tutoring)
+        self.make_opportunity('Math Tutoring', days=14, category=self.tutoring)
+        self.make_opportunity('Reading Tutoring', category=self.tutoring)
+        self.make_opportunity('Old Tutoring Fair', days=-7)
+        self.make_signup(self.math, expertise='Mathematics teacher')
+        self.make_signup(self.math, name='Ann Lee', expertise='Retired math teacher')
+
+    def test_prefix_index(self):
+        prefixes = autocomplete.PrefixIndex()
+        for label in ('Beach Cleanup', 'Beach Cleanup', 'Bake Sale', 'Park Cleanup'):
+            prefixes.add(label)
+        self.assertEqual(prefixes.search(['clean'], 5), [('Beach Cleanup', 2), ('Park Cleanup', 1)])
+        self.assertEqual(prefixes.search(['clean', 'pa'], 5), [('Park Cleanup', 1)])
+        prefixes.remove('Beach Cleanup')
+        prefixes.remove('Beach Cleanup')
+        self.assertEqual(prefixes.search(['b'], 5), [('Bake Sale', 1)])
+        self.assertEqual(prefixes.keys, sorted(prefixes.keys))
+        loaded = autocomplete.PrefixIndex()
+        with loaded.bulk_load():
+            for label in ('Park Cleanup', 'Bake Sale', 'Beach Cleanup', 'Bake Sale'):
+                loaded.add(label)
+            loaded.remove('Bake Sale')
+        self.assertEqual(loaded.keys, sorted(loaded.keys))
+        self.assertEqual(loaded.search(['clean'], 5), [('Beach Cleanup', 1), ('Park Cleanup', 1)])
+        self.assertEqual(loaded.search(['ba'], 5), [('Bake Sale', 1)])
+
+    def test_suggestions(self):
+        suggestions = autocomplete.suggest('tut')
+        self.assertEqual(suggestions['titles'], [
+            {'text': 'Math Tutoring', 'count': 2}, {'text': 'Reading Tutoring', 'count': 1},
+        ])
+        self.assertEqual(suggestions['categories'], [
+            {'id': self.tutoring.pk, 'slug': 'tutoring', 'name': 'Tutoring', 'count': 3},
+        ])
+        self.assertEqual(autocomplete.suggest('te')['expertise'], [{'text': 'teacher', 'count': 2}])
+        # Words used by one volunteer are not suggested.
+        self.assertEqual(autocomplete.suggest('retir')['expertise'], [])
+
+    def test_changes_picked_up_after_commit(self):
+        self.assertEqual(autocomplete.suggest('read')['titles'], [{'text': 'Reading Tutoring', 'count': 1}])
+        with self.captureOnCommitCallbacks(execute=True):
+            VolunteerOpportunity.objects.filter(title='Reading Tutoring').delete()
+            self.make_opportunity('Reading Buddies')
+            self.math.delete()
+            Volunteer.objects.filter(name='Ann Lee').delete()
+        self.assertEqual(autocomplete.suggest('read')['titles'], [{'text': 'Reading Buddies', 'count': 1}])
+        self.assertEqual(autocomplete.suggest('math')['titles'], [{'text': 'Math Tutoring', 'count': 1}])
+        self.assertEqual(autocomplete.suggest('teach')['expertise'], [])
+
+    def test_only_deletes_compare_tables(self):
+        autocomplete.suggest('math')
+        with self.captureOnCommitCallbacks(execute=True):
+            volunteer = self.make_signup(self.math, name='Bo Park', expertise='Chess coach').volunteer
+        with CaptureQueriesContext(connection) as queries:
+            autocomplete.suggest('ches')
+        self.assertIn(volunteer.pk, autocomplete.index.volunteers)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        with self.captureOnCommitCallbacks(execute=True):
+            volunteer.delete()
+        with CaptureQueriesContext(connection) as queries:
+            autocomplete.suggest('ches')
+        self.assertNotIn(volunteer.pk, autocomplete.index.volunteers)
+        self.assertTrue([query for query in queries if 'COUNT(' in query['sql']])
+
+    def test_api(self):
+        url = reverse('volunteers:api_autocomplete')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'math', 'kind': 'people'}).status_code, 400)
+        self.client.get(url, {'q': 'math'})
+        with self.assertNumQueries(0):
+            self.client.get(url, {'q': 'mat'})
+        data = self.client.get(url, {'q': 'math', 'kind': 'titles', 'limit': 1}).json()
+        self.assertEqual(data, {'q': 'math', 'titles': [{'text': 'Math Tutoring', 'count': 2}]})
+
+
+class KeysetPaginationTests(VolunteerTestMixin, TestCase):
+    """Cursors walk the full ordering forwards and backwards without gaps."""
+
+    def setUp(self):
+        # Shared dates force the title and id tie-breakers into play.
+        for i in range(7):
+            self.make_opportunity(f'Opportunity {i % 3}', days=i % 2)
+        self.url = reverse('volunteers:api_opportunities')
+
+    def walk(self, **params):
+        ids, cursors, cursor = [], [], None
+        while True:
+            response = self.client.get(self.url, {'limit': 3, **params, **({'cursor': cursor} if cursor else {})})
+            data = response.json()
+            ids.extend(opp['id'] for opp in data['opportunities'])
+            cursors.append(data['previous_cursor'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids, cursors
+
+    def test_forward_walk_matches_ordering(self):
+        ids, _ = self.walk()
+        expected = list(VolunteerOpportunity.objects.order_by('date', 'title', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        ids, cursors = self.walk()
+        response = self.client.get(self.url, {'limit': 3, 'cursor': cursors[-1]})
+        self.assertEqual([opp['id'] for opp in response.json()['opportunities']], ids[3:6])
+
+    def test_invalid_cursor_and_limit(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'limit': 0}).status_code, 400)
+        response = self.client.get(reverse('volunteers:volunteer_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_volunteer_list_pages(self):
+        opportunity = VolunteerOpportunity.objects.first()
+        for i in range(55):
+            self.make_signup(opportunity, name=f'Volunteer {i}')
+        response = self.client.get(reverse('volunteers:volunteer_list'))
+        self.assertEqual(len(response.context['signups']), 50)
+        response = self.client.get(reverse('volunteers:volunteer_list'), {'cursor': response.context['page'].next_cursor})
+        self.assertEqual(len(response.context['signups']), 5)
+        self.assertTrue(response.context['page'].has_previous)
+
+
+class DashboardStatsTests(VolunteerTestMixin, TestCase):
+    """The cached snapshot is patched by writes and always matches a fresh computation."""
+
+    def setUp(self):
+        cache.clear()
+        self.opportunity = self.make_opportunity('Beach Cleanup')
+        self.past = self.make_opportunity('Food Drive', days=-3, category=Category.objects.get(slug='food-prep'))
+
+    def assertSnapshotCurrent(self):
+        expected = compute_dashboard_stats()
+        del expected['as_of']
+        self.assertEqual(get_dashboard_stats(), expected)
+
+    def test_snapshot_is_served_from_cache(self):
+        get_dashboard_stats()
+        with self.assertNumQueries(0):
+            stats = get_dashboard_stats()
+        self.assertEqual((stats['total_opportunities'], stats['upcoming_opportunities']), (2, 1))
+
+    def test_writes_patch_snapshot_without_queries_on_read(self):
+        get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            signup = self.make_signup(self.opportunity)
+            self.make_signup(self.past, name='Michael Chen')
+        with self.captureOnCommitCallbacks(execute=True):
+            signup.opportunity = self.past
+            signup.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = VolunteerOpportunity.objects.get(pk=self.past.pk)
+            moved.date = timezone.now().date()
+            moved.category = Category.objects.get(slug='sports')
+            moved.save()
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+        self.assertSnapshotCurrent()
+        with self.captureOnCommitCallbacks(execute=True):
+            VolunteerOpportunity.objects.get(pk=self.past.pk).delete()
+        self.assertSnapshotCurrent()
+        with self.captureOnCommitCallbacks(execute=True):
+            signup.volunteer.delete()
+        self.assertSnapshotCurrent()
+
+    def test_bulk_and_category_writes_invalidate(self):
+        get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Animals', slug='animals')
+        self.assertSnapshotCurrent()
+        with self.captureOnCommitCallbacks(execute=True):
+            VolunteerOpportunity.objects.filter(pk=self.opportunity.pk).update(date=self.past.date)
+        self.assertSnapshotCurrent()
+
+    def test_date_rollover_rebuilds(self):
+        get_dashboard_stats()
+        snapshot = cache.get('volunteers:dashboard-stats')
+        snapshot['as_of'] = (timezone.now().date() - timedelta(days=1)).isoformat()
+        snapshot['upcoming_opportunities'] = 99
+        cache.set('volunteers:dashboard-stats', snapshot)
+        self.assertEqual(get_dashboard_stats()['upcoming_opportunities'], 1)
+
+    def test_api_dashboard_stats(self):
+        data = self.client.get(reverse('volunteers:api_dashboard_stats')).json()
+        self.assertEqual(data['total_opportunities'], 2)
+        self.assertEqual(len(data['categories']), Category.objects.count())
+
+
+class ActivityRollupTests(VolunteerTestMixin, TestCase):
+    """The rollup table always matches counting the source tables, at every granularity."""
+
+    def setUp(self):
+        self.sports = Category.objects.get(slug='sports')
+        self.opportunity = self.make_opportunity('Beach Cleanup')
+        self.other = self.make_opportunity('Soccer Coach', days=40, category=self.sports)
+
+    def assertRollupsCurrent(self):
+        self.assertEqual(rollups.stored(), rollups.counted())
+        for granularity in (ActivityRollup.WEEK, ActivityRollup.MONTH):
+            expected = {}
+            for (category_id, day), (signups, opportunities) in rollups.counted().items():
+                key = (category_id, rollups.period_start(day, granularity))
+                total = expected.get(key, (0, 0))
+                expected[key] = (total[0] + signups, total[1] + opportunities)
+            stored = {
+                (row.category_id, row.period): (row.signups, row.opportunities)
+                for row in ActivityRollup.objects.filter(granularity=granularity)
+                if row.signups or row.opportunities
+            }
+            self.assertEqual(stored, expected)
+
+    def test_maintained_by_every_write_path(self):
+        signup = self.make_signup(self.opportunity)
+        self.make_signup(self.other, name='Michael Chen')
+        Signup.objects.bulk_create([
+            Signup(volunteer=Volunteer.objects.create(name=f'Bulk {i}', age=30, expertise='Events.'),
+                   opportunity=self.opportunity)
+            for i in range(3)
+        ])
+        self.assertRollupsCurrent()
+        signup.opportunity = self.other
+        signup.save()
+        Signup.objects.filter(volunteer__name='Bulk 0').update(opportunity=self.other)
+        self.assertRollupsCurrent()
+        self.other.category = Category.objects.get(slug='tutoring')
+        self.other.date += timedelta(days=60)
+        self.other.save()
+        self.assertRollupsCurrent()
+        Volunteer.objects.filter(name='Bulk 1').delete()
+        Signup.objects.filter(volunteer__name='Bulk 2').delete()
+        signup.delete()
+        self.assertRollupsCurrent()
+        self.other.delete()
+        Category.objects.get(slug='other').delete()
+        self.assertRollupsCurrent()
+        self.assertFalse(ActivityRollup.objects.exclude(signups=0, opportunities=0).exists())
+
+    def test_conflict_skipping_inserts_are_counted(self):
+        self.make_signup(self.opportunity)
+        Signup.objects.bulk_create(
+            [Signup(volunteer=Volunteer.objects.get(), opportunity=self.opportunity)]
+            + [Signup(volunteer=Volunteer.objects.create(name='New', age=30, expertise='Events.'),
+                      opportunity=self.other)],
+            ignore_conflicts=True,
+        )
+        self.assertRollupsCurrent()
+        self.assertFalse(Task.objects.exists())
+
+    def test_queryset_updates_rebuild_their_categories_in_a_task(self):
+        self.make_signup(self.other)
+        tutoring = Category.objects.get(slug='tutoring')
+        untouched = ActivityRollup.objects.create(
+            granularity=ActivityRollup.DAY, period=timezone.now().date(), category=tutoring, signups=7
+        )
+        VolunteerOpportunity.objects.filter(pk=self.other.pk).update(category=self.opportunity.category)
+        [queued] = tasks.claim(10)
+        self.assertEqual(
+            queued.kwargs, {'category_ids': sorted([self.sports.pk, self.opportunity.category_id])}
+        )
+        self.assertEqual(tasks.run(queued), 'succeeded')
+        self.assertEqual(ActivityRollup.objects.get(pk=untouched.pk).signups, 7)
+        untouched.delete()
+        self.assertRollupsCurrent()
+
+    def test_backfill_command(self):
+        self.make_signup(self.opportunity)
+        ActivityRollup.objects.all().delete()
+        out = StringIO()
+        call_command('backfill_rollups', '--check', stdout=out)
+        self.assertIn('3 days have stale rollups', out.getvalue())
+        call_command('backfill_rollups', stdout=StringIO())
+        self.assertRollupsCurrent()
+
+    def test_api(self):
+        self.make_signup(self.opportunity)
+        self.make_signup(self.other, name='Michael Chen')
+        today = timezone.now().date()
+        url = reverse('volunteers:api_activity')
+        data = self.client.get(url, {'granularity': 'month', 'end': today + timedelta(days=60)}).json()
+        self.assertEqual(len(data['periods']), 12)
+        self.assertEqual(data['periods'][-1], rollups.period_start(today + timedelta(days=60), 'month').isoformat())
+        self.assertEqual(sum(data['totals']['signups']), 2)
+        self.assertEqual(sum(data['totals']['opportunities']), 2)
+        sports = next(series for series in data['series'] if series['category']['slug'] == 'sports')
+        self.assertEqual(sum(sports['opportunities']), 1)
+
+        data = self.client.get(url, {'category': self.sports.pk}).json()
+        self.assertEqual((len(data['periods']), len(data['series'])), (30, 1))
+        self.assertEqual(data['series'][0]['signups'][-1], 1)
+        with self.assertNumQueries(2):
+            self.client.get(url, {'granularity': 'week'})
+        for params in ({'granularity': 'year'}, {'start': today, 'end': today - timedelta(days=1)},
+                       {'start': '2000-01-01', 'end': '2010-01-01'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class ArchiveTests(VolunteerTestMixin, TestCase):
+    """Past opportunities move to the archive in batches and stay reachable."""
+
+    def setUp(self):
+        cache.clear()
+        self.past = self.make_opportunity('Food Drive', days=-40)
+        self.recent = self.make_opportunity('Park Cleanup', days=-3)
+        self.upcoming = self.make_opportunity('Beach Cleanup')
+        self.make_signup(self.past, name='Only Past', email='past@example.com')
+        regular = self.make_signup(self.past, name='Regular').volunteer
+        Signup.objects.create(volunteer=regular, opportunity=self.upcoming)
+        WaitlistEntry.objects.create(volunteer=Volunteer.objects.create(name='Waiting', age=30), opportunity=self.past)
+
+    def archive(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_opportunities', *args, stdout=out)
+        return out.getvalue()
+
+    def test_moves_past_opportunities_and_their_volunteers(self):
+        before = rollups.stored()
+        self.assertIn('Archived 1 opportunities, 2 signups and 2 volunteers', self.archive('--batch-size', '1'))
+        self.assertEqual(list(VolunteerOpportunity.objects.order_by('pk')), [self.recent, self.upcoming])
+        self.assertEqual(list(Volunteer.objects.values_list('name', flat=True)), ['Regular'])
+        self.assertEqual(WaitlistEntry.objects.count(), 0)
+        archived = ArchivedOpportunity.objects.get()
+        self.assertEqual((archived.pk, archived.title, archived.volunteer_count), (self.past.pk, 'Food Drive', 2))
+        self.assertEqual(
+            sorted(ArchivedSignup.objects.values_list('volunteer_name', 'volunteer_email')),
+            [('Only Past', 'past@example.com'), ('Regular', '')],
+        )
+        # History is kept: the rollups neither change nor drift from a rebuild.
+        self.assertEqual(rollups.stored(), before)
+        self.assertEqual(rollups.counted(), before)
+        self.assertIn('Archived 0 opportunities', self.archive())
+
+    def test_repeated_batch_is_harmless(self):
+        self.archive('--keep-days', '0')
+        self.assertEqual(ArchivedOpportunity.objects.count(), 2)
+        # As if the copy had committed but not the delete.
+        ArchivedOpportunity.objects.filter(pk=self.recent.pk).update(title='Stale copy')
+        self.assertEqual(archive.archive_batch(archive.archive_cutoff(0)), (0, 0, 0))
+        self.assertEqual(ArchivedSignup.objects.count(), 2)
+
+    def test_detail_and_dashboard_include_archive(self):
+        self.archive()
+        response = self.client.get(reverse('volunteers:opportunity_detail', args=[self.past.pk]))
+        self.assertContains(response, 'Archived')
+        self.assertContains(response, 'Only Past')
+        self.assertNotContains(response, reverse('volunteers:opportunity_edit', args=[self.past.pk]))
+
+        url = reverse('volunteers:dashboard')
+        hot = self.client.get(url).context
+        with_archive = self.client.get(url, {'archived': '1'}).context
+        self.assertEqual((hot['total_opportunities'], hot['total_volunteers']), (2, 1))
+        self.assertEqual((with_archive['total_opportunities'], with_archive['total_volunteers']), (3, 2))
+        other = next(category for category in with_archive['categories'] if category['slug'] == 'other')
+        self.assertEqual((other['opportunity_count'], other['volunteer_count']), (3, 3))
+
+
+class DuplicateVolunteerTests(VolunteerTestMixin, TestCase):
+    """Look-alike volunteers are grouped by blocking keys and merged into the oldest one."""
+
+    def setUp(self):
+        cache.clear()
+        self.beach = self.make_opportunity('Beach Cleanup')
+        self.garden = self.make_opportunity('Garden Day', capacity=2)
+        expertise = 'Organizing community cleanup events.'
+        self.sarah = self.make_signup(self.beach, expertise=expertise).volunteer
+        self.repeat = self.make_signup(self.beach, name='sarah  JOHNSON', age=31, expertise=expertise).volunteer
+        self.typo = self.make_signup(
+            self.garden, name='Sarah Jonhson', expertise='Organized community cleanups and events.'
+        ).volunteer
+        self.other = self.make_signup(self.garden, name='Mark Lee').volunteer
+        # Same name, but a different person by age and expertise.
+        self.namesake = Volunteer.objects.create(name='Sarah Johnson', age=58, expertise='Retired nurse.')
+        WaitlistEntry.objects.create(volunteer=self.namesake, opportunity=self.garden)
+        WaitlistEntry.objects.create(volunteer=self.repeat, opportunity=self.garden)
+
+    def test_finds_clusters(self):
+        self.assertEqual(duplicates.normalize_name('Johnson, Sárah'), 'johnson sarah')
+        self.assertTrue(
+            duplicates.blocking_keys('Sarah Johnson') & duplicates.blocking_keys('sarah  JOHNSON')
+        )
+        clusters, skipped = duplicates.find_duplicates()
+        self.assertEqual(clusters, [[self.sarah.pk, self.repeat.pk, self.typo.pk]])
+        self.assertEqual(skipped, 0)
+
+    def test_merge(self):
+        before = rollups.stored()
+        clusters, _ = duplicates.find_duplicates()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(duplicates.merge_batch(clusters), (2, 1, 1))
+        self.assertFalse(Volunteer.objects.filter(pk__in=[self.repeat.pk, self.typo.pk]).exists())
+        self.assertEqual(
+            sorted(self.sarah.signups.values_list('opportunity__title', flat=True)), ['Beach Cleanup', 'Garden Day']
+        )
+        # Already signed up for the garden day, so the waitlist entry went.
+        self.assertFalse(WaitlistEntry.objects.filter(volunteer=self.sarah).exists())
+        self.beach.refresh_from_db()
+        self.garden.refresh_from_db()
+        self.assertEqual((self.beach.volunteer_count, self.garden.volunteer_count), (1, 2))
+        # The place freed on the beach cleanup does not affect the full garden day's waitlist.
+        self.assertEqual(list(self.garden.waitlist.values_list('volunteer', flat=True)), [self.namesake.pk])
+        key = (self.beach.category_id, timezone.localdate())
+        self.assertEqual(rollups.stored()[key][0], before[key][0] - 1)
+        self.assertEqual(rollups.stored(), rollups.counted())
+        self.assertEqual(get_dashboard_stats()['total_volunteers'], 3)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('merge_duplicate_volunteers', '--dry-run', stdout=out)
+        self.assertIn('Found 1 groups of duplicates, 2 volunteers to merge', out.getvalue())
+        self.assertIn(f'Sarah Jonhson (#{self.typo.pk})', out.getvalue())
+        self.assertEqual(Volunteer.objects.count(), 5)
+        call_command('merge_duplicate_volunteers', stdout=out)
+        self.assertIn('Merged 2 volunteers into 1', out.getvalue())
+        self.assertEqual(Volunteer.objects.count(), 3)
+
+
+class PurgeTests(VolunteerTestMixin, TestCase):
+    """Opportunities are deleted with set-based statements, keeping counts and rollups right."""
+
+    def setUp(self):
+        cache.clear()
+        self.old = self.make_opportunity('Food Drive', days=-40)
+        self.kept = self.make_opportunity('Beach Cleanup')
+        self.make_signup(self.old, name='Only Old')
+        regular = self.make_signup(self.old, name='Regular').volunteer
+        Signup.objects.create(volunteer=regular, opportunity=self.kept)
+        WaitlistEntry.objects.create(volunteer=Volunteer.objects.create(name='Waiting', age=30), opportunity=self.old)
+
+    def purge(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_opportunities', *args, stdout=out)
+        return out.getvalue()
+
+    def assertPurged(self):
+        self.assertEqual(list(VolunteerOpportunity.objects.all()), [self.kept])
+        self.assertEqual(list(Volunteer.objects.values_list('name', flat=True)), ['Regular'])
+        self.assertEqual(WaitlistEntry.objects.count(), 0)
+        self.kept.refresh_from_db()
+        self.assertEqual(self.kept.volunteer_count, 1)
+        self.assertEqual(rollups.stored(), rollups.counted())
+        self.assertEqual(search_opportunities(VolunteerOpportunity.objects.all(), 'food').count(), 0)
+
+    def test_command(self):
+        self.assertIn(
+            '1 opportunities would be deleted, with 2 signups and 2 volunteers left without any',
+            self.purge('--before', str(timezone.now().date()), '--dry-run'),
+        )
+        with self.assertRaises(CommandError):
+            call_command('purge_opportunities', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('purge_opportunities', '--category', 'nope', stdout=StringIO())
+        self.assertIn('Deleted 0 opportunities', self.purge('--category', 'tutoring'))
+        output = self.purge('--before', str(timezone.now().date()), '--category', 'other', '--batch-size', '1')
+        self.assertIn('Deleted 1 opportunities, 2 signups and 2 volunteers', output)
+        self.assertIn('rows/sec', output)
+        self.assertPurged()
+        self.assertEqual(get_dashboard_stats()['total_volunteers'], 1)
+
+    def test_more_volunteers_than_sql_variables(self):
+        volunteers = Volunteer.objects.bulk_create(
+            Volunteer(name=f'Volunteer {i}', age=30, expertise='Sorting') for i in range(250)
+        )
+        Signup.objects.bulk_create(Signup(volunteer=volunteer, opportunity=self.old) for volunteer in volunteers)
+        # Far fewer than the volunteers the purge deletes.
+        sqlite = connection.connection
+        limit = sqlite.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 100)
+        self.addCleanup(sqlite.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+        output = self.purge('--before', str(timezone.now().date()))
+        self.assertIn('Deleted 1 opportunities, 252 signups and 252 volunteers', output)
+        self.assertPurged()
+
+    def test_delete_view(self):
+        response = self.client.get(reverse('volunteers:opportunity_delete', args=[self.old.pk]))
+        self.assertEqual(response.context['orphaned_volunteers'], 2)
+        self.assertContains(response, 'volunteers with no other signups')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('volunteers:opportunity_delete', args=[self.old.pk]))
+        self.assertRedirects(response, reverse('volunteers:opportunity_list'))
+        self.assertPurged()
+
+    def test_admin_delete_action(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:volunteers_volunteeropportunity_changelist')
+        data = {'action': 'delete_selected', '_selected_action': [self.old.pk]}
+        response = self.client.post(url, data)
+        self.assertContains(response, 'Signups: 2')
+        self.assertContains(response, 'Volunteers: 2')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {**data, 'post': 'yes'}, follow=True)
+        self.assertContains(response, 'Deleted 1 opportunities, 2 signups and 2 volunteers')
+        self.assertPurged()
+
+
+class AdminScaleTests(VolunteerTestMixin, TestCase):
+    """Admin changelists count, search and delete without visiting every row."""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.beach = self.make_opportunity('Beach Cleanup', capacity=2)
+        self.sarah = self.make_signup(self.beach, email='sarah@example.com').volunteer
+        self.michael = self.make_signup(self.beach, name='Michael Chen').volunteer
+        self.waiting = Volunteer.objects.create(name='Priya Patel', age=30, expertise='Tutoring')
+        WaitlistEntry.objects.create(volunteer=self.waiting, opportunity=self.beach)
+
+    def changelist(self, model, **params):
+        return self.client.get(reverse(f'admin:volunteers_{model}_changelist'), params)
+
+    def test_search_uses_prefixes_and_indexes(self):
+        response = self.changelist('volunteer', q='sar')
+        self.assertContains(response, 'Sarah Johnson')
+        self.assertNotContains(response, 'Michael Chen')
+        self.assertContains(self.changelist('volunteer', q='SARAH@example.com'), 'Sarah Johnson')
+        self.assertNotContains(self.changelist('volunteer', q='johnson'), 'Sarah Johnson')
+        self.assertContains(self.changelist('signup', q='michael'), 'Michael Chen - Beach Cleanup')
+        self.assertContains(self.changelist('signup', q='beach'), '2 signups')
+        self.assertContains(self.changelist('volunteeropportunity', q='clean'), 'Beach Cleanup')
+        self.assertContains(self.changelist('waitlistentry', q='beach'), 'Priya Patel')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE '%nocase%'")
+            self.assertEqual(len(cursor.fetchall()), 2)
+
+    def test_annotated_columns(self):
+        with self.assertNumQueries(4):
+            response = self.changelist('volunteer')
+        self.assertContains(response, '<td class="field-signup_count">1</td>', count=2, html=True)
+        self.assertContains(response, '<td class="field-signup_count">0</td>', html=True)
+        self.assertContains(self.changelist('category', o='3'), '<td class="field-opportunity_count">1</td>', html=True)
+
+    def test_counts_stop_at_the_limit(self):
+        self.assertContains(self.changelist('volunteer'), '3 volunteers')
+        with mock.patch.object(pagination, 'EXACT_COUNT_LIMIT', 2):
+            self.assertContains(self.changelist('volunteer'), 'about 3 volunteers')
+            self.assertContains(self.changelist('volunteer', age='30'), '2+ volunteers')
+
+    def test_bulk_delete_volunteers(self):
+        url = reverse('admin:volunteers_volunteer_changelist')
+        data = {'action': 'delete_selected', '_selected_action': [self.sarah.pk]}
+        self.assertContains(self.client.post(url, data), 'Signups: 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {**data, 'post': 'yes'}, follow=True)
+        self.assertContains(response, 'Deleted 1 volunteers and 1 signups')
+        self.assertFalse(Volunteer.objects.filter(pk=self.sarah.pk).exists())
+        # The freed place went to the waitlist.
+        self.beach.refresh_from_db()
+        self.assertEqual(self.beach.volunteer_count, 2)
+        self.assertTrue(Signup.objects.filter(volunteer=self.waiting).exists())
+        self.assertEqual(rollups.stored(), rollups.counted())
+        self.assertEqual(get_dashboard_stats()['total_volunteers'], 2)
+
+    def test_recount_action(self):
+        VolunteerOpportunity.objects.filter(pk=self.beach.pk).update(volunteer_count=7)
+        self.client.post(
+            reverse('admin:volunteers_volunteeropportunity_changelist'),
+            {'action': 'recount_volunteers', '_selected_action': [self.beach.pk]},
+        )
+        self.beach.refresh_from_db()
+        self.assertEqual(self.beach.volunteer_count, 2)
+
+
+class TaskQueueTests(VolunteerTestMixin, TestCase):
+    """Queued tasks are leased, run, retried with backoff and given up on."""
+
+    def setUp(self):
+        tasks.task_metrics.reset()
+        self.calls = []
+
+    def flaky(self, fail):
+        @tasks.task(max_attempts=2)
+        def flaky_task(n):
+            self.calls.append(n)
+            if fail:
+                raise ValueError('Broken')
+        return flaky_task
+
+    def test_signup_queues_confirmation(self):
+        full = self.make_opportunity('Food Drive', capacity=1)
+        self.make_signup(full)
+        beach = self.make_opportunity('Beach Cleanup')
+        post = {'name': 'Maria Garcia', 'age': 34, 'expertise': 'Cooking', 'opportunities': [beach.pk, full.pk]}
+        self.client.post(reverse('volunteers:volunteer_signup'), post)
+        self.assertFalse(Task.objects.exists())
+        self.client.post(reverse('volunteers:volunteer_signup'), {**post, 'email': 'maria@example.com'})
+        self.assertEqual(Task.objects.count(), 1)
+        self.client.post(reverse('volunteers:volunteer_signup'), {**post, 'email': 'Maria@example.com'})
+        self.assertEqual(Task.objects.count(), 1)  # Already signed up for both.
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(tasks.run_due_tasks(), 1)
+        self.assertFalse(Task.objects.exists())
+        [email] = mail.outbox
+        self.assertEqual(email.to, ['maria@example.com'])
+        self.assertEqual(email.subject, 'You are signed up: Beach Cleanup')
+        self.assertIn('waitlist:\n\n  - Food Drive', email.body)
+        self.assertIn('volunteers_task_wait_seconds_count{task="volunteers.emails.send_signup_confirmation"} 1',
+                      tasks.task_metrics.render())
+
+    def test_retry_then_fail(self):
+        task = tasks.enqueue(self.flaky(fail=True), n=1)
+        with self.assertLogs('volunteers.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_due_tasks(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts, task.lease), (Task.PENDING, 1, None))
+        self.assertIn('ValueError: Broken', task.last_error)
+        self.assertGreater(task.available_at, timezone.now() + timedelta(seconds=tasks.RETRY_DELAY - 5))
+        self.assertEqual(tasks.run_due_tasks(), 0)
+
+        Task.objects.update(available_at=timezone.now())
+        with self.assertLogs('volunteers.tasks', 'ERROR'):
+            tasks.run_due_tasks()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertEqual(self.calls, [1, 1])
+        self.assertEqual(tasks.queue_depth()[0], {'due': 0, 'running': 0, 'scheduled': 0, 'failed': 1})
+
+    def test_visibility_timeout(self):
+        tasks.enqueue(self.flaky(fail=False), n=1)
+        tasks.enqueue(self.flaky(fail=False), n=2, delay=60)
+        [stale] = tasks.claim(10, visibility_timeout=30)
+        self.assertEqual(tasks.claim(10), [])
+        self.assertEqual(tasks.queue_depth()[0], {'due': 0, 'running': 1, 'scheduled': 1, 'failed': 0})
+
+        # The first worker takes too long and its task is claimed again.
+        Task.objects.filter(pk=stale.pk).update(available_at=timezone.now())
+        [again] = tasks.claim(10)
+        self.assertEqual(again.attempts, 2)
+        self.assertEqual(tasks.run(stale), 'succeeded')
+        self.assertTrue(Task.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(tasks.run(again), 'succeeded')
+        self.assertFalse(Task.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_metrics_endpoint_reports_queue_depth(self):
+        tasks.enqueue(self.flaky(fail=False), n=1)
+        body = self.client.get(reverse('volunteers:metrics')).content.decode()
+        self.assertIn('volunteers_tasks{state="due"} 1', body)
+        self.assertIn('volunteers_task_oldest_due_seconds', body)
+
+    def test_enqueue_requires_a_task(self):
+        with self.assertRaises(ValueError):
+            tasks.enqueue(print, n=1)
+
+
+class TaskWorkerTests(TransactionTestCase):
+    """The worker command runs tasks on its thread pool, each thread with its own connection."""
+
+    def test_run_tasks_once(self):
+        done = []
+
+        @tasks.task()
+        def record(n):
+            done.append(n)
+
+        for n in range(10):
+            tasks.enqueue(record, n=n)
+        out = StringIO()
+        call_command('run_tasks', '--once', '--threads', '3', '--poll-interval', '0.01', stdout=out)
+        self.assertEqual(sorted(done), list(range(10)))
+        self.assertFalse(Task.objects.exists())
+        self.assertIn('Ran 10 tasks (10 succeeded, 0 to retry, 0 failed)', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('run_tasks', '--threads', '0', stdout=StringIO())
+
+
+class SignupRushTests(TransactionTestCase):
+    """Concurrent signups for a nearly full opportunity never overfill it."""
+
+    def test_capacity_holds_under_concurrency(self):
+        Category.objects.get_or_create(slug='other', defaults={'name': 'Other'})
+        result = benchmarks.signup_rush(attempts=24, concurrency=6, capacity=5)
+        self.assertEqual((result.signed_up, result.overfilled, result.errors), (5, 0, 0))
+        self.assertEqual(result.waitlisted, 19)
+
+
+class OpportunityExportTests(VolunteerTestMixin, TestCase):
+    """Streaming exports honour the API filters and run a constant number of queries."""
+
+    def setUp(self):
+        for i in range(5):
+            opportunity = self.make_opportunity(f'Tutoring Session {i}', category=Category.objects.get(slug='tutoring'))
+            self.make_signup(opportunity)
+        self.make_opportunity('Beach Cleanup')
+        self.url = reverse('volunteers:api_opportunities')
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        category = Category.objects.get(slug='tutoring')
+        with self.assertNumQueries(4):
+            lines = self.export(format='ndjson', category=category.pk).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['category']['slug'], 'tutoring')
+        self.assertEqual(rows[0]['volunteer_count'], 1)
+
+    def test_csv(self):
+        rows = list(csv.reader(StringIO(self.export(format='csv', search='beach'))))
+        self.assertEqual(rows[0][:2], ['id', 'title'])
+        self.assertEqual([row[1] for row in rows[1:]], ['Beach Cleanup'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url, {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': 'soon'}).status_code, 400)
+
+
+class SeedDataTests(TestCase):
+    """Synthetic generation is deterministic and keeps stored counts correct."""
+
+    def seed(self, **options):
+        call_command('seed_data', opportunities=30, volunteers_per_opportunity=(0, 4), batch_size=7,
+                     stdout=StringIO(), **options)
+        return list(VolunteerOpportunity.objects.order_by('pk').values_list('title', 'date', 'volunteer_count'))
+
+    def test_same_seed_same_data(self):
+        first = self.seed(seed=7)
+        VolunteerOpportunity.objects.all().delete()
+        self.assertEqual(self.seed(seed=7), first)
+        self.assertFalse(VolunteerOpportunity.objects.with_stale_volunteer_count().exists())
+        self.assertEqual(sum(count for _, _, count in first), Signup.objects.count())
+
+
+class MetricsTests(VolunteerTestMixin, TestCase):
+    """The middleware records per-view metrics and the endpoint renders them."""
+
+    def setUp(self):
+        registry.reset()
+
+    def test_metrics_endpoint(self):
+        self.make_opportunity('Beach Cleanup')
+        self.client.get(reverse('volunteers:api_opportunities'))
+        self.client.get(reverse('volunteers:api_opportunities'))
+        response = self.client.get(reverse('volunteers:metrics'))
+        body = response.content.decode()
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('volunteers_requests_total{view="volunteers:api_opportunities",status="200"} 2', body)
+        self.assertIn('volunteers_sql_queries_bucket{view="volunteers:api_opportunities",le="5"} 2', body)
+        self.assertIn('volunteers_request_duration_seconds_count{view="volunteers:api_opportunities"} 2', body)
+
+    def test_slow_queries_keep_the_slowest(self):
+        slow = MetricsRegistry(slow_query_limit=2)
+        with self.assertLogs('volunteers.metrics', 'WARNING'):
+            slow.record('view', 0.1, 200, 10, [(0.01, 'a'), (0.03, 'b'), (0.02, 'c'), (0.001, 'd')])
+        self.assertEqual([sql for _, _, sql in slow.slow_queries()], ['b', 'c'])
+
+    def test_fast_queries_are_not_slow(self):
+        slow = MetricsRegistry(slow_query_limit=5, slow_query_ms=15)
+        with self.assertLogs('volunteers.metrics', 'WARNING') as logs:
+            slow.record('view', 0.1, 200, 10, [(0.01, 'a'), (0.03, 'b'), (0.0, 'PRAGMA'), (0.02, 'c')])
+        self.assertEqual([sql for _, _, sql in slow.slow_queries()], ['b', 'c'])
+        self.assertEqual(len(logs.records), 2)
+
+
+class SQLiteProfileTests(TestCase):
+    """New SQLite connections run the configured PRAGMAs."""
+
+    def new_connection(self):
+        new = connections.create_connection('default')
+        self.addCleanup(new.close)
+        return new
+
+    def test_pragmas_applied_on_connect(self):
+        # The in-memory test database cannot use WAL, so journal_mode is not checked.
+        pragmas = current_pragmas(self.new_connection())
+        self.assertEqual(pragmas['synchronous'], 1)
+        self.assertEqual(pragmas['busy_timeout'], 5000)
+        self.assertEqual(pragmas['cache_size'], -64000)
+        self.assertEqual(pragmas['temp_store'], 2)
+
+    @override_settings(SQLITE_PRAGMAS={'synchronous': 'off', 'cache_size': None})
+    def test_none_keeps_sqlite_default(self):
+        self.assertEqual(current_pragmas(self.new_connection()), {'synchronous': 0})
+
+
+class ReplicaRoutingTests(VolunteerTestMixin, TestCase):
+    """Read-only views read from the replica unless the client just wrote."""
+
+    def setUp(self):
+        self.opportunity = self.make_opportunity('Beach Cleanup')
+
+    def record_routing(self):
+        """Patch the router to note, per read, whether it was asked for the replica."""
+        reads = []
+
+        def db_for_read(router, model, **hints):
+            reads.append(_replica_reads.get())
+            return 'default'
+
+        patcher = mock.patch.object(PrimaryReplicaRouter, 'db_for_read', autospec=True, side_effect=db_for_read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return reads
+
+    def test_read_only_views_use_replica(self):
+        reads = self.record_routing()
+        for name in ('dashboard', 'opportunity_list', 'volunteer_list', 'api_opportunities'):
+            self.client.get(reverse(f'volunteers:{name}'))
+            self.assertTrue(reads and all(reads), name)
+            reads.clear()
+        self.client.get(reverse('volunteers:opportunity_edit', args=[self.opportunity.pk]))
+        self.assertTrue(reads and not any(reads))
+
+    def test_post_pins_client_to_primary(self):
+        reads = self.record_routing()
+        response = self.client.post(reverse('volunteers:volunteer_signup'), {
+            'name': 'Sarah Johnson', 'age': 30, 'expertise': 'Events.', 'opportunities': [self.opportunity.pk],
+        })
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+        reads.clear()
+        self.client.get(reverse('volunteers:dashboard'))
+        self.assertTrue(reads and not any(reads))
+
+    async def test_async_views_use_replica(self):
+        reads = self.record_routing()
+        with override_settings(ROOT_URLCONF='volunteer_ai.urls_async'):
+            await self.async_client.get(reverse('volunteers:opportunity_list'))
+        self.assertTrue(reads and all(reads))
+
+    def test_reads_use_primary_without_replica(self):
+        databases = []
+        read = PrimaryReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            databases.append(read(router, model, **hints))
+            return databases[-1]
+
+        with override_settings(REPLICA_DATABASE=None), mock.patch.object(
+            PrimaryReplicaRouter, 'db_for_read', autospec=True, side_effect=db_for_read
+        ):
+            for name in ('dashboard', 'opportunity_list', 'volunteer_list', 'api_opportunities'):
+                self.assertEqual(self.client.get(reverse(f'volunteers:{name}')).status_code, 200, name)
+        self.assertTrue(databases)
+        self.assertNotIn('replica', databases)
+
+    @override_settings(REPLICA_DATABASE='replica')
+    def test_router(self):
+        router = PrimaryReplicaRouter()
+        # Under the test runner the replica mirrors the primary.
+        self.assertIsNone(replica_database())
+        token = _replica_reads.set(True)
+        try:
+            with mock.patch('volunteers.routers.replica_database', return_value='replica'):
+                self.assertEqual(router.db_for_read(Signup), 'replica')
+                self.assertEqual(router.db_for_write(Signup), 'default')
+        finally:
+            _replica_reads.reset(token)
+        self.assertEqual(router.db_for_read(Signup), 'default')
+        self.assertIs(router.allow_migrate('replica', 'volunteers'), False)
+
+
+class ConditionalGetTests(VolunteerTestMixin, TestCase):
+    """The JSON API answers unchanged polls with 304 Not Modified."""
+
+    def setUp(self):
+        cache.clear()
+        self.opportunity = self.make_opportunity('Beach Cleanup')
+        self.url = reverse('volunteers:api_opportunities')
+
+    def test_unchanged_opportunities_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get(self.url, {'search': 'beach'})['ETag'], etag)
+
+    def test_writes_change_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        signup = self.make_signup(self.opportunity)
+        etag_after_signup = self.client.get(self.url)['ETag']
+        self.assertNotEqual(etag_after_signup, etag)
+        signup.delete()
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag_after_signup)
+        response = self.client.get(self.url, headers={'If-None-Match': etag_after_signup})
+        self.assertEqual(response.status_code, 200)
+
+    def test_category_rename_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        category = self.opportunity.category
+        category.name, category.slug = 'Coastal Care', 'coastal-care'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'coastal-care')
+
+    def test_dashboard_stats_not_modified(self):
+        url = reverse('volunteers:api_dashboard_stats')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_signup(self.opportunity)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+
+@override_settings(ROOT_URLCONF='volunteer_ai.urls_async')
+class AsyncViewTests(VolunteerTestMixin, TestCase):
+    """The async views served under ASGI respond like their sync counterparts."""
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.opportunity = self.make_opportunity('Beach Cleanup')
+        self.make_signup(self.opportunity)
+        self.make_opportunity('Food Drive', days=-3, category=Category.objects.get(slug='food-prep'))
+
+    async def test_views_use_async_implementations(self):
+        response = await self.async_client.get(reverse('volunteers:dashboard'))
+        self.assertEqual(response.resolver_match.func.__module__, 'volunteers.async_views')
+        self.assertEqual(response.context['total_volunteers'], 1)
+        self.assertEqual(len(response.context['recent_signups']), 1)
+        response = await self.async_client.get(reverse('volunteers:opportunity_detail', args=[self.opportunity.pk]))
+        self.assertContains(response, 'Sarah Johnson')
+        response = await self.async_client.get(reverse('volunteers:opportunity_list'), {'search': 'beach'})
+        self.assertEqual([opp.title for opp in response.context['opportunities']], ['Beach Cleanup'])
+        response = await self.async_client.get(reverse('volunteers:volunteer_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_api_matches_sync_views(self):
+        url = reverse('volunteers:api_opportunities')
+        with override_settings(ROOT_URLCONF='volunteer_ai.urls'):
+            expected = (await self.async_client.get(url, {'limit': 1})).json()
+        response = await self.async_client.get(url, {'limit': 1})
+        self.assertEqual(response.json(), expected)
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']}, data={'limit': 1})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((await self.async_client.get(url, {'cursor': 'garbage'})).status_code, 400)
+        stats = (await self.async_client.get(reverse('volunteers:api_dashboard_stats'))).json()
+        self.assertEqual(stats['total_opportunities'], 2)
+
+    async def test_archived_opportunity(self):
+        past = await VolunteerOpportunity.objects.aget(title='Food Drive')
+        await sync_to_async(archive.archive_batch)(archive.archive_cutoff(0))
+        response = await self.async_client.get(reverse('volunteers:opportunity_detail', args=[past.pk]))
+        self.assertContains(response, 'Archived')
+        response = await self.async_client.get(reverse('volunteers:dashboard'), {'archived': '1'})
+        self.assertEqual(response.context['total_opportunities'], 2)
+
+    async def test_streaming_export(self):
+        response = await self.async_client.get(reverse('volunteers:api_opportunities'), {'format': 'ndjson'})
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['title'], 'Food Drive')
+
+    async def test_concurrent_stats_match_sync(self):
+        expected = await sync_to_async(compute_dashboard_stats)()
+        self.assertEqual(await acompute_dashboard_stats(), expected)
+
+    async def test_metrics_count_async_queries(self):
+        await self.async_client.get(reverse('volunteers:api_opportunities'))
+        body = registry.render()
+        self.assertIn('volunteers_sql_queries_bucket{view="volunteers:api_opportunities",le="2"} 0', body)
+        self.assertIn('volunteers_sql_queries_bucket{view="volunteers:api_opportunities",le="5"} 1', body)
@@ -23,4 +23,10 @@ urlpatterns = [
     # API endpoints for React components
     path('api/opportunities/', views.api_opportunities, name='api_opportunities'),
     path('api/dashboard-stats/', views.api_dashboard_stats, name='api_dashboard_stats'),
+    path('api/activity/', views.api_activity, name='api_activity'),
+    path('api/recommendations/', views.api_recommendations, name='api_recommendations'),
+    path('api/autocomplete/', views.api_autocomplete, name='api_autocomplete'),
+
+    # Monitoring
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,14 @@
+"""The volunteers URLconf with the async views from ``async_views`` swapped in.
+
+Patterns, names and the remaining synchronous views are taken from
+``urls.py`` so the two cannot drift apart.
+"""
+from django.urls import path
+
+from . import async_views
+from .urls import app_name, urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path(str(pattern.pattern), getattr(async_views, pattern.name, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
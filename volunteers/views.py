@@ -1,86 +1,227 @@
+import hashlib
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db.models import Count, Max, Prefetch
+from django.db.models.functions import TruncMonth
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Category, VolunteerOpportunity, Volunteer
-from .forms import VolunteerOpportunityForm, VolunteerForm, OpportunityFilterForm
+from .models import ArchivedOpportunity, Category, Signup, VolunteerOpportunity
+from .autocomplete import KINDS as AUTOCOMPLETE_KINDS, suggest
+from .exports import EXPORT_FORMATS
+from .forms import ActivityForm, VolunteerOpportunityForm, VolunteerForm, OpportunityFilterForm
+from .fragments import add_category_versions, categories_version
+from .metrics import registry
+from .matching import recommend
+from .pagination import InvalidCursor, KeysetPaginator, parse_limit
+from .purge import orphaned_volunteers, purge_batch
+from .rollups import activity
+from .routers import replica_reads
+from .search import search_opportunities
+from .stats import get_archive_stats, get_dashboard_stats, with_archived
+from .tasks import render_queue_depth
+
+OPPORTUNITIES_PER_PAGE = 24
+VOLUNTEERS_PER_PAGE = 50
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 500
+RECOMMENDATIONS = 5
+API_MAX_RECOMMENDATIONS = 50
+SUGGESTIONS = 5
+API_MAX_SUGGESTIONS = 20
+
+
+def paginate(request, queryset, per_page):
+    """Return the keyset page selected by the request's ``cursor``, or 404."""
+    try:
+        return KeysetPaginator(queryset, per_page).page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid page.')
+
+
+def filter_opportunities(opportunities, cleaned_data):
+    """Apply the OpportunityFilterForm filters shared by the HTML and API views."""
+    if cleaned_data.get('category'):
+        opportunities = opportunities.filter(category=cleaned_data['category'])
+    if cleaned_data.get('date_from'):
+        opportunities = opportunities.filter(date__gte=cleaned_data['date_from'])
+    if cleaned_data.get('date_to'):
+        opportunities = opportunities.filter(date__lte=cleaned_data['date_to'])
+    if cleaned_data.get('search'):
+        opportunities = search_opportunities(opportunities, cleaned_data['search'])
+    return opportunities
+
+
+def opportunity_facets(cleaned_data):
+    """Result counts by category and by month under the filters in ``cleaned_data``.
+
+    Category counts leave out the category filter, so each option shows
+    what choosing it would return; month counts apply it. Both come from
+    one query grouped by category and month. Returns ``{'categories':
+    [...], 'months': [...]}`` without empty entries.
+    """
+    opportunities = filter_opportunities(VolunteerOpportunity.objects.all(), {**cleaned_data, 'category': None})
+    rows = opportunities.order_by().values(
+        'category_id', 'category__name', 'category__slug', month=TruncMonth('date')
+    ).annotate(count=Count('pk')).values_list(
+        'category_id', 'category__name', 'category__slug', 'month', 'count'
+    )
+    selected = cleaned_data.get('category')
+    categories, months = {}, {}
+    for category_id, name, slug, month, count in rows:
+        category = categories.setdefault(category_id, {'id': category_id, 'name': name, 'slug': slug, 'count': 0})
+        category['count'] += count
+        if selected is None or selected.pk == category_id:
+            months[month] = months.get(month, 0) + count
+    return {
+        'categories': sorted(categories.values(), key=lambda category: category['name']),
+        'months': [{'month': month, 'count': count} for month, count in sorted(months.items())],
+    }
+
+
+def facets_json(facets):
+    return {
+        'categories': facets['categories'],
+        'months': [{'month': f"{row['month']:%Y-%m}", 'count': row['count']} for row in facets['months']],
+    }
+
+
+def list_query(request, **params):
+    """The list's query string with ``params`` replaced (None removes one) and back on page one."""
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    for name, value in params.items():
+        if value is None:
+            query.pop(name, None)
+        else:
+            query[name] = value
+    return query.urlencode()
+
 
+def add_month_links(request, facets):
+    """Give each month facet the query string that filters the list to that month."""
+    for row in facets['months']:
+        last_day = (row['month'] + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        row['query'] = list_query(request, date_from=row['month'].isoformat(), date_to=last_day.isoformat())
 
+
+def opportunity_json(opp):
+    return {
+        'id': opp.id,
+        'title': opp.title,
+        'description': opp.description,
+        'date': opp.date.isoformat(),
+        'category': {
+            'id': opp.category.id,
+            'name': opp.category.name,
+            'slug': opp.category.slug,
+        },
+        'volunteer_count': opp.volunteer_count,
+    }
+
+
+def opportunities_page_json(page):
+    """The ``api_opportunities`` response body for one page of opportunities."""
+    return {
+        'opportunities': [opportunity_json(opp) for opp in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+def include_archived(request):
+    """Whether the request asks for archived opportunities to be counted, with ``?archived=1``."""
+    return request.GET.get('archived') == '1'
+
+
+@replica_reads
 def dashboard(request):
     """Dashboard view with summary statistics."""
     today = timezone.now().date()
 
-    # Get statistics
-    total_opportunities = VolunteerOpportunity.objects.count()
-    upcoming_opportunities = VolunteerOpportunity.objects.filter(date__gte=today).count()
-    total_volunteers = Volunteer.objects.count()
-
-    # Get category breakdown
-    categories = Category.objects.annotate(
-        opportunity_count=Count('opportunities'),
-        volunteer_count=Count('opportunities__volunteers')
-    )
+    # Totals and category breakdown come from the cached snapshot
+    stats = get_dashboard_stats()
+    if include_archived(request):
+        stats = with_archived(stats, get_archive_stats())
 
     # Recent opportunities
-    recent_opportunities = VolunteerOpportunity.objects.filter(
+    recent_opportunities = list(VolunteerOpportunity.objects.filter(
         date__gte=today
-    ).select_related('category').prefetch_related('volunteers')[:5]
+    ).select_related('category')[:5])
+    add_category_versions(recent_opportunities)
 
     # Recent signups
-    recent_volunteers = Volunteer.objects.select_related(
-        'opportunity', 'opportunity__category'
+    recent_signups = Signup.objects.select_related(
+        'volunteer', 'opportunity', 'opportunity__category'
     )[:5]
 
     context = {
-        'total_opportunities': total_opportunities,
-        'upcoming_opportunities': upcoming_opportunities,
-        'total_volunteers': total_volunteers,
-        'categories': categories,
+        'total_opportunities': stats['total_opportunities'],
+        'upcoming_opportunities': stats['upcoming_opportunities'],
+        'total_volunteers': stats['total_volunteers'],
+        'categories': stats['categories'],
         'recent_opportunities': recent_opportunities,
-        'recent_volunteers': recent_volunteers,
+        'recent_signups': recent_signups,
+        'include_archived': include_archived(request),
     }
     return render(request, 'volunteers/dashboard.html', context)
 
 
+@replica_reads
 def opportunity_list(request):
     """List all volunteer opportunities with filtering."""
     form = OpportunityFilterForm(request.GET)
-    opportunities = VolunteerOpportunity.objects.select_related('category').prefetch_related('volunteers')
+    opportunities = VolunteerOpportunity.objects.select_related('category')
 
+    facets = None
     if form.is_valid():
-        if form.cleaned_data.get('category'):
-            opportunities = opportunities.filter(category=form.cleaned_data['category'])
-        if form.cleaned_data.get('date_from'):
-            opportunities = opportunities.filter(date__gte=form.cleaned_data['date_from'])
-        if form.cleaned_data.get('date_to'):
-            opportunities = opportunities.filter(date__lte=form.cleaned_data['date_to'])
-        if form.cleaned_data.get('search'):
-            search_term = form.cleaned_data['search']
-            opportunities = opportunities.filter(
-                Q(title__icontains=search_term) | Q(description__icontains=search_term)
-            )
+        opportunities = filter_opportunities(opportunities, form.cleaned_data)
+        if form.cleaned_data['facets']:
+            facets = opportunity_facets(form.cleaned_data)
+            form.show_category_counts(facets['categories'])
+            add_month_links(request, facets)
 
     categories = Category.objects.all()
+    page = paginate(request, opportunities, OPPORTUNITIES_PER_PAGE)
+    add_category_versions(page)
 
     context = {
-        'opportunities': opportunities,
+        'opportunities': page,
+        'page': page,
         'form': form,
         'categories': categories,
+        'facets': facets,
+        'facets_toggle_query': list_query(request, facets=None if facets else '1'),
     }
     return render(request, 'volunteers/opportunity_list.html', context)
 
 
-def opportunity_detail(request, pk):
-    """View details of a specific opportunity."""
-    opportunity = get_object_or_404(
-        VolunteerOpportunity.objects.select_related('category').prefetch_related('volunteers'),
-        pk=pk
+def opportunity_detail_querysets():
+    """The opportunity with its signups, and the same from the archive."""
+    return (
+        VolunteerOpportunity.objects.select_related('category').prefetch_related(
+            Prefetch('signups', queryset=Signup.objects.select_related('volunteer'))
+        ),
+        ArchivedOpportunity.objects.select_related('category').prefetch_related('signups'),
     )
+
+
+@replica_reads
+def opportunity_detail(request, pk):
+    """View details of a specific opportunity, archived or not."""
+    opportunities, archived_opportunities = opportunity_detail_querysets()
+    opportunity = opportunities.filter(pk=pk).first()
+    archived = opportunity is None
+    if archived:
+        opportunity = get_object_or_404(archived_opportunities, pk=pk)
     context = {
         'opportunity': opportunity,
+        'archived': archived,
     }
     return render(request, 'volunteers/opportunity_detail.html', context)
 
@@ -127,36 +268,48 @@ def opportunity_edit(request, pk):
 
 
 def opportunity_delete(request, pk):
-    """Delete a volunteer opportunity."""
+    """Delete a volunteer opportunity with its signups, see ``purge_batch``."""
     opportunity = get_object_or_404(VolunteerOpportunity, pk=pk)
 
     if request.method == 'POST':
         title = opportunity.title
-        opportunity.delete()
+        purge_batch(VolunteerOpportunity.objects.filter(pk=opportunity.pk))
         messages.success(request, f'Opportunity "{title}" deleted successfully!')
         return redirect('volunteers:opportunity_list')
 
     context = {
         'opportunity': opportunity,
+        'orphaned_volunteers': orphaned_volunteers(VolunteerOpportunity.objects.filter(pk=opportunity.pk)).count(),
     }
     return render(request, 'volunteers/opportunity_confirm_delete.html', context)
 
 
 def volunteer_signup(request, opportunity_id=None):
-    """Sign up a volunteer for an opportunity."""
+    """Sign up a volunteer for one or more opportunities."""
     initial = {}
     if opportunity_id:
         opportunity = get_object_or_404(VolunteerOpportunity, pk=opportunity_id)
-        initial['opportunity'] = opportunity
+        initial['opportunities'] = [opportunity]
 
     if request.method == 'POST':
         form = VolunteerForm(request.POST)
         if form.is_valid():
             volunteer = form.save()
-            messages.success(
-                request,
-                f'Thank you {volunteer.name}! You have successfully signed up for "{volunteer.opportunity.title}".'
-            )
+            waitlisted = form.waitlisted
+            opportunities = form.cleaned_data['opportunities']
+            titles = ', '.join(f'"{opp.title}"' for opp in opportunities if opp.pk not in waitlisted)
+            if titles:
+                messages.success(
+                    request,
+                    f'Thank you {volunteer.name}! You have successfully signed up for {titles}.'
+                )
+            if waitlisted:
+                titles = ', '.join(f'"{opp.title}"' for opp in opportunities if opp.pk in waitlisted)
+                messages.info(
+                    request,
+                    f'{titles} {"is" if len(waitlisted) == 1 else "are"} full. We added {volunteer.name} '
+                    f'to the waitlist and will sign them up if a place opens.'
+                )
             return redirect('volunteers:dashboard')
     else:
         form = VolunteerForm(initial=initial)
@@ -164,90 +317,186 @@ def volunteer_signup(request, opportunity_id=None):
     opportunities = VolunteerOpportunity.objects.filter(
         date__gte=timezone.now().date()
     ).select_related('category')
+    expertise = form['expertise'].value()
 
     context = {
         'form': form,
         'opportunities': opportunities,
+        'recommended': recommend(expertise, RECOMMENDATIONS) if expertise else [],
     }
     return render(request, 'volunteers/volunteer_signup.html', context)
 
 
+@replica_reads
 def volunteer_list(request):
-    """List all volunteers."""
-    volunteers = Volunteer.objects.select_related('opportunity', 'opportunity__category')
+    """List all volunteer signups."""
+    signups = Signup.objects.select_related('volunteer', 'opportunity', 'opportunity__category')
+    page = paginate(request, signups, VOLUNTEERS_PER_PAGE)
 
     context = {
-        'volunteers': volunteers,
+        'signups': page,
+        'page': page,
     }
     return render(request, 'volunteers/volunteer_list.html', context)
 
 
 def volunteer_delete(request, pk):
     """Delete a volunteer registration."""
-    volunteer = get_object_or_404(Volunteer, pk=pk)
+    signup = get_object_or_404(Signup.objects.select_related('volunteer', 'opportunity'), pk=pk)
 
     if request.method == 'POST':
-        name = volunteer.name
-        volunteer.delete()
+        name = signup.volunteer.name
+        signup.delete()
         messages.success(request, f'Volunteer registration for "{name}" deleted successfully!')
         return redirect('volunteers:volunteer_list')
 
     context = {
-        'volunteer': volunteer,
+        'signup': signup,
     }
     return render(request, 'volunteers/volunteer_confirm_delete.html', context)
 
 
 # API Views for React Components
-def api_opportunities(request):
-    """API endpoint for opportunities list with filtering."""
-    opportunities = VolunteerOpportunity.objects.select_related('category').prefetch_related('volunteers')
-
-    # Apply filters
-    category_id = request.GET.get('category')
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
-    search = request.GET.get('search')
-
-    if category_id:
-        opportunities = opportunities.filter(category_id=category_id)
-    if date_from:
-        opportunities = opportunities.filter(date__gte=date_from)
-    if date_to:
-        opportunities = opportunities.filter(date__lte=date_to)
-    if search:
-        opportunities = opportunities.filter(
-            Q(title__icontains=search) | Q(description__icontains=search)
-        )
-
-    data = [{
-        'id': opp.id,
-        'title': opp.title,
-        'description': opp.description,
-        'date': opp.date.isoformat(),
-        'category': {
-            'id': opp.category.id,
-            'name': opp.category.name,
-            'slug': opp.category.slug,
-        },
-        'volunteer_count': opp.volunteer_count,
-    } for opp in opportunities]
+def make_etag(*parts):
+    return hashlib.md5(json.dumps(parts, default=str).encode(), usedforsecurity=False).hexdigest()
 
-    return JsonResponse({'opportunities': data})
 
+def opportunities_etag(request):
+    """Validator for api_opportunities: table versions plus the query string.
 
-def api_dashboard_stats(request):
-    """API endpoint for dashboard statistics."""
-    today = timezone.now().date()
+    Row counts catch deletions, which leave max(updated_at) unchanged.
+    Categories have no timestamp; their names and slugs are covered by the
+    version that renaming one bumps.
+    """
+    opportunities = VolunteerOpportunity.objects.aggregate(
+        last=Max('updated_at'), rows=Count('pk')
+    )
+    signups = Signup.objects.aggregate(last=Max('updated_at'), rows=Count('pk'))
+    categories = categories_version()
+    query = sorted(request.GET.lists())
+    return make_etag(opportunities, signups, categories, query)
 
-    stats = {
-        'total_opportunities': VolunteerOpportunity.objects.count(),
-        'upcoming_opportunities': VolunteerOpportunity.objects.filter(date__gte=today).count(),
-        'total_volunteers': Volunteer.objects.count(),
-        'categories': list(Category.objects.annotate(
-            opportunity_count=Count('opportunities'),
-            volunteer_count=Count('opportunities__volunteers')
-        ).values('id', 'name', 'slug', 'opportunity_count', 'volunteer_count')),
-    }
 
-    return JsonResponse(stats)
\ No newline at end of file
+def dashboard_stats_etag(request):
+    """Validator for api_dashboard_stats, taken from the cached snapshot."""
+    return make_etag(get_dashboard_stats())
+
+
+@replica_reads
+@cache_control(no_cache=True)
+@condition(etag_func=opportunities_etag)
+def api_opportunities(request):
+    """API endpoint for opportunities list with filtering.
+
+    ``?format=ndjson`` or ``?format=csv`` streams every matching row instead
+    of returning a page of JSON. ``?facets=1`` adds result counts by
+    category and month for the whole result, see ``opportunity_facets``.
+    """
+    form = OpportunityFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    opportunities = filter_opportunities(
+        VolunteerOpportunity.objects.select_related('category'), form.cleaned_data
+    )
+
+    export_format = request.GET.get('format')
+    if export_format:
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse(
+                {'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}.'}, status=400
+            )
+        rows, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(rows(opportunities), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="opportunities.{export_format}"'
+        return response
+
+    try:
+        limit = parse_limit(request.GET.get('limit'), API_DEFAULT_LIMIT, API_MAX_LIMIT)
+        page = KeysetPaginator(opportunities, limit).page(request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    data = opportunities_page_json(page)
+    if form.cleaned_data['facets']:
+        data['facets'] = facets_json(opportunity_facets(form.cleaned_data))
+    return JsonResponse(data)
+
+
+@replica_reads
+@cache_control(no_cache=True)
+@condition(etag_func=dashboard_stats_etag)
+def api_dashboard_stats(request):
+    """API endpoint for dashboard statistics."""
+    return JsonResponse(get_dashboard_stats())
+
+
+@replica_reads
+def api_activity(request):
+    """Signups made and opportunities held per category and day, week or month.
+
+    Served from the activity rollups. ``?granularity=`` is ``day`` (default),
+    ``week`` or ``month``; ``?start=`` and ``?end=`` bound the range and
+    ``?category=`` restricts it to one category.
+    """
+    form = ActivityForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    return JsonResponse({
+        'granularity': data['granularity'],
+        'start': data['start'].isoformat(),
+        'end': data['end'].isoformat(),
+        **activity(data['start'], data['end'], data['granularity'], data['category']),
+    })
+
+
+@replica_reads
+def api_recommendations(request):
+    """Upcoming opportunities matching ``?expertise=``, best first.
+
+    ``?limit=`` sets how many, up to ``API_MAX_RECOMMENDATIONS``.
+    """
+    expertise = request.GET.get('expertise', '').strip()
+    if not expertise:
+        return JsonResponse({'error': 'expertise is required.'}, status=400)
+    try:
+        limit = parse_limit(request.GET.get('limit'), RECOMMENDATIONS, API_MAX_RECOMMENDATIONS)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'opportunities': [
+            {**opportunity_json(opp), 'score': round(opp.match_score, 4)}
+            for opp in recommend(expertise, limit)
+        ],
+    })
+
+
+@cache_control(max_age=30)
+def api_autocomplete(request):
+    """Typeahead suggestions for ``?q=``, the text typed so far.
+
+    Returns matching opportunity titles, category names and expertise words,
+    each with how many upcoming opportunities or volunteers use it, from the
+    in-process prefix index. ``?kind=`` (repeatable: ``titles``,
+    ``categories``, ``expertise``) picks the lists and ``?limit=`` their
+    length, up to ``API_MAX_SUGGESTIONS``.
+    """
+    text = request.GET.get('q', '').strip()
+    if not text:
+        return JsonResponse({'error': 'q is required.'}, status=400)
+    kinds = request.GET.getlist('kind') or AUTOCOMPLETE_KINDS
+    unknown = set(kinds) - set(AUTOCOMPLETE_KINDS)
+    if unknown:
+        return JsonResponse({'error': f'Unknown kind: {", ".join(sorted(unknown))}.'}, status=400)
+    try:
+        limit = parse_limit(request.GET.get('limit'), SUGGESTIONS, API_MAX_SUGGESTIONS)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'q': text, **suggest(text, kinds, limit)})
+
+
+def metrics(request):
+    """Per-view request metrics and the task queue depth in Prometheus text format."""
+    return HttpResponse(
+        registry.render() + render_queue_depth(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )